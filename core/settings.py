@@ -13,6 +13,8 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 from pathlib import Path
 import os
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -42,12 +44,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # En premier : la trace couvre tous les autres middlewares
+    'mediatheque.tracage.TracageMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    # Compression gzip des pages (avant tout middleware qui lit le contenu)
+    'mediatheque.cache_http.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Après l'authentification : le profilage à la demande est réservé au personnel
+    'mediatheque.profilage.ProfilageMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'mediatheque.audit.AuditMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -55,7 +64,8 @@ ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates dont chaque rendu est un span (voir mediatheque/tracage.py)
+        'BACKEND': 'mediatheque.tracage.GabaritsTraces',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -97,6 +107,59 @@ else:
         }
     }
 
+# Profil de performance SQLite pour les petites antennes (WAL, pragmas appliqués
+# à chaque connexion, voir mediatheque/sqlite.py). Avec Django 5.1 et plus, les
+# transactions démarrent en IMMEDIATE : l'attente du verrou d'écriture se fait au
+# BEGIN, où busy_timeout s'applique, au lieu d'échouer lors du passage lecture ->
+# écriture. Les versions antérieures n'acceptent pas l'option transaction_mode.
+SQLITE_PERFORMANCE = os.environ.get('SQLITE_PERFORMANCE', 'False') == 'True'
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # millisecondes
+if (SQLITE_PERFORMANCE and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3'
+        and django.VERSION >= (5, 1)):
+    DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE'}
+
+
+# Partitionnement de la table des emprunts sur PostgreSQL : 'annee' ou 'mois'
+# (voir manage.py partitionner_emprunts)
+EMPRUNT_PARTITION = os.environ.get('EMPRUNT_PARTITION', 'annee')
+
+
+# Emprunts rendus depuis plus longtemps que ce délai : archivés par manage.py archiver_emprunts
+ARCHIVE_RETENTION_JOURS = int(os.environ.get('ARCHIVE_RETENTION_JOURS', 365))
+
+# Autocomplétion : index en mémoire par processus jusqu'à ce nombre de médias, requête SQL au-delà
+AUTOCOMPLETION_MAX_MEDIAS = int(os.environ.get('AUTOCOMPLETION_MAX_MEDIAS', 1_000_000))
+
+# Instantané du catalogue pour les bornes hors ligne (manage.py snapshot_catalogue)
+CATALOGUE_SNAPSHOT = os.environ.get('CATALOGUE_SNAPSHOT', str(BASE_DIR / 'catalogue.json.gz'))
+
+
+# Cache
+# Le cache local suffit en développement ; en production avec plusieurs
+# processus, utiliser un cache partagé (Redis, Memcached) via CACHE_BACKEND.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'mediatheque'),
+    }
+}
+
+
+# Sessions
+# SESSION_BACKEND : db (défaut), cached_db, signed_cookies ou cache
+SESSION_ENGINE = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+    'cache': 'django.contrib.sessions.backends.cache',
+}[os.environ.get('SESSION_BACKEND', 'db')]
+
+SESSION_COOKIE_AGE = int(os.environ.get('SESSION_COOKIE_AGE', 60 * 60 * 24 * 14))
+
+# Purge des sessions expirées programmée pour le worker lors d'une connexion, au
+# plus une fois par intervalle (en secondes). 0 la désactive (utiliser cron).
+SESSION_PURGE_INTERVALLE = int(os.environ.get('SESSION_PURGE_INTERVALLE', 60 * 60 * 24))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -116,6 +179,51 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Hachage des mots de passe
+# PASSWORD_HASHER choisit l'algorithme utilisé pour les nouveaux hachages :
+# pbkdf2 (défaut), scrypt ou argon2 (nécessite argon2-cffi). Les hachages
+# existants restent vérifiables et sont recalculés à la connexion suivante.
+HACHEURS = {
+    'pbkdf2': 'mediatheque.hashers.PBKDF2AjustablePasswordHasher',
+    'scrypt': 'mediatheque.hashers.ScryptAjustablePasswordHasher',
+    'argon2': 'mediatheque.hashers.Argon2AjustablePasswordHasher',
+}
+# Puis les hacheurs par défaut de Django, pour vérifier les hachages importés d'autres installations
+PASSWORD_HASHERS = [HACHEURS.pop(os.environ.get('PASSWORD_HASHER', 'pbkdf2'))] + list(HACHEURS.values()) + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Coûts de hachage (valeurs par défaut de Django si non définis)
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ['PASSWORD_PBKDF2_ITERATIONS']) if os.environ.get('PASSWORD_PBKDF2_ITERATIONS') else None
+PASSWORD_SCRYPT_WORK_FACTOR = int(os.environ['PASSWORD_SCRYPT_WORK_FACTOR']) if os.environ.get('PASSWORD_SCRYPT_WORK_FACTOR') else None
+PASSWORD_ARGON2_TIME_COST = int(os.environ['PASSWORD_ARGON2_TIME_COST']) if os.environ.get('PASSWORD_ARGON2_TIME_COST') else None
+PASSWORD_ARGON2_MEMORY_COST = int(os.environ['PASSWORD_ARGON2_MEMORY_COST']) if os.environ.get('PASSWORD_ARGON2_MEMORY_COST') else None
+
+# Limitation des connexions échouées (compteurs stockés dans le cache)
+LOGIN_ECHECS_MAX_UTILISATEUR = int(os.environ.get('LOGIN_ECHECS_MAX_UTILISATEUR', 5))
+LOGIN_ECHECS_MAX_IP = int(os.environ.get('LOGIN_ECHECS_MAX_IP', 20))
+LOGIN_BLOCAGE_DUREE = int(os.environ.get('LOGIN_BLOCAGE_DUREE', 300))
+
+
+# Envoi des courriels (rappels d'échéance et de retard)
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 25))
+EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'False') == 'True'
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'mediatheque@localhost')
+
+# File de tâches de fond (manage.py worker)
+TACHES_DELAI_REESSAI = int(os.environ.get('TACHES_DELAI_REESSAI', 30))  # secondes, doublé à chaque échec
+TACHES_INTERVALLE_BATTEMENT = int(os.environ.get('TACHES_INTERVALLE_BATTEMENT', 30))  # battement d'une tâche en cours
+TACHES_DELAI_BLOCAGE = int(os.environ.get('TACHES_DELAI_BLOCAGE', 300))  # tâche sans battement considérée perdue
+
+# Journal d'audit : nombre d'événements au-delà duquel le tampon est écrit sans attendre la fin de la requête
+AUDIT_TAILLE_LOT = int(os.environ.get('AUDIT_TAILLE_LOT', 100))
 
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
@@ -133,6 +241,28 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = os.environ.get('STATIC_ROOT', str(BASE_DIR / 'staticfiles'))
+
+# collectstatic écrit des noms hachés et leurs versions .gz/.br (voir mediatheque/statiques.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'mediatheque.statiques.StockageStatique'},
+}
+
+# Servir STATIC_ROOT par Django (expiration lointaine, versions précompressées),
+# en l'absence de serveur web devant l'application
+STATIC_SERVIR = os.environ.get('STATIC_SERVIR', 'False') == 'True'
+
+
+# Profilage des requêtes : fraction échantillonnée (0 = seulement à la demande du
+# personnel, via ?profil=1 ou l'en-tête X-Profilage: 1) et nombre de profils conservés
+PROFILAGE_ECHANTILLON = float(os.environ.get('PROFILAGE_ECHANTILLON', 0))
+PROFILAGE_CONSERVES = int(os.environ.get('PROFILAGE_CONSERVES', 500))
+
+# Traçage (spans OTLP/JSON) : chemin du fichier de traces, 'console' pour la
+# sortie d'erreur, vide pour désactiver
+TRACAGE = os.environ.get('TRACAGE', '')
+TRACAGE_SERVICE = os.environ.get('TRACAGE_SERVICE', 'mediatheque')
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
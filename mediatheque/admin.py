@@ -1,26 +1,159 @@
-from django.contrib import admin
-from .models import Livre, DVD, CD, JeuPlateau, Membre, Emprunt
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.functional import cached_property
+from . import audit, doublons, synchronisation, taches
+from .models import (
+    Livre, DVD, CD, JeuPlateau, Membre, Emprunt, EmpruntArchive, Exemplaire, PolitiquePret, Tache, Evenement,
+)
+
+
+class PaginatorEstime(Paginator):
+    """Paginator utilisant l'estimation de PostgreSQL pour les grandes tables non filtrées"""
+    seuil_estimation = 100_000
+
+    @cached_property
+    def count(self):
+        requete = getattr(self.object_list, 'query', None)
+        if requete is not None and not requete.where:
+            connexion = connections[self.object_list.db]
+            if connexion.vendor == 'postgresql':
+                with connexion.cursor() as curseur:
+                    curseur.execute(
+                        "SELECT reltuples FROM pg_class WHERE relname = %s",
+                        [self.object_list.model._meta.db_table]
+                    )
+                    ligne = curseur.fetchone()
+                if ligne and ligne[0] >= self.seuil_estimation:
+                    return int(ligne[0])
+        return super().count
+
+
+class DisponibiliteFilter(admin.SimpleListFilter):
+    """Filtre sur la disponibilité réelle (exemplaires moins emprunts en cours)"""
+    title = "disponibilité"
+    parameter_name = 'disponibilite'
+
+    def lookups(self, request, model_admin):
+        return [('oui', "Disponible"), ('non', "Indisponible")]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'oui':
+            return queryset.filter(nb_exemplaires_disponibles__gt=0)
+        if self.value() == 'non':
+            return queryset.filter(nb_exemplaires_disponibles__lte=0)
+        return queryset
+
+
+class SuppressionLogiqueAdmin(admin.ModelAdmin):
+    """Suppression depuis l'admin par drapeau, comme dans l'application ; le worker purge le reste"""
+
+    def delete_model(self, request, obj):
+        obj.supprimer()
+        audit.enregistrer(request.user, 'suppression', obj, {'libelle': str(obj)})
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.delete_model(request, obj)
+
+
+class MediaAdmin(SuppressionLogiqueAdmin):
+    """Administration commune des médias empruntables"""
+    list_filter = (DisponibiliteFilter,)
+    show_full_result_count = False
+    paginator = PaginatorEstime
+    actions = ['ajouter_exemplaire', 'retirer_exemplaire', 'fusionner_doublons']
+
+    def get_queryset(self, request):
+        en_cours = Count('emprunt', filter=Q(emprunt__date_retour_effective__isnull=True))
+        type_media = self.model._meta.model_name
+        archives = (
+            EmpruntArchive.objects.filter(**{type_media: OuterRef('pk')}).order_by()
+            .values(type_media).annotate(total=Count('pk')).values('total')
+        )
+        return super().get_queryset(request).annotate(
+            nb_emprunts=Count('emprunt') + Coalesce(Subquery(archives), 0),
+            nb_emprunts_en_cours=en_cours,
+            nb_exemplaires_disponibles=F('nombre_exemplaires') - en_cours,
+        )
+
+    @admin.display(description="Disponibles", ordering='nb_exemplaires_disponibles')
+    def disponibles(self, obj):
+        return f"{obj.nb_exemplaires_disponibles}/{obj.nombre_exemplaires}"
+
+    @admin.display(description="Emprunts en cours", ordering='nb_emprunts_en_cours')
+    def emprunts_en_cours_admin(self, obj):
+        return obj.nb_emprunts_en_cours
+
+    @admin.display(description="Emprunts (total)", ordering='nb_emprunts')
+    def emprunts_total(self, obj):
+        return obj.nb_emprunts
+
+    def _selection(self, queryset):
+        # Sous-requête sur les clés : l'UPDATE ne porte pas les agrégats du changelist
+        return self.model.objects.filter(pk__in=queryset.order_by().values('pk'))
+
+    @admin.action(description="Ajouter un exemplaire")
+    def ajouter_exemplaire(self, request, queryset):
+        selection = self._selection(queryset)
+        nombre = selection.update(nombre_exemplaires=F('nombre_exemplaires') + 1)
+        type_media = self.model._meta.model_name
+        ids = list(selection.values_list('pk', flat=True))
+        synchronisation.marquer({type_media: ids})
+        # Les codes-barres des nouveaux exemplaires sont créés par le worker
+        taches.enqueue('completer_exemplaires', type_media=type_media, pks=ids)
+        self.message_user(request, f"{nombre} média(s) mis à jour.", messages.SUCCESS)
+
+    @admin.action(description="Retirer un exemplaire disponible")
+    def retirer_exemplaire(self, request, queryset):
+        retirables = queryset.filter(nombre_exemplaires__gt=1, nb_exemplaires_disponibles__gt=0)
+        ids = list(retirables.values_list('pk', flat=True))
+        type_media = self.model._meta.model_name
+        # Un exemplaire libre par média sort de la circulation (le plus récent)
+        exemplaires = (
+            Exemplaire.objects.filter(**{type_media + '__in': ids}, etat='disponible')
+            .values(type_media).annotate(dernier=Max('pk')).values_list('dernier', flat=True)
+        )
+        with transaction.atomic():
+            nombre = self._selection(retirables).update(nombre_exemplaires=F('nombre_exemplaires') - 1)
+            Exemplaire.objects.filter(pk__in=list(exemplaires)).update(etat='hors_circulation')
+            synchronisation.marquer({type_media: ids})
+        self.message_user(request, f"{nombre} média(s) mis à jour.", messages.SUCCESS)
+
+    @admin.action(description="Fusionner les doublons (dans le plus ancien)")
+    def fusionner_doublons(self, request, queryset):
+        medias = list(self._selection(queryset).order_by('pk'))
+        if len(medias) < 2:
+            self.message_user(request, "Sélectionnez au moins deux médias à fusionner.", messages.WARNING)
+            return
+        garde, autres = medias[0], medias[1:]
+        doublons.fusionner(garde, autres)
+        audit.enregistrer(request.user, 'fusion', garde, {'doublons': [media.pk for media in autres]})
+        self.message_user(
+            request, f"{len(autres)} doublon(s) fusionné(s) dans « {garde.titre} » ({garde.nombre_exemplaires} exemplaires).",
+            messages.SUCCESS,
+        )
 
 
 @admin.register(Livre)
-class LivreAdmin(admin.ModelAdmin):
-    list_display = ('titre', 'auteur', 'disponible')
+class LivreAdmin(MediaAdmin):
+    list_display = ('titre', 'auteur', 'disponibles', 'emprunts_en_cours_admin', 'emprunts_total')
     search_fields = ('titre', 'auteur')
-    list_filter = ('disponible',)
 
 
 @admin.register(DVD)
-class DVDAdmin(admin.ModelAdmin):
-    list_display = ('titre', 'auteur', 'duree', 'disponible')
+class DVDAdmin(MediaAdmin):
+    list_display = ('titre', 'auteur', 'duree', 'disponibles', 'emprunts_en_cours_admin', 'emprunts_total')
     search_fields = ('titre', 'auteur')
-    list_filter = ('disponible',)
 
 
 @admin.register(CD)
-class CDAdmin(admin.ModelAdmin):
-    list_display = ('titre', 'artiste', 'nombre_pistes', 'disponible')
+class CDAdmin(MediaAdmin):
+    list_display = ('titre', 'artiste', 'nombre_pistes', 'disponibles', 'emprunts_en_cours_admin', 'emprunts_total')
     search_fields = ('titre', 'artiste')
-    list_filter = ('disponible',)
 
 
 @admin.register(JeuPlateau)
@@ -29,14 +162,88 @@ class JeuPlateauAdmin(admin.ModelAdmin):
     search_fields = ('titre', 'editeur')
 
 
+@admin.register(Exemplaire)
+class ExemplaireAdmin(admin.ModelAdmin):
+    list_display = ('code_barre', 'get_media', 'etat', 'date_ajout')
+    list_filter = ('etat',)
+    list_select_related = ('livre', 'dvd', 'cd')
+    search_fields = ('code_barre',)
+    show_full_result_count = False
+    paginator = PaginatorEstime
+
+    @admin.display(description="Média")
+    def get_media(self, obj):
+        return obj.get_media()
+
+
 @admin.register(Membre)
-class MembreAdmin(admin.ModelAdmin):
-    list_display = ('nom', 'prenom', 'email', 'date_inscription')
+class MembreAdmin(SuppressionLogiqueAdmin):
+    list_display = ('nom', 'prenom', 'email', 'categorie', 'date_inscription')
+    list_filter = ('categorie',)
     search_fields = ('nom', 'prenom', 'email')
+    show_full_result_count = False
+    paginator = PaginatorEstime
+
+
+@admin.register(PolitiquePret)
+class PolitiquePretAdmin(admin.ModelAdmin):
+    list_display = ('categorie', 'type_media', 'duree_jours', 'max_emprunts', 'delai_grace_jours', 'max_prolongations')
+    list_editable = ('duree_jours', 'max_emprunts', 'delai_grace_jours', 'max_prolongations')
+    list_filter = ('categorie', 'type_media')
 
 
 @admin.register(Emprunt)
 class EmpruntAdmin(admin.ModelAdmin):
     list_display = ('membre', 'get_media', 'date_emprunt', 'date_retour_prevue', 'date_retour_effective')
     list_filter = ('date_emprunt', 'date_retour_effective')
+    list_select_related = ('membre', 'livre', 'dvd', 'cd')
     search_fields = ('membre__nom', 'membre__prenom')
+    show_full_result_count = False
+    paginator = PaginatorEstime
+    actions = ['marquer_retournes']
+
+    @admin.display(description="Média")
+    def get_media(self, obj):
+        return obj.get_media()
+
+    @admin.action(description="Marquer comme retournés")
+    def marquer_retournes(self, request, queryset):
+        nombre = queryset.marquer_retournes()
+        self.message_user(request, f"{nombre} emprunt(s) marqué(s) comme retourné(s).", messages.SUCCESS)
+
+
+@admin.register(Tache)
+class TacheAdmin(admin.ModelAdmin):
+    list_display = ('nom', 'statut', 'tentatives', 'executer_apres', 'duree_ms', 'date_fin')
+    list_filter = ('statut', 'nom')
+    readonly_fields = ('date_creation', 'date_debut', 'date_battement', 'date_fin', 'duree_ms', 'erreur')
+    show_full_result_count = False
+    paginator = PaginatorEstime
+    actions = ['relancer']
+
+    @admin.action(description="Relancer les tâches sélectionnées")
+    def relancer(self, request, queryset):
+        nombre = queryset.exclude(statut='en_cours').update(
+            statut='en_attente', tentatives=0, executer_apres=timezone.now(), erreur=''
+        )
+        self.message_user(request, f"{nombre} tâche(s) remise(s) en file.", messages.SUCCESS)
+
+
+@admin.register(Evenement)
+class EvenementAdmin(admin.ModelAdmin):
+    list_display = ('date', 'acteur', 'action', 'type_objet', 'objet_id')
+    list_filter = ('action', 'type_objet')
+    list_select_related = ('acteur',)
+    search_fields = ('=objet_id', 'acteur__username')
+    show_full_result_count = False
+    paginator = PaginatorEstime
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        # Le journal ne se purge que par manage.py purger_evenements
+        return False
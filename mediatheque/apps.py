@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class MediathequeConfig(AppConfig):
     name = 'mediatheque'
+
+    def ready(self):
+        # Enregistrement des récepteurs de signaux
+        from . import signals  # noqa: F401
@@ -0,0 +1,133 @@
+"""Archivage des emprunts terminés et lecture de l'historique complet.
+
+Les emprunts rendus avant une date sont déplacés par lots, chacun dans sa
+transaction, de la table des emprunts vers EmpruntArchive. Les statistiques
+lisent les deux tables (voir statistiques.py) et l'historique d'un membre ne
+lit l'archive que lorsque la pagination dépasse ses emprunts non archivés.
+"""
+from collections import defaultdict, Counter
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import versions
+from .models import Emprunt, EmpruntArchive, Membre, RappelEnvoye
+
+logger = logging.getLogger('mediatheque')
+
+CHAMPS_ARCHIVES = [
+    'id', 'membre_id', 'livre_id', 'dvd_id', 'cd_id', 'date_emprunt',
+    'date_retour_prevue', 'date_retour_effective', 'nombre_prolongations',
+]
+
+ORDRE_HISTORIQUE = ('-date_retour_effective', '-pk')
+
+
+def date_limite_par_defaut():
+    """Date avant laquelle les emprunts rendus sont archivés par défaut"""
+    return timezone.now().date() - timedelta(days=settings.ARCHIVE_RETENTION_JOURS)
+
+
+def supprimer_par_ids(modele, ids):
+    """DELETE direct, sans le collecteur de l'ORM ni les signaux ; retourne le nombre de lignes"""
+    if not ids:
+        return 0
+    marqueurs = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as curseur:
+        curseur.execute(f'DELETE FROM "{modele._meta.db_table}" WHERE id IN ({marqueurs})', list(ids))
+        return curseur.rowcount
+
+
+@transaction.atomic
+def archiver_lot(avant, taille_lot):
+    """Archive un lot d'emprunts rendus avant la date ; retourne les membres concernés"""
+    lot = list(
+        Emprunt.objects.filter(date_retour_effective__lt=avant)
+        .order_by('pk').values(*CHAMPS_ARCHIVES)[:taille_lot]
+    )
+    if not lot:
+        return Counter()
+    EmpruntArchive.objects.bulk_create([EmpruntArchive(**ligne) for ligne in lot])
+    ids = [ligne['id'] for ligne in lot]
+    RappelEnvoye.objects.filter(emprunt_id__in=ids).delete()
+    supprimer_par_ids(Emprunt, ids)
+
+    par_membre = Counter(ligne['membre_id'] for ligne in lot)
+    ajuster_compteurs(par_membre)
+    return par_membre
+
+
+def ajuster_compteurs(par_membre, signe=1):
+    """Reporte sur Membre.nombre_emprunts_archives des emprunts archivés (ou supprimés, signe=-1)"""
+    # Un UPDATE par nombre d'emprunts plutôt qu'un par membre
+    membres_par_nombre = defaultdict(list)
+    for membre_id, nombre in par_membre.items():
+        membres_par_nombre[nombre].append(membre_id)
+    for nombre, membres in membres_par_nombre.items():
+        Membre.tous.filter(pk__in=membres).update(
+            nombre_emprunts_archives=F('nombre_emprunts_archives') + signe * nombre
+        )
+
+
+def archiver(avant=None, taille_lot=1000):
+    """Archive tous les emprunts rendus avant la date ; retourne leur nombre"""
+    avant = avant or date_limite_par_defaut()
+    total = 0
+    while True:
+        par_membre = archiver_lot(avant, taille_lot)
+        if not par_membre:
+            break
+        total += sum(par_membre.values())
+        for membre_id in par_membre:
+            versions.incrementer(f"emprunts_membre:{membre_id}")
+    logger.info(f"Archivage des emprunts rendus avant le {avant} : {total} emprunt(s)")
+    return total
+
+
+class HistoriqueEmprunts:
+    """Emprunts terminés d'un membre, du plus récent au plus ancien, archive comprise.
+
+    S'utilise comme une liste paginable (count() et tranches). Les emprunts
+    archivés étant toujours plus anciens que ceux restés en table, l'archive
+    n'est lue que pour les tranches qui dépassent la table des emprunts.
+    """
+
+    def __init__(self, membre):
+        self.membre = membre
+        self.recents = (
+            membre.emprunt_set.filter(date_retour_effective__isnull=False)
+            .select_related('livre', 'dvd', 'cd').order_by(*ORDRE_HISTORIQUE)
+        )
+        self.archives = (
+            EmpruntArchive.objects.filter(membre=membre)
+            .select_related('livre', 'dvd', 'cd').order_by(*ORDRE_HISTORIQUE)
+        )
+        self._nb_recents = None
+
+    def nombre_recents(self):
+        if self._nb_recents is None:
+            self._nb_recents = self.recents.count()
+        return self._nb_recents
+
+    def count(self):
+        return self.nombre_recents() + self.membre.nombre_emprunts_archives
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, tranche):
+        if not isinstance(tranche, slice):
+            resultat = self[tranche:tranche + 1]
+            if not resultat:
+                raise IndexError(tranche)
+            return resultat[0]
+        debut, fin = tranche.start or 0, tranche.stop if tranche.stop is not None else self.count()
+        nb_recents = self.nombre_recents()
+        resultat = list(self.recents[debut:min(fin, nb_recents)]) if debut < nb_recents else []
+        if fin > nb_recents:
+            resultat += list(self.archives[max(debut - nb_recents, 0):fin - nb_recents])
+        return resultat
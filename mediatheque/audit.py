@@ -0,0 +1,77 @@
+"""Journal d'audit structuré des modifications (table Evenement).
+
+Les événements sont accumulés en mémoire et écrits en un seul bulk_create,
+à la fin de chaque requête (AuditMiddleware) ou dès que le tampon atteint
+AUDIT_TAILLE_LOT événements. Une requête qui échoue n'écrit rien : ses
+événements en attente sont abandonnés. Hors requête (commandes, worker),
+appeler vider() une fois le traitement terminé.
+"""
+import threading
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Evenement
+
+_local = threading.local()
+
+
+def _tampon():
+    if not hasattr(_local, 'evenements'):
+        _local.evenements = []
+    return _local.evenements
+
+
+def enregistrer(acteur, action, objet, donnees=None):
+    """Ajoute un événement au tampon ; objet est une instance ou un couple (type, id)"""
+    if isinstance(objet, tuple):
+        type_objet, objet_id = objet
+    else:
+        type_objet, objet_id = objet._meta.model_name, objet.pk
+    tampon = _tampon()
+    tampon.append(Evenement(
+        acteur=acteur if acteur is not None and acteur.is_authenticated else None,
+        action=action,
+        type_objet=type_objet,
+        objet_id=objet_id,
+        date=timezone.now(),
+        donnees=donnees or {},
+    ))
+    if len(tampon) >= settings.AUDIT_TAILLE_LOT:
+        vider()
+
+
+def vider():
+    """Écrit les événements en attente en une seule requête ; retourne leur nombre"""
+    tampon = _tampon()
+    if not tampon:
+        return 0
+    evenements = list(tampon)
+    tampon.clear()
+    Evenement.objects.bulk_create(evenements)
+    return len(evenements)
+
+
+def abandonner():
+    """Oublie les événements en attente, par exemple après une erreur"""
+    _tampon().clear()
+
+
+class AuditMiddleware:
+    """Écrit les événements d'audit de la requête une fois la réponse produite"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        except Exception:
+            abandonner()
+            raise
+        vider()
+        return response
+
+    def process_exception(self, request, exception):
+        # Exception de la vue, convertie ensuite en réponse 500 par Django
+        abandonner()
@@ -0,0 +1,323 @@
+"""Autocomplétion des titres et auteurs par index de préfixes en mémoire.
+
+L'index est une liste triée de clés normalisées (titre et auteur entiers,
+puis chacun de leurs mots), chacune associée au média qui la porte.
+Une recherche est une dichotomie suivie d'un parcours des clés partageant
+le préfixe, sans requête SQL.
+
+L'index est construit au premier usage dans chaque processus et tenu à jour
+par les signaux des modèles dans le processus qui modifie le catalogue.
+Chaque modification est journalisée dans le cache partagé sous un numéro
+de version ; les autres processus la rejouent sur leur index, et ne le
+reconstruisent (en arrière-plan) que si le journal est incomplet. Au-delà de AUTOCOMPLETION_MAX_MEDIAS médias, il n'est pas
+construit et la recherche se rabat sur la base.
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+import logging
+import re
+import threading
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from . import versions
+
+logger = logging.getLogger('mediatheque')
+
+# Champs indexés et code de chaque type de média
+CHAMPS = {
+    'livre': ('titre', 'auteur'),
+    'dvd': ('titre', 'auteur'),
+    'cd': ('titre', 'auteur', 'artiste'),
+    'jeu': ('titre', 'editeur'),
+}
+CODES_TYPE = {type_media: code for code, type_media in enumerate(CHAMPS)}
+TYPES_PAR_CODE = {code: type_media for type_media, code in CODES_TYPE.items()}
+DECALAGE = 1 << 32
+
+# Au-delà, la saisie est assez discriminante : les clés sont tronquées
+LONGUEUR_CLE = 20
+LONGUEUR_MOT_MIN = 2
+CLES_PAR_MEDIA_MAX = 8
+
+
+# Diacritiques isolés par la décomposition NFKD, et tout ce qui n'est ni lettre ni chiffre
+DIACRITIQUES = re.compile('[\u0300-\u036f]')
+SEPARATEURS = re.compile(r'[\W_]+')
+
+
+def normaliser(texte):
+    """Minuscules sans accents ni ponctuation"""
+    decompose = unicodedata.normalize('NFKD', texte or '')
+    return SEPARATEURS.sub(' ', DIACRITIQUES.sub('', decompose).lower())
+
+
+def mots_cles(textes):
+    """Clés d'index d'un média : le texte entier puis chaque mot suivant le premier"""
+    mots = []
+    for texte in textes:
+        normalise = normaliser(texte).split()
+        if normalise:
+            # Le texte entier d'abord, pour les préfixes de plusieurs mots
+            mots.append(' '.join(normalise)[:LONGUEUR_CLE])
+            mots.extend(mot[:LONGUEUR_CLE] for mot in normalise[1:] if len(mot) >= LONGUEUR_MOT_MIN)
+    return list(dict.fromkeys(mots))[:CLES_PAR_MEDIA_MAX]
+
+
+class IndexPrefixes:
+    """Clés triées associées à des emplacements de médias.
+
+    Les clés sont une liste de chaînes partagées (un même mot n'est stocké
+    qu'une fois) et les emplacements un tableau d'entiers aligné sur elles.
+    Un média retiré ou remplacé libère son emplacement, mais ses clés et
+    l'emplacement restent jusqu'au prochain compactage, déclenché quand les
+    clés ou les emplacements morts dépassent PROPORTION_MORTES.
+    """
+    PROPORTION_MORTES = 0.1
+
+    def __init__(self):
+        self.cles = []
+        self.emplacements = array('i')
+        self.codes = array('q')
+        self.libelles = []
+        self.nombre_cles = array('B')
+        self.mortes = 0
+        self.emplacements_morts = 0
+        self.verrou = threading.Lock()
+
+    def construire(self, medias):
+        """Construit l'index à partir de (type_media, id, libellé, textes)"""
+        vocabulaire = {}
+        cles, emplacements = [], array('i')
+        for type_media, pk, libelle, textes in medias:
+            emplacement = len(self.codes)
+            mots = mots_cles(textes)
+            self.codes.append(CODES_TYPE[type_media] * DECALAGE + pk)
+            self.libelles.append(libelle)
+            self.nombre_cles.append(len(mots))
+            for mot in mots:
+                cles.append(vocabulaire.setdefault(mot, mot))
+                emplacements.append(emplacement)
+        ordre = sorted(range(len(cles)), key=cles.__getitem__)
+        self.cles = [cles[i] for i in ordre]
+        self.emplacements = array('i', (emplacements[i] for i in ordre))
+
+    def ajouter(self, type_media, pk, libelle, textes):
+        """Ajoute ou remplace un média"""
+        code = CODES_TYPE[type_media] * DECALAGE + pk
+        with self.verrou:
+            self._retirer(code)
+            emplacement = len(self.codes)
+            mots = mots_cles(textes)
+            self.codes.append(code)
+            self.libelles.append(libelle)
+            self.nombre_cles.append(len(mots))
+            for mot in mots:
+                position = bisect_right(self.cles, mot)
+                self.cles.insert(position, mot)
+                self.emplacements.insert(position, emplacement)
+
+    def retirer(self, type_media, pk):
+        """Retire un média de l'index"""
+        with self.verrou:
+            self._retirer(CODES_TYPE[type_media] * DECALAGE + pk)
+
+    def _emplacement(self, code):
+        """Emplacement d'un média, par recherche d'octets (bien plus rapide que array.index)"""
+        octets, motif = self.codes.tobytes(), array('q', [code]).tobytes()
+        position = octets.find(motif)
+        while position >= 0 and position % self.codes.itemsize:
+            position = octets.find(motif, position + 1)
+        return position // self.codes.itemsize if position >= 0 else None
+
+    def _retirer(self, code):
+        emplacement = self._emplacement(code)
+        if emplacement is None:
+            return
+        self.codes[emplacement] = -1
+        self.libelles[emplacement] = None
+        self.mortes += self.nombre_cles[emplacement]
+        self.emplacements_morts += 1
+        if (self.mortes > self.PROPORTION_MORTES * len(self.cles)
+                or self.emplacements_morts > self.PROPORTION_MORTES * len(self.codes)):
+            self._compacter()
+
+    def _compacter(self):
+        """Supprime les clés et les emplacements des médias retirés, puis renumérote les emplacements"""
+        nouveaux = {}
+        codes, libelles, nombre_cles = array('q'), [], array('B')
+        for ancien, code in enumerate(self.codes):
+            if code >= 0:
+                nouveaux[ancien] = len(codes)
+                codes.append(code)
+                libelles.append(self.libelles[ancien])
+                nombre_cles.append(self.nombre_cles[ancien])
+        vivantes = [i for i, emplacement in enumerate(self.emplacements) if emplacement in nouveaux]
+        self.cles = [self.cles[i] for i in vivantes]
+        self.emplacements = array('i', (nouveaux[self.emplacements[i]] for i in vivantes))
+        self.codes, self.libelles, self.nombre_cles = codes, libelles, nombre_cles
+        self.mortes = self.emplacements_morts = 0
+
+    def rechercher(self, saisie, limite=10):
+        """Médias dont un mot commence par la saisie : [(type_media, id, libellé)]"""
+        prefixe = ' '.join(normaliser(saisie).split())[:LONGUEUR_CLE]
+        if not prefixe:
+            return []
+        resultats = {}
+        with self.verrou:
+            position = bisect_left(self.cles, prefixe)
+            while position < len(self.cles) and len(resultats) < limite:
+                if not self.cles[position].startswith(prefixe):
+                    break
+                emplacement = self.emplacements[position]
+                if self.codes[emplacement] >= 0:
+                    resultats.setdefault(self.codes[emplacement], self.libelles[emplacement])
+                position += 1
+        return [(TYPES_PAR_CODE[code // DECALAGE], code % DECALAGE, libelle) for code, libelle in resultats.items()]
+
+
+# Modifications journalisées dans le cache pour les autres processus ; au-delà, reconstruction
+JOURNAL_MAX = 1000
+JOURNAL_DUREE = 3600
+
+_index = None
+_version = None
+_verrou = threading.Lock()
+_reconstruction = None
+
+
+def modeles():
+    from .models import CD, DVD, JeuPlateau, Livre
+    return {'livre': Livre, 'dvd': DVD, 'cd': CD, 'jeu': JeuPlateau}
+
+
+def libelle(titre, *autres):
+    """Texte affiché pour une suggestion : titre et premier auteur renseigné"""
+    auteur = next((a for a in autres if a), '')
+    return f"{titre} - {auteur}" if auteur else titre
+
+
+def lire_medias():
+    """(type_media, id, libellé, textes) de tout le catalogue, lus par lots"""
+    for type_media, modele in modeles().items():
+        for pk, *textes in modele.objects.values_list('pk', *CHAMPS[type_media]).iterator(chunk_size=5000):
+            yield type_media, pk, libelle(*textes), textes
+
+
+def index():
+    """Index du processus, à jour ou en cours de reconstruction ; None si le catalogue est trop grand.
+
+    Les modifications des autres processus sont rejouées depuis le journal
+    du cache. S'il est incomplet, l'index est reconstruit en arrière-plan et
+    l'ancien reste servi jusque-là ; seule la première construction bloque.
+    """
+    global _index, _version
+    version = versions.obtenir('autocompletion')
+    if version == _version:
+        return _index
+    with _verrou:
+        if version == _version or (_index is not None and _rattraper(version)):
+            return _index
+        if _index is not None:
+            _lancer_reconstruction()
+            return _index
+        _index, _version = construire(), version
+    return _index
+
+
+def construire():
+    """Nouvel index du catalogue, ou None s'il dépasse AUTOCOMPLETION_MAX_MEDIAS"""
+    total = sum(modele.objects.count() for modele in modeles().values())
+    if total > settings.AUTOCOMPLETION_MAX_MEDIAS:
+        return None
+    nouvel_index = IndexPrefixes()
+    nouvel_index.construire(lire_medias())
+    return nouvel_index
+
+
+def _cle_journal(version):
+    return f"autocompletion:journal:{version}"
+
+
+def _appliquer(courant, modification):
+    operation, type_media, pk, *donnees = modification
+    if operation == 'ajouter':
+        courant.ajouter(type_media, pk, *donnees)
+    else:
+        courant.retirer(type_media, pk)
+
+
+def _rattraper(version):
+    """Rejoue sur l'index local les modifications journalisées depuis sa version"""
+    global _version
+    if not 0 < version - _version <= JOURNAL_MAX:
+        return False
+    cles = [_cle_journal(v) for v in range(_version + 1, version + 1)]
+    journal = cache.get_many(cles)
+    if len(journal) != len(cles):
+        return False
+    for cle in cles:
+        _appliquer(_index, journal[cle])
+    _version = version
+    return True
+
+
+def _reconstruire():
+    global _index, _version, _reconstruction
+    try:
+        version = versions.obtenir('autocompletion')
+        nouvel_index = construire()
+        with _verrou:
+            # Les modifications faites pendant la construction sont rejouées au prochain accès
+            _index, _version = nouvel_index, version
+    except Exception:
+        logger.exception("Reconstruction de l'index d'autocomplétion impossible")
+    finally:
+        _reconstruction = None
+        connection.close()
+
+
+def _lancer_reconstruction():
+    """Reconstruit l'index dans un thread, sauf si une reconstruction est déjà en cours"""
+    global _reconstruction
+    if _reconstruction is None:
+        _reconstruction = threading.Thread(target=_reconstruire, daemon=True)
+        _reconstruction.start()
+
+
+def _modifier(modification):
+    """Applique une modification à l'index local et la journalise pour les autres processus"""
+    global _version
+    nouvelle = versions.incrementer('autocompletion')
+    cache.set(_cle_journal(nouvelle), modification, JOURNAL_DUREE)
+    with _verrou:
+        # Index local à jour s'il l'était avant ce changement, sinon rattrapé au prochain accès
+        if _index is not None and _version is not None and _version + 1 == nouvelle:
+            _appliquer(_index, modification)
+            _version = nouvelle
+
+
+def mettre_a_jour(type_media, media):
+    """Répercute l'ajout ou la modification d'un média"""
+    textes = [getattr(media, champ) for champ in CHAMPS[type_media]]
+    _modifier(('ajouter', type_media, media.pk, libelle(*textes), textes))
+
+
+def retirer(type_media, pk):
+    """Retire un média supprimé"""
+    _modifier(('retirer', type_media, pk))
+
+
+def rechercher(saisie, limite=10):
+    """Suggestions pour une saisie, depuis l'index ou à défaut la base"""
+    courant = index()
+    if courant is not None:
+        return courant.rechercher(saisie, limite)
+    resultats = []
+    for type_media, modele in modeles().items():
+        for media in modele.objects.filter(titre__istartswith=saisie.strip()).order_by('titre')[:limite]:
+            resultats.append((type_media, media.pk, libelle(*(getattr(media, c) for c in CHAMPS[type_media]))))
+    return sorted(resultats, key=lambda r: r[2])[:limite]
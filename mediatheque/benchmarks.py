@@ -0,0 +1,517 @@
+"""Scénarios de benchmark exécutés par ``manage.py benchmark <scenario>``.
+
+Chaque scénario tourne sur une base de test jetable créée par la commande :
+la base configurée n'est jamais modifiée.
+"""
+import gzip
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connection, connections, transaction
+from django.db.models import Count, Q
+from django.test import Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import autocompletion, partitions, recommandations, sqlite, suppression, synchronisation, throttling
+from .models import Emprunt, Exemplaire, Livre, Membre
+
+SCENARIOS = {}
+
+
+def scenario(nom):
+    """Enregistre une fonction comme scénario de benchmark"""
+    def decorateur(fonction):
+        SCENARIOS[nom] = fonction
+        return fonction
+    return decorateur
+
+
+def chronometrer(fonction, repetitions):
+    """Exécute la fonction et retourne la liste des durées en millisecondes"""
+    durees = []
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        fonction()
+        durees.append((time.perf_counter() - debut) * 1000)
+    return durees
+
+
+def resume(durees):
+    """Résumé lisible d'une série de durées (ms)"""
+    durees = sorted(durees)
+    p95 = durees[min(len(durees) - 1, int(len(durees) * 0.95))]
+    return f"moy {statistics.mean(durees):.3f} ms | p50 {statistics.median(durees):.3f} ms | p95 {p95:.3f} ms"
+
+
+# ============== SESSIONS ==============
+
+MOTEURS_SESSION = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+    'cache': 'django.contrib.sessions.backends.cache',
+}
+
+
+@scenario('sessions')
+def bench_sessions(sortie, options):
+    """Latence d'une requête authentifiée sur espace_membre pour chaque moteur de session"""
+    user = User.objects.create_user(username='bench_membre', password='bench')
+    Membre.objects.create(user=user, nom="Bench", prenom="Membre", email="bench@test.com")
+    url = reverse('espace_membre')
+
+    for nom, moteur in MOTEURS_SESSION.items():
+        with override_settings(SESSION_ENGINE=moteur):
+            client = Client()
+            client.force_login(user)
+            client.get(url)  # préchauffage (cache de session)
+            with CaptureQueriesContext(connection) as requetes:
+                client.get(url)
+            nb_requetes = len(requetes)
+            durees = chronometrer(lambda: client.get(url), options['repetitions'])
+        sortie.write(f"{nom:<15} {resume(durees)} | {nb_requetes} requête(s) SQL")
+
+
+# ============== CONNEXIONS ==============
+
+CONFIGURATIONS_HACHAGE = {
+    'pbkdf2 (défaut Django)': ('mediatheque.hashers.PBKDF2AjustablePasswordHasher', {}),
+    'pbkdf2 (300 000 it.)': ('mediatheque.hashers.PBKDF2AjustablePasswordHasher',
+                             {'PASSWORD_PBKDF2_ITERATIONS': 300_000}),
+    'scrypt (défaut Django)': ('mediatheque.hashers.ScryptAjustablePasswordHasher', {}),
+    'scrypt (N=2^13)': ('mediatheque.hashers.ScryptAjustablePasswordHasher',
+                        {'PASSWORD_SCRYPT_WORK_FACTOR': 2 ** 13}),
+    'argon2 (défaut Django)': ('mediatheque.hashers.Argon2AjustablePasswordHasher', {}),
+}
+
+
+@scenario('connexions')
+def bench_connexions(sortie, options):
+    """Connexions par seconde sur un cœur pour chaque configuration de hachage"""
+    repetitions = max(5, options['repetitions'] // 10)
+    requete = RequestFactory().post('/login/membre/')
+
+    for nom, (hacheur, parametres) in CONFIGURATIONS_HACHAGE.items():
+        with override_settings(PASSWORD_HASHERS=[hacheur], **parametres):
+            try:
+                user = User.objects.create_user(username='bench', password='bench')
+            except ValueError as erreur:
+                # Bibliothèque optionnelle absente (argon2-cffi)
+                sortie.write(f"{nom:<24} ignoré : {erreur}")
+                continue
+            durees = chronometrer(lambda: authenticate(requete, username='bench', password='bench'), repetitions)
+            user.delete()
+        sortie.write(f"{nom:<24} {1000 / statistics.mean(durees):8.1f} connexions/s | {resume(durees)}")
+
+    # Une tentative bloquée par la limitation ne calcule aucun hachage
+    cache.clear()
+    for _ in range(settings.LOGIN_ECHECS_MAX_UTILISATEUR):
+        throttling.enregistrer_echec(requete, 'bench')
+    durees = chronometrer(lambda: throttling.est_bloque(requete, 'bench'), options['repetitions'])
+    sortie.write(f"{'tentative bloquée':<24} {1000 / statistics.mean(durees):8.1f} vérifications/s | {resume(durees)}")
+
+
+# ============== CONCURRENCE SQLITE ==============
+
+NB_POSTES = 8
+NB_LIVRES_BENCH = 20
+NB_MEMBRES_BENCH = 50
+
+
+def _preparer_base_sqlite(chemin):
+    """Copie dans un fichier la base de test (tables réelles) garnie de livres, exemplaires et membres"""
+    Livre.objects.bulk_create(
+        Livre(titre=f"Livre {i}", nombre_exemplaires=10) for i in range(NB_LIVRES_BENCH)
+    )
+    Exemplaire.objects.completer(Livre)
+    Membre.objects.bulk_create(
+        Membre(nom=f"Membre{i}", prenom="Bench", email=f"membre{i}@bench.test") for i in range(NB_MEMBRES_BENCH)
+    )
+    connection.ensure_connection()
+    destination = sqlite3.connect(chemin)
+    try:
+        connection.connection.backup(destination)
+    finally:
+        destination.close()
+
+
+def _poste(parametres, operations, membres, resultats):
+    """Un poste de prêt enchaînant emprunts, consultations et retours par l'ORM"""
+    # Connexion propre au thread, ouverte avec les réglages du profil
+    connections[DEFAULT_DB_ALIAS] = type(connections[DEFAULT_DB_ALIAS])(parametres, DEFAULT_DB_ALIAS)
+    durees, erreurs = [], 0
+    for numero in range(operations):
+        debut = time.perf_counter()
+        try:
+            if numero % 2:
+                list(Exemplaire.objects.values('etat').annotate(nombre=Count('id')))
+            elif numero % 4 == 0:
+                with transaction.atomic():
+                    exemplaire = Exemplaire.objects.filter(etat='disponible').order_by('?').first()
+                    if exemplaire:
+                        Emprunt.objects.create(
+                            membre_id=random.choice(membres), livre_id=exemplaire.livre_id, exemplaire=exemplaire
+                        )
+            else:
+                with transaction.atomic():
+                    emprunt = Emprunt.objects.en_cours().order_by('?').values_list('pk', flat=True).first()
+                    if emprunt:
+                        Emprunt.objects.filter(pk=emprunt).marquer_retournes()
+        except OperationalError as erreur:
+            if 'locked' not in str(erreur) and 'busy' not in str(erreur):
+                raise
+            erreurs += 1
+        durees.append((time.perf_counter() - debut) * 1000)
+    connections[DEFAULT_DB_ALIAS].close()
+    resultats.append((durees, erreurs))
+
+
+@scenario('sqlite_concurrence')
+def bench_sqlite_concurrence(sortie, options):
+    """Taux d'erreurs de verrou de postes de prêt concurrents, réglages par défaut puis profil de performance"""
+    if connection.vendor != 'sqlite':
+        sortie.write("Scénario ignoré : il mesure le profil SQLite.")
+        return
+    operations = options['repetitions']
+    with tempfile.TemporaryDirectory() as dossier:
+        modele = os.path.join(dossier, 'modele.sqlite3')
+        _preparer_base_sqlite(modele)
+        membres = list(Membre.objects.values_list('pk', flat=True))
+        for profil in ('défaut', 'performance'):
+            chemin = os.path.join(dossier, f'{profil}.sqlite3')
+            shutil.copyfile(modele, chemin)
+            parametres = {
+                **connection.settings_dict,
+                'NAME': chemin,
+                'OPTIONS': sqlite.options_performance() if profil == 'performance' else {},
+            }
+            resultats = []
+            # Les pragmas sont posés par le signal connection_created (signals.configurer_sqlite)
+            with override_settings(SQLITE_PERFORMANCE=profil == 'performance'):
+                postes = [
+                    threading.Thread(target=_poste, args=(parametres, operations, membres, resultats))
+                    for _ in range(NB_POSTES)
+                ]
+                debut = time.perf_counter()
+                for poste in postes:
+                    poste.start()
+                for poste in postes:
+                    poste.join()
+                ecoule = time.perf_counter() - debut
+            durees = [d for serie, _ in resultats for d in serie]
+            erreurs = sum(e for _, e in resultats)
+            total = NB_POSTES * operations
+            sortie.write(
+                f"{profil:<12} {total / ecoule:8.1f} op/s | erreurs de verrou {erreurs}/{total} "
+                f"({100 * erreurs / total:.1f} %) | {resume(durees)}"
+            )
+
+
+# ============== PARTITIONNEMENT DES EMPRUNTS ==============
+
+def _generer_historique(volume, nb_membres=10_000, nb_livres=1_000, nb_actifs=5_000):
+    """Historique d'emprunts terminés étalé sur dix ans, plus quelques emprunts en cours"""
+    Membre.objects.bulk_create(
+        Membre(nom=f"Membre{i}", prenom="Bench", email=f"membre{i}@bench.test") for i in range(nb_membres)
+    )
+    Livre.objects.bulk_create(Livre(titre=f"Livre {i}") for i in range(nb_livres))
+    membre_min = Membre.objects.order_by('pk').values_list('pk', flat=True).first()
+    livre_min = Livre.objects.order_by('pk').values_list('pk', flat=True).first()
+    with connection.cursor() as curseur:
+        curseur.execute(f"""
+            INSERT INTO "{Emprunt._meta.db_table}"
+                (membre_id, livre_id, date_emprunt, date_retour_prevue, date_retour_effective,
+                 date_modification, nombre_prolongations)
+            SELECT %s + i %% %s, %s + i %% %s, j, j + 7,
+                   CASE WHEN i <= %s THEN NULL ELSE j + 5 END, now(), 0
+            FROM (SELECT i, current_date - CASE WHEN i <= %s THEN i %% 10 ELSE i %% 3650 END AS j
+                  FROM generate_series(1, %s) AS i) AS s
+        """, [membre_min, nb_membres, livre_min, nb_livres, nb_actifs, nb_actifs, volume])
+        curseur.execute(f'ANALYZE "{Emprunt._meta.db_table}"')
+    return membre_min
+
+
+def _partitions_parcourues(queryset):
+    """Nombre de partitions (ou tables) lues par le plan d'exécution"""
+    plan = queryset.explain()
+    return sum(1 for ligne in plan.splitlines() if f"on {Emprunt._meta.db_table}" in ligne)
+
+
+@scenario('partitions')
+def bench_partitions(sortie, options):
+    """Requêtes sur les emprunts avant et après partitionnement, sur un gros historique (PostgreSQL)"""
+    if connection.vendor != 'postgresql':
+        sortie.write("Scénario ignoré : le partitionnement nécessite PostgreSQL.")
+        return
+    volume = options['volume'] or 10_000_000
+    sortie.write(f"Génération de {volume} emprunts...")
+    membre = _generer_historique(volume)
+    il_y_a_un_an = timezone.now().date() - timedelta(days=365)
+
+    requetes = {
+        'en cours du membre': lambda: Emprunt.objects.en_cours().filter(membre_id=membre),
+        'en cours (liste)': lambda: Emprunt.objects.en_cours().order_by('date_retour_prevue')[:50],
+        'historique récent': lambda: Emprunt.objects.filter(membre_id=membre, date_emprunt__gte=il_y_a_un_an),
+        "emprunts de l'année": lambda: Emprunt.objects.filter(date_emprunt__gte=il_y_a_un_an).values('livre_id')
+        .annotate(n=Count('id')).order_by('-n')[:10],
+    }
+
+    for etat in ('table simple', 'partitionnée'):
+        if etat == 'partitionnée':
+            debut = time.perf_counter()
+            nombre = partitions.convertir('annee')
+            sortie.write(f"Conversion en {nombre} partitions : {time.perf_counter() - debut:.1f} s")
+        for nom, requete in requetes.items():
+            durees = chronometrer(lambda: list(requete()), options['repetitions'])
+            sortie.write(f"{etat:<13} {nom:<20} {resume(durees)} | {_partitions_parcourues(requete())} table(s) lue(s)")
+
+
+# ============== SUPPRESSION ==============
+
+def _livre_avec_historique(membre, volume):
+    """Livre et `volume` emprunts terminés"""
+    livre = Livre.objects.create(titre="Livre très emprunté")
+    jour = timezone.now().date() - timedelta(days=30)
+    Emprunt.objects.bulk_create(
+        (Emprunt(membre=membre, livre=livre, date_retour_prevue=jour, date_retour_effective=jour)
+         for _ in range(volume)),
+        batch_size=5000,
+    )
+    return livre
+
+
+def _supprimer_en_requete(livre):
+    livre.delete()
+
+
+def _supprimer_logiquement(livre):
+    livre.supprimer()
+
+
+@scenario('suppression')
+def bench_suppression(sortie, options):
+    """Suppression d'un média ayant un gros historique : delete() en requête contre drapeau et purge par lots"""
+    volume = options['volume'] or 100_000
+    membre = Membre.objects.create(nom="Bench", prenom="Suppression", email="suppression@bench.test")
+    sortie.write(f"Média avec {volume} emprunts")
+
+    for nom, supprimer, purger in (
+        ('delete() en requête', _supprimer_en_requete, False),
+        ('drapeau + purge', _supprimer_logiquement, True),
+    ):
+        # Premier passage chronométré, second passage pour le pic mémoire (tracemalloc ralentit)
+        livre = _livre_avec_historique(membre, volume)
+        debut = time.perf_counter()
+        supprimer(livre)
+        reponse = time.perf_counter() - debut
+        if purger:
+            suppression.purger('livre', livre.pk)
+        total = time.perf_counter() - debut
+
+        livre = _livre_avec_historique(membre, volume)
+        tracemalloc.start()
+        supprimer(livre)
+        if purger:
+            suppression.purger('livre', livre.pk)
+        pic = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        sortie.write(
+            f"{nom:<20} réponse {reponse * 1000:9.1f} ms | total {total * 1000:9.1f} ms | "
+            f"pic mémoire {pic / 1024 / 1024:7.1f} Mo"
+        )
+
+
+# ============== RECOMMANDATIONS ==============
+
+@scenario('recommandations')
+def bench_recommandations(sortie, options):
+    """Calcul des voisins sur un historique synthétique, puis lecture des recommandations d'un média"""
+    try:
+        numpy, _ = recommandations.importer_numpy()
+    except ImportError:
+        sortie.write("Scénario ignoré : NumPy et SciPy sont requis.")
+        return
+    volume = options['volume'] or 5_000_000
+    nb_membres, nb_livres = 100_000, 20_000
+    Livre.objects.bulk_create((Livre(titre=f"Livre {i}") for i in range(nb_livres)), batch_size=5000)
+    pks = numpy.array(Livre.objects.order_by('pk').values_list('pk', flat=True), dtype=numpy.int64)
+
+    # Popularité des livres en loi de Zipf, comme dans un vrai catalogue
+    generateur = numpy.random.default_rng(0)
+    membres = generateur.integers(0, nb_membres, volume)
+    rangs = numpy.minimum(generateur.zipf(1.3, volume), nb_livres) - 1
+    medias = pks[rangs]
+    sortie.write(f"{volume} emprunts, {nb_membres} membres, {nb_livres} livres")
+
+    debut = time.perf_counter()
+    tracemalloc.start()
+    voisins = recommandations.calculer_voisins(membres, medias)
+    pic = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    sortie.write(f"Calcul des voisins : {time.perf_counter() - debut:.1f} s | pic mémoire {pic / 1024 / 1024:.0f} Mo")
+
+    debut = time.perf_counter()
+    nombre = recommandations.enregistrer(voisins)
+    sortie.write(f"Enregistrement de {nombre} recommandations : {time.perf_counter() - debut:.1f} s")
+
+    livre = int(pks[0])
+    durees = chronometrer(lambda: recommandations.pour_media('livre', livre), options['repetitions'])
+    sortie.write(f"Lecture des recommandations d'un média : {resume(durees)}")
+
+
+# ============== AUTOCOMPLÉTION ==============
+
+def _titres_synthetiques(volume, graine=0):
+    """(type_media, id, libellé, textes) de titres faits de mots aléatoires"""
+    hasard = random.Random(graine)
+    syllabes = ['ma', 'ri', 'lo', 'te', 'na', 'vé', 'cha', 'pon', 'du', 'lé', 'gri', 'sor', 'bel', 'mon', 'é']
+    mots = sorted({''.join(hasard.choices(syllabes, k=hasard.randint(2, 4))) for _ in range(20_000)})
+    for pk in range(1, volume + 1):
+        titre = ' '.join(hasard.choices(mots, k=hasard.randint(1, 5))).capitalize()
+        auteur = f"{hasard.choice(mots).capitalize()} {hasard.choice(mots).capitalize()}"
+        yield 'livre', pk, f"{titre} - {auteur}", (titre, auteur)
+
+
+@scenario('autocompletion')
+def bench_autocompletion(sortie, options):
+    """Construction, mémoire et latence de l'index de préfixes, comparées à une requête SQL"""
+    volume = options['volume'] or 1_000_000
+    titres = list(_titres_synthetiques(volume))
+    debut = time.perf_counter()
+    index = autocompletion.IndexPrefixes()
+    index.construire(titres)
+    duree = time.perf_counter() - debut
+
+    # Seconde construction pour la mémoire (tracemalloc ralentit), titres exclus
+    del index
+    tracemalloc.start()
+    index = autocompletion.IndexPrefixes()
+    index.construire(titres)
+    memoire = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    sortie.write(f"{volume} titres, {len(index.cles)} clés : construction {duree:.1f} s | mémoire {memoire / 1024 / 1024:.0f} Mo")
+
+    for saisie in ('m', 'ma', 'mari', 'chapon lo', 'zzz'):
+        durees = chronometrer(lambda: index.rechercher(saisie), options['repetitions'])
+        sortie.write(f"recherche {saisie!r:<12} {resume(durees)}")
+    compteur = iter(range(volume + 1, volume + 1 + options['repetitions']))
+    durees = chronometrer(
+        lambda: index.ajouter('livre', next(compteur), "Nouveau titre", ("Nouveau titre", "Auteur")),
+        options['repetitions'],
+    )
+    sortie.write(f"ajout incrémental     {resume(durees)}")
+
+    # Référence : icontains en base sur une fraction du volume
+    echantillon = min(volume, 100_000)
+    Livre.objects.bulk_create(
+        (Livre(titre=textes[0], auteur=textes[1]) for _, _, _, textes in titres[:echantillon]),
+        batch_size=5000,
+    )
+    for saisie in ('mari', 'zzz'):
+        durees = chronometrer(
+            lambda: list(Livre.objects.filter(Q(titre__icontains=saisie) | Q(auteur__icontains=saisie))[:10]),
+            min(options['repetitions'], 50),
+        )
+        sortie.write(f"icontains SQL {saisie!r:<6} ({echantillon} livres) {resume(durees)}")
+
+
+@scenario('synchronisation')
+def bench_synchronisation(sortie, options):
+    """Octets transférés par une borne : instantané complet contre delta après une journée de prêts"""
+    volume = options['volume'] or 50_000
+    Livre.objects.bulk_create(
+        (Livre(titre=textes[0], auteur=textes[1]) for _, _, _, textes in _titres_synthetiques(volume)),
+        batch_size=5000,
+    )
+    membre = Membre.objects.create(nom="Bench", prenom="Borne", email="borne@bench.local")
+
+    debut = time.perf_counter()
+    donnees = synchronisation.instantane()
+    duree = time.perf_counter() - debut
+    brut = json.dumps(donnees, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    sortie.write(
+        f"instantané {volume} livres : {duree:.1f} s | {len(brut) / 1024:.0f} Ko, "
+        f"{len(gzip.compress(brut)) / 1024:.0f} Ko compressé"
+    )
+
+    # Une journée d'antenne : quelques centaines d'emprunts et de retours
+    ids = list(Livre.objects.values_list('pk', flat=True)[:300])
+    for pk in ids:
+        Emprunt.objects.create(membre=membre, livre_id=pk)
+    Emprunt.objects.filter(livre_id__in=ids[:100]).marquer_retournes()
+    durees = chronometrer(lambda: synchronisation.delta(donnees['version']), min(options['repetitions'], 20))
+    brut = json.dumps(synchronisation.delta(donnees['version']), cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    sortie.write(
+        f"delta {len(ids)} médias modifiés : {resume(durees)} | {len(brut) / 1024:.1f} Ko, "
+        f"{len(gzip.compress(brut)) / 1024:.1f} Ko compressé"
+    )
+
+
+@scenario('cache_http')
+def bench_cache_http(sortie, options):
+    """Octets transférés et taux de 304 d'une navigation anonyme rejouée, avec et sans cache HTTP"""
+    volume = options['volume'] or 200
+    Livre.objects.bulk_create(
+        (Livre(titre=textes[0], auteur=textes[1]) for _, _, _, textes in _titres_synthetiques(volume)),
+        batch_size=5000,
+    )
+    membre = Membre.objects.create(nom="Bench", prenom="Cache", email="cache@bench.local")
+    livres = list(Livre.objects.values_list('pk', flat=True))
+    feuille = os.path.join(os.path.dirname(__file__), 'static', 'mediatheque', 'css', 'mediatheque.css')
+    with open(feuille, 'rb') as fichier:
+        css = fichier.read()
+
+    # Trace : des visiteurs alternant accueil et catalogue, un emprunt toutes les 50 pages
+    hasard = random.Random(0)
+    pages = [reverse('home'), reverse('liste_medias')]
+    trace = [(hasard.randrange(20), hasard.choice(pages)) for _ in range(options['repetitions'] * 5)]
+
+    def rejouer(avec_cache):
+        navigateurs = {}
+        octets, non_modifiees = 0, 0
+        for numero, (visiteur, url) in enumerate(trace):
+            if numero % 50 == 49:
+                Emprunt.objects.create(membre=membre, livre_id=hasard.choice(livres))
+            client, etags = navigateurs.setdefault(visiteur, (Client(), {}))
+            if not avec_cache:
+                # Avant : page complète non compressée, feuille de style incluse dans la page
+                octets += len(client.get(url).content) + len(css)
+                continue
+            entetes = {'HTTP_ACCEPT_ENCODING': 'gzip'}
+            if url in etags:
+                entetes['HTTP_IF_NONE_MATCH'] = etags[url]
+            elif not etags:
+                # Feuille de style hachée : téléchargée une fois par navigateur, compressée
+                octets += len(gzip.compress(css))
+            response = client.get(url, **entetes)
+            if response.status_code == 304:
+                non_modifiees += 1
+            etags[url] = response.get('ETag', '')
+            octets += len(response.content)
+        return octets, non_modifiees
+
+    for libelle, avec_cache in (('sans cache HTTP', False), ('avec cache HTTP', True)):
+        debut = time.perf_counter()
+        octets, non_modifiees = rejouer(avec_cache)
+        duree = time.perf_counter() - debut
+        sortie.write(
+            f"{libelle:<16} {len(trace)} pages : {octets / 1024:.0f} Ko transférés | "
+            f"{non_modifiees / len(trace):.0%} de 304 | {duree:.1f} s"
+        )
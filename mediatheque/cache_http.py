@@ -0,0 +1,81 @@
+"""Cache HTTP des pages publiques du catalogue et compression des réponses.
+
+Pour un visiteur anonyme, une page du catalogue ne dépend que des données
+(médias, emprunts) et des gabarits. Son ETag combine donc la séquence du
+catalogue (voir synchronisation), incrémentée à chaque modification d'un
+média, emprunt, retour ou prolongation, et une révision des gabarits et
+fichiers statiques : une requête conditionnelle reçoit un 304 sans rendu ni
+requête sur les médias. Les utilisateurs connectés, et les visiteurs ayant
+un message en attente, reçoivent une page rendue et non mise en cache.
+"""
+from functools import lru_cache, wraps
+import hashlib
+from pathlib import Path
+
+from django.contrib import messages
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import synchronisation
+
+GABARITS = Path(__file__).resolve().parent / 'templates'
+
+
+@lru_cache(maxsize=None)
+def revision():
+    """Empreinte des gabarits et du manifeste statique : change à chaque déploiement"""
+    empreinte = hashlib.sha1()
+    for gabarit in sorted(GABARITS.rglob('*.html')):
+        empreinte.update(gabarit.read_bytes())
+    empreinte.update((getattr(staticfiles_storage, 'manifest_hash', '') or '').encode())
+    return empreinte.hexdigest()[:12]
+
+
+def anonyme(request):
+    """Vrai si la page rendue est la même pour tous les visiteurs anonymes"""
+    # len() ne consomme pas les messages en attente
+    return not request.user.is_authenticated and not len(messages.get_messages(request))
+
+
+def etag_gabarits(request, *args, **kwargs):
+    """ETag d'une page sans données du catalogue (accueil)"""
+    return f"gabarits-{revision()}" if anonyme(request) else None
+
+
+def etag_catalogue(request, *args, **kwargs):
+    """ETag d'une page affichant les médias et leur disponibilité"""
+    if not anonyme(request):
+        return None
+    return f"catalogue-{synchronisation.version()}-{revision()}"
+
+
+def cache_anonyme(etag_func):
+    """Réponses conditionnelles (ETag, 304) et Cache-Control pour une page publique"""
+    def decorateur(vue):
+        conditionnelle = condition(etag_func=etag_func)(vue)
+
+        @wraps(vue)
+        def envelopper(request, *args, **kwargs):
+            reponse = conditionnelle(request, *args, **kwargs)
+            if reponse.has_header('ETag'):
+                # Revalidation à chaque affichage : la disponibilité change à tout moment
+                patch_cache_control(reponse, public=True, max_age=0, must_revalidate=True)
+            else:
+                patch_cache_control(reponse, private=True, no_cache=True)
+            # La page diffère pour un utilisateur connecté
+            patch_vary_headers(reponse, ['Cookie'])
+            return reponse
+        return envelopper
+    return decorateur
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Compression gzip, sauf pour les contenus déjà compressés et les flux d'événements"""
+    TYPES_EXCLUS = ('application/gzip', 'image/', 'text/event-stream')
+
+    def process_response(self, request, response):
+        if response.get('Content-Type', '').startswith(self.TYPES_EXCLUS):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,102 @@
+"""Diffusion en direct de la disponibilité des médias aux bornes (Server-Sent Events).
+
+Chaque borne ouverte sur le catalogue garde une connexion au flux servi par
+l'application ASGI. Un emprunt ou un retour publie, après validation de la
+transaction, la nouvelle disponibilité des médias concernés à tous les
+abonnés du processus : quelques centaines d'octets au lieu d'un
+rechargement complet de la page.
+
+Le diffuseur est propre au processus : avec plusieurs processus ASGI, une
+borne ne reçoit que les changements faits dans le processus qui la sert.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+
+from django.db import transaction
+
+logger = logging.getLogger('mediatheque')
+
+# Commentaire SSE envoyé en l'absence d'événement, pour garder la connexion ouverte
+INTERVALLE_PING = 15
+
+
+class Diffuseur:
+    """Abonnés d'un processus, chacun avec sa file bornée dans sa boucle asyncio"""
+
+    def __init__(self, taille_file=100):
+        self.taille_file = taille_file
+        self.abonnes = {}
+        self.verrou = threading.Lock()
+        self.sequence = itertools.count(1)
+
+    def abonner(self):
+        """Nouvelle file d'événements, à appeler depuis la boucle du consommateur"""
+        file = asyncio.Queue(self.taille_file)
+        with self.verrou:
+            self.abonnes[file] = asyncio.get_running_loop()
+        return file
+
+    def desabonner(self, file):
+        with self.verrou:
+            self.abonnes.pop(file, None)
+
+    def publier(self, evenement, donnees):
+        """Transmet un événement à tous les abonnés ; utilisable depuis n'importe quel thread"""
+        message = (next(self.sequence), evenement, json.dumps(donnees))
+        with self.verrou:
+            abonnes = list(self.abonnes.items())
+        for file, boucle in abonnes:
+            try:
+                boucle.call_soon_threadsafe(self._deposer, file, message)
+            except RuntimeError:
+                # Boucle fermée : abonné disparu sans se désabonner
+                self.desabonner(file)
+        return len(abonnes)
+
+    @staticmethod
+    def _deposer(file, message):
+        # Abonné trop lent : le plus ancien message est abandonné
+        if file.full():
+            file.get_nowait()
+        file.put_nowait(message)
+
+
+diffuseur = Diffuseur()
+
+
+def formater(message):
+    """Message au format text/event-stream"""
+    identifiant, evenement, donnees = message
+    return f"id: {identifiant}\nevent: {evenement}\ndata: {donnees}\n\n"
+
+
+async def flux(file):
+    """Messages SSE d'un abonné, avec un ping périodique ; se désabonne à la déconnexion"""
+    try:
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(file.get(), INTERVALLE_PING)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+            else:
+                yield formater(message)
+    finally:
+        diffuseur.desabonner(file)
+
+
+def signaler(ids_par_type):
+    """Publie la disponibilité des médias après validation de la transaction en cours"""
+    if not diffuseur.abonnes:
+        return
+
+    def publier():
+        from . import disponibilite
+        for type_media, medias in disponibilite.etats(ids_par_type).items():
+            for media in medias:
+                diffuseur.publier('disponibilite', {'type': type_media, **media})
+
+    transaction.on_commit(publier)
@@ -0,0 +1,81 @@
+"""Prévision de disponibilité des médias entièrement empruntés.
+
+Pour un média de N exemplaires ayant E emprunts en cours (E >= N), le
+premier exemplaire se libère au k-ième retour prévu, avec k = E - N + 1.
+Une seule requête à fonctions de fenêtre numérote les emprunts en cours
+de chaque média par date de retour prévue et ne garde que la k-ième
+ligne, pour tous les médias d'une page du catalogue à la fois.
+"""
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import Coalesce, RowNumber
+
+from .models import CD, DVD, Emprunt, Livre
+
+MODELES = {'livre': Livre, 'dvd': DVD, 'cd': CD}
+TYPES = tuple(MODELES)
+
+
+def prochains_retours(ids_par_type):
+    """{(type_media, id): date du prochain exemplaire libéré} des médias indisponibles"""
+    filtre = Q()
+    for type_media, ids in ids_par_type.items():
+        if ids:
+            filtre |= Q(**{f'{type_media}_id__in': ids})
+    if not filtre:
+        return {}
+
+    # Un emprunt ne référence qu'un seul média : le triplet identifie la partition
+    partition = [F(f'{type_media}_id') for type_media in TYPES]
+    lignes = (
+        Emprunt.objects.en_cours().filter(filtre)
+        .annotate(
+            rang=Window(RowNumber(), partition_by=partition, order_by=[F('date_retour_prevue').asc(), F('pk').asc()]),
+            en_cours=Window(Count('pk'), partition_by=partition),
+            exemplaires=Coalesce(*(f'{type_media}__nombre_exemplaires' for type_media in TYPES)),
+        )
+        .filter(rang=F('en_cours') - F('exemplaires') + 1)
+        .values_list(*(f'{type_media}_id' for type_media in TYPES), 'date_retour_prevue')
+    )
+    retours = {}
+    for *ids, date_retour in lignes:
+        type_media, media_id = next((t, i) for t, i in zip(TYPES, ids) if i is not None)
+        retours[(type_media, media_id)] = date_retour
+    return retours
+
+
+def annoter(**medias_par_type):
+    """Renseigne `prochain_retour` (date ou None) sur les médias, en une requête ; retourne les listes"""
+    medias_par_type = {type_media: list(medias) for type_media, medias in medias_par_type.items()}
+    retours = prochains_retours({
+        type_media: [media.pk for media in medias] for type_media, medias in medias_par_type.items()
+    })
+    for type_media, medias in medias_par_type.items():
+        for media in medias:
+            media.prochain_retour = retours.get((type_media, media.pk))
+    return medias_par_type
+
+
+def etats(ids_par_type=None):
+    """Disponibilité de tous les médias, ou de ceux demandés, par type de média"""
+    en_cours = Count('emprunt', filter=Q(emprunt__date_retour_effective__isnull=True))
+    querysets = {}
+    for type_media, modele in MODELES.items():
+        if ids_par_type is not None and not ids_par_type.get(type_media):
+            continue
+        medias = modele.objects.annotate(en_cours=en_cours).order_by('titre', 'pk')
+        if ids_par_type is not None:
+            medias = medias.filter(pk__in=ids_par_type[type_media])
+        querysets[type_media] = medias
+    return {
+        type_media: [
+            {
+                'id': media.pk,
+                'titre': media.titre,
+                'nombre_exemplaires': media.nombre_exemplaires,
+                'disponibles': max(media.nombre_exemplaires - media.en_cours, 0),
+                'prochain_retour': media.prochain_retour.isoformat() if media.prochain_retour else None,
+            }
+            for media in liste
+        ]
+        for type_media, liste in annoter(**querysets).items()
+    }
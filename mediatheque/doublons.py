@@ -0,0 +1,148 @@
+"""Détection et fusion des doublons du catalogue.
+
+Deux titres sont rapprochés par la similarité de leurs trigrammes (part des
+trigrammes communs, comme pg_trgm). Sous PostgreSQL, la recherche passe par
+l'opérateur % et l'index GIN trigramme ; ailleurs, les titres sont comparés
+en Python après un blocage qui ne compare que les titres partageant au
+moins un trigramme peu fréquent.
+"""
+from collections import defaultdict
+import logging
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, F, FloatField, Func, Value
+
+from . import synchronisation, versions
+from .autocompletion import normaliser
+from .models import (
+    Emprunt, EmpruntArchive, Exemplaire, Recommandation, StatistiqueJournaliere,
+)
+
+logger = logging.getLogger('mediatheque')
+
+SEUIL = 0.7
+
+# Un trigramme présent dans plus de titres que cela ne sert pas au blocage
+FREQUENCE_MAX = 200
+
+
+def trigrammes(texte):
+    """Trigrammes d'un titre normalisé, chaque mot bordé d'espaces"""
+    resultat = set()
+    for mot in normaliser(texte).split():
+        mot = f"  {mot} "
+        resultat.update(mot[i:i + 3] for i in range(len(mot) - 2))
+    return resultat
+
+
+def similarite(a, b):
+    """Part des trigrammes communs à deux ensembles"""
+    if not a or not b:
+        return 0.0
+    communs = len(a & b)
+    return communs / (len(a) + len(b) - communs)
+
+
+def _similarite_sql(titre):
+    return Func(F('titre'), Value(titre), function='SIMILARITY', output_field=FloatField())
+
+
+def similaires(modele, titre, seuil=SEUIL, limite=5):
+    """Médias dont le titre ressemble à `titre` : [(media, score)], du plus proche au moins proche"""
+    if connection.vendor == 'postgresql':
+        proche = Func(F('titre'), Value(titre), template='%(expressions)s', arg_joiner=' %% ', output_field=BooleanField())
+        medias = (
+            modele.objects.filter(proche).annotate(score=_similarite_sql(titre))
+            .filter(score__gte=seuil).order_by('-score')[:limite]
+        )
+        return [(media, media.score) for media in medias]
+
+    reference = trigrammes(titre)
+    # Blocage : seuls les titres contenant l'un des mots les plus longs sont comparés
+    mots = sorted(normaliser(titre).split(), key=len, reverse=True)[:3]
+    candidats = modele.objects.none()
+    for mot in mots:
+        candidats |= modele.objects.filter(titre__icontains=mot)
+    resultats = []
+    for media in candidats:
+        score = similarite(reference, trigrammes(media.titre))
+        if score >= seuil:
+            resultats.append((media, score))
+    resultats.sort(key=lambda r: -r[1])
+    return resultats[:limite]
+
+
+def paires(modele, seuil=SEUIL):
+    """Toutes les paires de doublons probables : [(pk, titre, pk, titre, score)]"""
+    if connection.vendor == 'postgresql':
+        table = modele._meta.db_table
+        with connection.cursor() as curseur:
+            # Seuil de l'opérateur %, pour que l'index GIN écarte déjà les paires trop éloignées
+            curseur.execute("SELECT set_limit(%s)", [seuil])
+            curseur.execute(f"""
+                SELECT a.id, a.titre, b.id, b.titre, similarity(a.titre, b.titre) AS score
+                FROM "{table}" a JOIN "{table}" b ON a.titre %% b.titre AND a.id < b.id
+                WHERE NOT a.supprime AND NOT b.supprime AND similarity(a.titre, b.titre) >= %s
+                ORDER BY score DESC
+            """, [seuil])
+            return curseur.fetchall()
+
+    titres = dict(modele.objects.values_list('pk', 'titre').iterator(chunk_size=5000))
+    ensembles = {pk: trigrammes(titre) for pk, titre in titres.items()}
+    index = defaultdict(list)
+    for pk, ensemble in ensembles.items():
+        for trigramme in ensemble:
+            index[trigramme].append(pk)
+
+    resultats = []
+    for pk, ensemble in ensembles.items():
+        candidats = set()
+        for trigramme in ensemble:
+            titulaires = index[trigramme]
+            if len(titulaires) <= FREQUENCE_MAX:
+                candidats.update(autre for autre in titulaires if autre > pk)
+        for autre in candidats:
+            score = similarite(ensemble, ensembles[autre])
+            if score >= seuil:
+                resultats.append((pk, titres[pk], autre, titres[autre], score))
+    resultats.sort(key=lambda r: -r[4])
+    return resultats
+
+
+def _fusionner_statistiques(type_media, garde, doublon):
+    """Reporte les statistiques journalières du doublon sur le média conservé"""
+    lignes = StatistiqueJournaliere.objects.filter(type_media=type_media)
+    existantes = {s.jour: s for s in lignes.filter(media_id=garde.pk)}
+    for stat in lignes.filter(media_id=doublon.pk, jour__in=list(existantes)):
+        cible = existantes[stat.jour]
+        cible.emprunts += stat.emprunts
+        cible.retours += stat.retours
+        cible.retours_en_retard += stat.retours_en_retard
+        cible.save(update_fields=['emprunts', 'retours', 'retours_en_retard'])
+        stat.delete()
+    lignes.filter(media_id=doublon.pk).update(media_id=garde.pk, titre=garde.titre)
+
+
+def fusionner(garde, doublons):
+    """Rattache emprunts, archives et exemplaires des doublons au média conservé, puis les efface"""
+    modele = type(garde)
+    type_media = modele._meta.model_name
+    membres = set()
+    with transaction.atomic():
+        for doublon in doublons:
+            emprunts = Emprunt.objects.filter(**{type_media: doublon})
+            membres.update(emprunts.values_list('membre_id', flat=True))
+            emprunts.update(**{type_media: garde})
+            EmpruntArchive.objects.filter(**{type_media: doublon}).update(**{type_media: garde})
+            Exemplaire.objects.filter(**{type_media: doublon}).update(**{type_media: garde})
+            _fusionner_statistiques(type_media, garde, doublon)
+            Recommandation.objects.filter(type_media=type_media, media_id=doublon.pk).delete()
+            Recommandation.objects.filter(type_media_voisin=type_media, media_id_voisin=doublon.pk).delete()
+            modele.objects.filter(pk=garde.pk).update(nombre_exemplaires=F('nombre_exemplaires') + doublon.nombre_exemplaires)
+            modele.tous.filter(pk=doublon.pk).delete()
+        synchronisation.marquer({type_media: [garde.pk]})
+    for membre_id in membres:
+        versions.incrementer(f"emprunts_membre:{membre_id}")
+    garde.refresh_from_db()
+    logger.info(f"Fusion de {len(doublons)} doublon(s) dans {type_media} #{garde.pk}")
+    return garde
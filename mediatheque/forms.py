@@ -6,13 +6,29 @@ class MembreForm(forms.ModelForm):
     """Formulaire pour créer/modifier un membre"""
     class Meta:
         model = Membre
-        fields = ['nom', 'prenom', 'email']
+        fields = ['nom', 'prenom', 'email', 'categorie']
         widgets = {
             'nom': forms.TextInput(attrs={'class': 'form-input'}),
             'prenom': forms.TextInput(attrs={'class': 'form-input'}),
             'email': forms.EmailInput(attrs={'class': 'form-input'}),
+            'categorie': forms.Select(attrs={'class': 'form-input'}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Catégorie standard si non renseignée
+        self.fields['categorie'].required = False
+
+    def clean_categorie(self):
+        return self.cleaned_data.get('categorie') or 'standard'
+
+    def clean_email(self):
+        # Erreur rattachée au champ (la contrainte conditionnelle produit une erreur globale)
+        email = self.cleaned_data['email']
+        if Membre.objects.filter(email=email).exclude(pk=self.instance.pk).exists():
+            raise forms.ValidationError("Un membre avec cette adresse email existe déjà.")
+        return email
+
 
 class LivreForm(forms.ModelForm):
     """Formulaire pour ajouter un livre"""
@@ -65,6 +81,26 @@ class JeuPlateauForm(forms.ModelForm):
         }
 
 
+class RechercheJeuxForm(forms.Form):
+    """Critères de recherche des jeux de plateau"""
+    joueurs = forms.IntegerField(
+        required=False, min_value=1, label="Nombre de joueurs",
+        widget=forms.NumberInput(attrs={'class': 'form-input'})
+    )
+    editeur = forms.ChoiceField(
+        required=False, label="Éditeur",
+        widget=forms.Select(attrs={'class': 'form-input'})
+    )
+    titre = forms.CharField(
+        required=False, label="Titre",
+        widget=forms.TextInput(attrs={'class': 'form-input'})
+    )
+
+    def __init__(self, *args, editeurs=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['editeur'].choices = [('', 'Tous')] + [(e, e) for e in editeurs]
+
+
 class EmpruntForm(forms.Form):
     """Formulaire pour créer un emprunt"""
     membre = forms.ModelChoiceField(
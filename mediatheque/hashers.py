@@ -0,0 +1,40 @@
+"""Hacheurs de mots de passe dont le coût est réglable dans les paramètres.
+
+Les noms d'algorithmes sont ceux de Django : les hachages existants restent
+valides et ``must_update`` déclenche un recalcul transparent à la connexion
+lorsque le coût configuré change.
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    PBKDF2PasswordHasher,
+    ScryptPasswordHasher,
+)
+
+
+class PBKDF2AjustablePasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 avec nombre d'itérations configurable"""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS or PBKDF2PasswordHasher.iterations
+
+
+class ScryptAjustablePasswordHasher(ScryptPasswordHasher):
+    """scrypt avec facteur de travail configurable"""
+
+    @property
+    def work_factor(self):
+        return settings.PASSWORD_SCRYPT_WORK_FACTOR or ScryptPasswordHasher.work_factor
+
+
+class Argon2AjustablePasswordHasher(Argon2PasswordHasher):
+    """Argon2id avec coûts en temps et en mémoire configurables"""
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST or Argon2PasswordHasher.time_cost
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST or Argon2PasswordHasher.memory_cost
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from mediatheque import statistiques
+
+
+class Command(BaseCommand):
+    help = "Met à jour les statistiques à partir des emprunts modifiés depuis le dernier passage"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lot', type=int, default=500,
+                            help="Nombre de jours recalculés par transaction")
+
+    def handle(self, *args, **options):
+        nombre = statistiques.agreger(taille_lot=options['lot'])
+        self.stdout.write(self.style.SUCCESS(f"{nombre} jour(s) recalculé(s)."))
@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mediatheque import archive
+
+
+class Command(BaseCommand):
+    help = "Déplace les emprunts rendus avant une date vers la table d'archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--avant', help="Date AAAA-MM-JJ (par défaut : aujourd'hui moins ARCHIVE_RETENTION_JOURS)")
+        parser.add_argument('--lot', type=int, default=1000,
+                            help="Nombre d'emprunts déplacés par transaction")
+
+    def handle(self, *args, **options):
+        avant = None
+        if options['avant']:
+            try:
+                avant = date.fromisoformat(options['avant'])
+            except ValueError:
+                raise CommandError("Date invalide, format attendu : AAAA-MM-JJ.")
+        nombre = archive.archiver(avant, taille_lot=options['lot'])
+        self.stdout.write(self.style.SUCCESS(f"{nombre} emprunt(s) archivé(s)."))
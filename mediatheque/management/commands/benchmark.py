@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from mediatheque.benchmarks import SCENARIOS
+
+
+class Command(BaseCommand):
+    help = "Exécute un scénario de benchmark sur une base de test jetable"
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument('--repetitions', type=int, default=200,
+                            help="Nombre de mesures par configuration")
+        parser.add_argument('--volume', type=int, default=None,
+                            help="Volume de données générées (par défaut propre au scénario)")
+
+    def handle(self, *args, **options):
+        setup_test_environment(debug=False)
+        ancien_nom = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f"Scénario : {options['scenario']}")
+            SCENARIOS[options['scenario']](self.stdout, options)
+        finally:
+            connection.creation.destroy_test_db(ancien_nom, verbosity=0)
+            teardown_test_environment()
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mediatheque import recommandations
+
+
+class Command(BaseCommand):
+    help = "Recalcule les recommandations « ont aussi emprunté » à partir de l'historique des emprunts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=10,
+                            help="Nombre de recommandations conservées par média")
+        parser.add_argument('--minimum', type=int, default=2,
+                            help="Nombre minimal d'emprunteurs communs")
+
+    def handle(self, *args, **options):
+        try:
+            recommandations.importer_numpy()
+        except ImportError:
+            raise CommandError("NumPy et SciPy sont requis : pip install numpy scipy")
+        nombre = recommandations.calculer(k=options['k'], minimum=options['minimum'])
+        self.stdout.write(self.style.SUCCESS(f"{nombre} recommandation(s) enregistrée(s)."))
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from mediatheque import partitions
+
+
+class Command(BaseCommand):
+    help = "Crée à l'avance les partitions futures de la table des emprunts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--avance', type=int, default=2,
+                            help="Nombre de périodes futures à garantir")
+
+    def handle(self, *args, **options):
+        if not partitions.est_partitionnee():
+            raise CommandError("La table des emprunts n'est pas partitionnée (voir partitionner_emprunts).")
+        granularite = settings.EMPRUNT_PARTITION
+        creees = partitions.creer_partitions(partitions.periodes_a_venir(options['avance'], granularite), granularite)
+        for nom in creees:
+            self.stdout.write(f"Partition créée : {nom}")
+        self.stdout.write(self.style.SUCCESS(f"{len(creees)} partition(s) créée(s)."))
+        restants = partitions.lignes_hors_partition()
+        if restants:
+            self.stdout.write(self.style.WARNING(
+                f"{restants} emprunt(s) dans la partition DEFAULT, hors des périodes créées : augmentez --avance."
+            ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from mediatheque import doublons
+from mediatheque.models import CD, DVD, Livre
+
+MODELES = {'livre': Livre, 'dvd': DVD, 'cd': CD}
+
+
+class Command(BaseCommand):
+    help = "Liste les titres probablement en double dans le catalogue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--type', choices=sorted(MODELES), help="Type de média (par défaut : tous)")
+        parser.add_argument('--seuil', type=float, default=doublons.SEUIL,
+                            help="Similarité minimale entre deux titres (0 à 1)")
+
+    def handle(self, *args, **options):
+        types = [options['type']] if options['type'] else list(MODELES)
+        total = 0
+        for type_media in types:
+            for pk, titre, autre_pk, autre_titre, score in doublons.paires(MODELES[type_media], options['seuil']):
+                self.stdout.write(f"{type_media} #{pk} « {titre} » ~ #{autre_pk} « {autre_titre} » ({score:.2f})")
+                total += 1
+        self.stdout.write(self.style.SUCCESS(f"{total} doublon(s) probable(s)."))
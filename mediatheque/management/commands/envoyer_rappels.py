@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from mediatheque import rappels
+
+
+class Command(BaseCommand):
+    help = "Envoie un courriel récapitulatif aux membres ayant des emprunts proches de l'échéance ou en retard"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jours', type=int, default=3,
+                            help="Rappeler les emprunts à rendre dans ce nombre de jours")
+        parser.add_argument('--lot', type=int, default=100,
+                            help="Nombre de courriels envoyés par lot")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Compter les rappels sans rien envoyer ni enregistrer")
+
+    def handle(self, *args, **options):
+        courriels, emprunts = rappels.envoyer(
+            jours=options['jours'], taille_lot=options['lot'], simulation=options['dry_run']
+        )
+        verbe = "à envoyer" if options['dry_run'] else "envoyé(s)"
+        self.stdout.write(self.style.SUCCESS(f"{courriels} courriel(s) {verbe} pour {emprunts} emprunt(s)."))
@@ -0,0 +1,44 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = "Maintenance de la base SQLite : statistiques du planificateur, checkpoint WAL, compactage"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vacuum', action='store_true',
+                            help="Compacter le fichier (verrouille la base pendant l'opération)")
+        parser.add_argument('--sans-analyze', action='store_true',
+                            help="Ne pas recalculer les statistiques du planificateur")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Cette commande ne s'applique qu'à SQLite.")
+        fichier = str(connection.settings_dict['NAME'])
+        taille_avant = self.taille(fichier)
+
+        with connection.cursor() as curseur:
+            if not options['sans_analyze']:
+                curseur.execute("ANALYZE")
+                self.stdout.write("ANALYZE effectué.")
+            curseur.execute("PRAGMA journal_mode")
+            if curseur.fetchone()[0].lower() == 'wal':
+                # Reporte le journal dans la base et le ramène à zéro
+                curseur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                bloque, pages, reportees = curseur.fetchone()
+                etat = "incomplet (lecteurs actifs)" if bloque else "complet"
+                self.stdout.write(f"Checkpoint WAL {etat} : {reportees}/{pages} page(s) reportée(s).")
+            if options['vacuum']:
+                curseur.execute("VACUUM")
+                self.stdout.write("VACUUM effectué.")
+
+        taille_apres = self.taille(fichier)
+        self.stdout.write(self.style.SUCCESS(
+            f"Taille de la base : {taille_avant / 1024:.0f} Kio -> {taille_apres / 1024:.0f} Kio."
+        ))
+
+    @staticmethod
+    def taille(fichier):
+        return os.path.getsize(fichier) if os.path.exists(fichier) else 0
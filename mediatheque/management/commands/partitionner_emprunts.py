@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from mediatheque import partitions
+
+
+class Command(BaseCommand):
+    help = "Convertit la table des emprunts en table partitionnée par date d'emprunt (PostgreSQL)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--par', choices=['annee', 'mois'], default=settings.EMPRUNT_PARTITION,
+                            help="Granularité des partitions (doit correspondre à EMPRUNT_PARTITION)")
+        parser.add_argument('--avance', type=int, default=2,
+                            help="Nombre de périodes futures créées à l'avance")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Le partitionnement n'est disponible que sur PostgreSQL.")
+        if partitions.est_partitionnee():
+            raise CommandError("La table des emprunts est déjà partitionnée.")
+        nombre = partitions.convertir(options['par'], options['avance'])
+        self.stdout.write(self.style.SUCCESS(f"Table des emprunts partitionnée : {nombre} partition(s)."))
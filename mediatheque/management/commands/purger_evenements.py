@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from mediatheque.models import Evenement
+
+
+class Command(BaseCommand):
+    help = "Supprime les événements d'audit plus anciens que la durée de conservation"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jours', type=int, default=365,
+                            help="Durée de conservation en jours")
+        parser.add_argument('--lot', type=int, default=5000,
+                            help="Nombre d'événements supprimés par requête")
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(days=options['jours'])
+        total = 0
+        # Suppression par lots pour ne pas verrouiller la table longtemps
+        while True:
+            ids = list(Evenement.objects.filter(date__lt=limite).values_list('pk', flat=True)[:options['lot']])
+            if not ids:
+                break
+            total += Evenement.objects.filter(pk__in=ids).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"{total} événement(s) supprimé(s)."))
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mediatheque import synchronisation
+
+
+class Command(BaseCommand):
+    help = "Écrit l'instantané compressé du catalogue chargé par les bornes hors ligne"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sortie', default=settings.CATALOGUE_SNAPSHOT,
+                            help="Fichier de l'instantané (JSON compressé gzip)")
+        parser.add_argument('--conserver-jours', type=int, default=None,
+                            help="Purger les retraits de médias plus anciens que ce nombre de jours")
+
+    def handle(self, *args, **options):
+        version = synchronisation.ecrire_instantane(options['sortie'])
+        self.stdout.write(self.style.SUCCESS(f"Instantané version {version} écrit dans {options['sortie']}."))
+        # Purge après l'écriture : le nouvel instantané est plus récent que l'horizon
+        if options['conserver_jours'] is not None:
+            nombre = synchronisation.purger_retraits(options['conserver_jours'])
+            self.stdout.write(f"{nombre} retrait(s) purgé(s).")
@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from django.core.management.base import BaseCommand
+
+from mediatheque import taches
+
+# Secondes entre deux recherches de tâches bloquées lorsque la file est vide
+INTERVALLE_LIBERATION = 60
+
+
+class Command(BaseCommand):
+    help = "Exécute les tâches de fond en attente dans la file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4,
+                            help="Nombre de tâches exécutées en parallèle (1 = dans le processus courant)")
+        parser.add_argument('--intervalle', type=float, default=2.0,
+                            help="Attente en secondes lorsque la file est vide")
+        parser.add_argument('--une-fois', action='store_true',
+                            help="Vider la file puis s'arrêter")
+
+    def handle(self, *args, **options):
+        nb_threads = max(1, options['threads'])
+        pool = ThreadPoolExecutor(max_workers=nb_threads) if nb_threads > 1 else None
+        traitees = 0
+        try:
+            taches.liberer_bloquees()
+            derniere_liberation = time.monotonic()
+            while True:
+                ids = taches.reserver(limite=nb_threads)
+                if not ids:
+                    if options['une_fois']:
+                        break
+                    # Les tâches d'un autre worker arrêté sont reprises sans attendre un redémarrage
+                    if time.monotonic() - derniere_liberation >= INTERVALLE_LIBERATION:
+                        taches.liberer_bloquees()
+                        derniere_liberation = time.monotonic()
+                    time.sleep(options['intervalle'])
+                    continue
+                statuts = pool.map(taches.executer, ids) if pool else map(taches.executer, ids)
+                traitees += len(list(statuts))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if pool:
+                pool.shutdown(wait=True)
+        self.stdout.write(self.style.SUCCESS(f"{traitees} tâche(s) traitée(s)."))
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0006_remove_actif_from_membre'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emprunt',
+            index=models.Index(fields=['membre', 'date_retour_effective'], name='emprunt_membre_retour_idx'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0007_emprunt_membre_retour_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EtatCatalogue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_media', models.CharField(choices=[('livre', 'Livre'), ('dvd', 'DVD'), ('cd', 'CD')], max_length=10, unique=True)),
+                ('exemplaires', models.PositiveIntegerField(default=0)),
+                ('emprunts_actifs', models.PositiveIntegerField(default=0)),
+                ('emprunts_en_retard', models.PositiveIntegerField(default=0)),
+                ('calcule_le', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'État du catalogue',
+                'verbose_name_plural': 'États du catalogue',
+            },
+        ),
+        migrations.CreateModel(
+            name='PointDeReprise',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100, unique=True)),
+                ('valeur', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Point de reprise',
+                'verbose_name_plural': 'Points de reprise',
+            },
+        ),
+        migrations.AddField(
+            model_name='emprunt',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='ActiviteMembreJournaliere',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('membre_id', models.PositiveIntegerField()),
+                ('nom_membre', models.CharField(max_length=201)),
+                ('emprunts', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Activité membre journalière',
+                'verbose_name_plural': 'Activités membres journalières',
+                'constraints': [models.UniqueConstraint(fields=('jour', 'membre_id'), name='activite_jour_membre_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StatistiqueJournaliere',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('type_media', models.CharField(choices=[('livre', 'Livre'), ('dvd', 'DVD'), ('cd', 'CD')], max_length=10)),
+                ('media_id', models.PositiveIntegerField()),
+                ('titre', models.CharField(max_length=200)),
+                ('emprunts', models.PositiveIntegerField(default=0)),
+                ('retours', models.PositiveIntegerField(default=0)),
+                ('retours_en_retard', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Statistique journalière',
+                'verbose_name_plural': 'Statistiques journalières',
+                'constraints': [models.UniqueConstraint(fields=('jour', 'type_media', 'media_id'), name='statistique_jour_media_unique')],
+            },
+        ),
+    ]
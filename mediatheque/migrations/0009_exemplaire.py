@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0008_statistiques'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Exemplaire',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code_barre', models.CharField(max_length=32, unique=True)),
+                ('etat', models.CharField(choices=[('disponible', 'Disponible'), ('emprunte', 'Emprunté'), ('hors_circulation', 'Hors circulation')], default='disponible', max_length=20)),
+                ('date_ajout', models.DateField(auto_now_add=True)),
+                ('cd', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='mediatheque.cd')),
+                ('dvd', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='mediatheque.dvd')),
+                ('livre', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='mediatheque.livre')),
+            ],
+            options={
+                'verbose_name': 'Exemplaire',
+                'verbose_name_plural': 'Exemplaires',
+            },
+        ),
+        migrations.AddField(
+            model_name='emprunt',
+            name='exemplaire',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='mediatheque.exemplaire'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+PREFIXES = {'livre': 'LIV', 'dvd': 'DVD', 'cd': 'CD0'}
+
+
+def creer_exemplaires(apps, schema_editor):
+    """Crée un exemplaire par unité de nombre_exemplaires et y rattache les emprunts en cours"""
+    Exemplaire = apps.get_model('mediatheque', 'Exemplaire')
+    Emprunt = apps.get_model('mediatheque', 'Emprunt')
+    for type_media, prefixe in PREFIXES.items():
+        Modele = apps.get_model('mediatheque', type_media)
+        for media in Modele.objects.order_by('pk').iterator():
+            emprunts = list(Emprunt.objects.filter(
+                **{type_media: media}, date_retour_effective__isnull=True
+            ).order_by('pk'))
+            nombre = max(media.nombre_exemplaires, len(emprunts))
+            exemplaires = Exemplaire.objects.bulk_create([
+                Exemplaire(
+                    code_barre=f"{prefixe}{media.pk:07d}{numero:03d}",
+                    etat='emprunte' if numero <= len(emprunts) else 'disponible',
+                    **{type_media: media}
+                )
+                for numero in range(1, nombre + 1)
+            ])
+            for emprunt, exemplaire in zip(emprunts, exemplaires):
+                emprunt.exemplaire = exemplaire
+            Emprunt.objects.bulk_update(emprunts, ['exemplaire'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0009_exemplaire'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_exemplaires, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0010_exemplaires_existants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='membre',
+            name='categorie',
+            field=models.CharField(choices=[('standard', 'Standard'), ('jeunesse', 'Jeunesse'), ('etudiant', 'Étudiant')], default='standard', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='PolitiquePret',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('categorie', models.CharField(choices=[('standard', 'Standard'), ('jeunesse', 'Jeunesse'), ('etudiant', 'Étudiant')], max_length=20)),
+                ('type_media', models.CharField(choices=[('livre', 'Livre'), ('dvd', 'DVD'), ('cd', 'CD')], max_length=10)),
+                ('duree_jours', models.PositiveIntegerField(default=7, help_text='Durée du prêt en jours')),
+                ('max_emprunts', models.PositiveIntegerField(default=3, help_text='Emprunts simultanés maximum')),
+                ('delai_grace_jours', models.PositiveIntegerField(default=0, help_text='Jours de retard tolérés')),
+                ('max_prolongations', models.PositiveIntegerField(default=1)),
+            ],
+            options={
+                'verbose_name': 'Politique de prêt',
+                'verbose_name_plural': 'Politiques de prêt',
+                'constraints': [models.UniqueConstraint(fields=('categorie', 'type_media'), name='politique_categorie_type_unique')],
+            },
+        ),
+    ]
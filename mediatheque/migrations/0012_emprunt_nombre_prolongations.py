@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0011_politique_pret'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='emprunt',
+            name='nombre_prolongations',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
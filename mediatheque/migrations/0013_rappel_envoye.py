@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0012_emprunt_nombre_prolongations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RappelEnvoye',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('echeance', 'Échéance proche'), ('retard', 'Retard')], max_length=10)),
+                ('date_echeance', models.DateField()),
+                ('date_envoi', models.DateTimeField(auto_now_add=True)),
+                ('emprunt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rappels', to='mediatheque.emprunt')),
+            ],
+            options={
+                'verbose_name': 'Rappel envoyé',
+                'verbose_name_plural': 'Rappels envoyés',
+                'constraints': [models.UniqueConstraint(fields=('emprunt', 'type', 'date_echeance'), name='rappel_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0013_rappel_envoye'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100)),
+                ('arguments', models.JSONField(blank=True, default=dict)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('terminee', 'Terminée'), ('echouee', 'Échouée')], default='en_attente', max_length=20)),
+                ('tentatives', models.PositiveIntegerField(default=0)),
+                ('max_tentatives', models.PositiveIntegerField(default=3)),
+                ('executer_apres', models.DateTimeField(default=django.utils.timezone.now)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_debut', models.DateTimeField(blank=True, null=True)),
+                ('date_fin', models.DateTimeField(blank=True, null=True)),
+                ('duree_ms', models.FloatField(blank=True, null=True)),
+                ('erreur', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'verbose_name': 'Tâche',
+                'verbose_name_plural': 'Tâches',
+                'indexes': [models.Index(fields=['statut', 'executer_apres'], name='tache_file_idx')],
+            },
+        ),
+    ]
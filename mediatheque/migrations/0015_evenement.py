@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0014_tache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Evenement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(choices=[('creation', 'Création'), ('modification', 'Modification'), ('suppression', 'Suppression'), ('emprunt', 'Emprunt'), ('retour', 'Retour'), ('prolongation', 'Prolongation')], max_length=20)),
+                ('type_objet', models.CharField(max_length=50)),
+                ('objet_id', models.BigIntegerField(null=True)),
+                ('date', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('donnees', models.JSONField(blank=True, default=dict)),
+                ('acteur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Événement',
+                'verbose_name_plural': 'Événements',
+                'indexes': [models.Index(fields=['type_objet', 'objet_id'], name='evenement_objet_idx'), models.Index(fields=['acteur', 'date'], name='evenement_acteur_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0015_evenement'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emprunt',
+            index=models.Index(condition=models.Q(('date_retour_effective__isnull', True)), fields=['date_retour_prevue'], name='emprunt_en_cours_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:14
+
+import django.db.models.deletion
+import mediatheque.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0016_emprunt_en_cours_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='membre',
+            name='nombre_emprunts_archives',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='EmpruntArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('date_emprunt', models.DateField()),
+                ('date_retour_prevue', models.DateField()),
+                ('date_retour_effective', models.DateField()),
+                ('nombre_prolongations', models.PositiveIntegerField(default=0)),
+                ('date_archivage', models.DateTimeField(auto_now_add=True)),
+                ('cd', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='mediatheque.cd')),
+                ('dvd', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='mediatheque.dvd')),
+                ('livre', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='mediatheque.livre')),
+                ('membre', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='mediatheque.membre')),
+            ],
+            options={
+                'verbose_name': 'Emprunt archivé',
+                'verbose_name_plural': 'Emprunts archivés',
+                'indexes': [models.Index(fields=['membre', '-date_retour_effective'], name='archive_membre_retour_idx'), models.Index(fields=['date_emprunt'], name='archive_date_emprunt_idx'), models.Index(fields=['date_retour_effective'], name='archive_date_retour_idx')],
+            },
+            bases=(mediatheque.models.MediaEmprunte, models.Model),
+        ),
+    ]
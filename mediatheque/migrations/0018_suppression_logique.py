@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0017_emprunt_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cd',
+            name='supprime',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='dvd',
+            name='supprime',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='livre',
+            name='supprime',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='membre',
+            name='supprime',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='membre',
+            name='email',
+            field=models.EmailField(max_length=254),
+        ),
+        migrations.AddConstraint(
+            model_name='membre',
+            constraint=models.UniqueConstraint(condition=models.Q(('supprime', False)), fields=('email',), name='membre_email_unique', violation_error_message='Un membre avec cette adresse email existe déjà.'),
+        ),
+    ]
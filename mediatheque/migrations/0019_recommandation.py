@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0018_suppression_logique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recommandation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type_media', models.CharField(choices=[('livre', 'Livre'), ('dvd', 'DVD'), ('cd', 'CD')], max_length=10)),
+                ('media_id', models.PositiveIntegerField()),
+                ('rang', models.PositiveSmallIntegerField()),
+                ('type_media_voisin', models.CharField(choices=[('livre', 'Livre'), ('dvd', 'DVD'), ('cd', 'CD')], max_length=10)),
+                ('media_id_voisin', models.PositiveIntegerField()),
+                ('titre_voisin', models.CharField(max_length=200)),
+                ('score', models.FloatField()),
+            ],
+            options={
+                'verbose_name': 'Recommandation',
+                'verbose_name_plural': 'Recommandations',
+                'constraints': [models.UniqueConstraint(fields=('type_media', 'media_id', 'rang'), name='recommandation_rang_unique')],
+            },
+        ),
+    ]
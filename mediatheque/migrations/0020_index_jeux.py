@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0019_recommandation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jeuplateau',
+            index=models.Index(fields=['nombre_joueurs_min', 'nombre_joueurs_max'], name='jeu_joueurs_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='jeuplateau',
+            index=models.Index(fields=['editeur', 'titre'], name='jeu_editeur_idx'),
+        ),
+    ]
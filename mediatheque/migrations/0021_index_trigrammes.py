@@ -0,0 +1,32 @@
+from django.db import migrations
+
+TABLES = ('mediatheque_livre', 'mediatheque_dvd', 'mediatheque_cd')
+
+
+def creer_index(apps, schema_editor):
+    # Index trigramme pour la détection des doublons, propre à PostgreSQL
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table in TABLES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{table}_titre_trgm" ON "{table}" USING gin (titre gin_trgm_ops)'
+        )
+
+
+def supprimer_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{table}_titre_trgm"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0020_index_jeux'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0021_index_trigrammes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Compteur',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nom', models.CharField(max_length=100, unique=True)),
+                ('valeur', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Compteur',
+                'verbose_name_plural': 'Compteurs',
+            },
+        ),
+        migrations.CreateModel(
+            name='MediaRetire',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveBigIntegerField(db_index=True)),
+                ('type_media', models.CharField(max_length=10)),
+                ('media_id', models.PositiveIntegerField()),
+                ('date', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Média retiré',
+                'verbose_name_plural': 'Médias retirés',
+            },
+        ),
+        migrations.AddField(
+            model_name='cd',
+            name='sequence',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='dvd',
+            name='sequence',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='jeuplateau',
+            name='sequence',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='livre',
+            name='sequence',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, editable=False),
+        ),
+    ]
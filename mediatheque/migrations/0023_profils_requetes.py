@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:08
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0022_synchronisation_bornes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfilRequete',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('identifiant', models.CharField(max_length=64, unique=True)),
+                ('date', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('methode', models.CharField(max_length=10)),
+                ('chemin', models.CharField(max_length=500)),
+                ('vue', models.CharField(blank=True, max_length=200)),
+                ('statut', models.PositiveSmallIntegerField()),
+                ('declencheur', models.CharField(choices=[('demande', 'Demandé'), ('echantillon', 'Échantillon')], max_length=20)),
+                ('duree_ms', models.FloatField()),
+                ('nombre_requetes', models.PositiveIntegerField()),
+                ('duree_sql_ms', models.FloatField()),
+                ('fonctions', models.JSONField(default=list)),
+                ('requetes', models.JSONField(default=list)),
+                ('statistiques', models.BinaryField()),
+                ('utilisateur', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Profil de requête',
+                'verbose_name_plural': 'Profils de requêtes',
+                'indexes': [models.Index(fields=['date', 'duree_ms'], name='profil_date_duree_idx')],
+            },
+        ),
+    ]
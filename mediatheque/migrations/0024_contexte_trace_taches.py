@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0023_profils_requetes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tache',
+            name='contexte_trace',
+            field=models.CharField(blank=True, default='', max_length=55),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0024_contexte_trace_taches'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='evenement',
+            name='action',
+            field=models.CharField(choices=[('creation', 'Création'), ('modification', 'Modification'), ('suppression', 'Suppression'), ('emprunt', 'Emprunt'), ('retour', 'Retour'), ('prolongation', 'Prolongation'), ('fusion', 'Fusion de doublons')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mediatheque', '0025_evenement_action_fusion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tache',
+            name='date_battement',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,16 +1,54 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, DateField, F, Min, Q, Value, When
+from django.db.models.functions import Cast, Concat, LPad, Substr
 from django.contrib.auth.models import User
 from datetime import timedelta
 from django.utils import timezone
 
+from . import politiques, tracage, versions
 
-class Media(models.Model):
+TYPES_MEDIA = [('livre', 'Livre'), ('dvd', 'DVD'), ('cd', 'CD')]
+
+
+class NonSupprimesManager(models.Manager):
+    """Manager par défaut : exclut les objets supprimés en attente de purge"""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(supprime=False)
+
+
+class SuppressionLogique(models.Model):
+    """Suppression immédiate par drapeau ; les données liées sont purgées en tâche de fond"""
+    supprime = models.BooleanField(default=False, db_index=True, editable=False)
+
+    objects = NonSupprimesManager()
+    tous = models.Manager()
+
+    class Meta:
+        abstract = True
+
+    @tracage.trace()
+    def supprimer(self):
+        """Masque l'objet partout et programme la purge de ses emprunts"""
+        from . import taches
+        type(self).tous.filter(pk=self.pk).update(supprime=True)
+        self.supprime = True
+        self.apres_suppression()
+        taches.enqueue('purger_supprime', modele=self._meta.model_name, pk=self.pk)
+
+    def apres_suppression(self):
+        """Effets immédiats de la suppression propres au modèle"""
+
+
+class Media(SuppressionLogique):
     """Classe mère abstraite pour tous les médias empruntables"""
     titre = models.CharField(max_length=200)
     auteur = models.CharField(max_length=200, blank=True, default='')
     nombre_exemplaires = models.PositiveIntegerField(default=1)
     date_ajout = models.DateField(auto_now_add=True)
     disponible = models.BooleanField(default=True)
+    # Numéro de la dernière modification (fiche ou disponibilité), pour la synchronisation des bornes
+    sequence = models.PositiveBigIntegerField(default=0, db_index=True, editable=False)
 
     class Meta:
         abstract = True
@@ -18,6 +56,13 @@ class Media(models.Model):
     def __str__(self):
         return f"{self.titre} - {self.auteur}"
 
+    def apres_suppression(self):
+        from . import autocompletion, synchronisation
+        # Les exemplaires ne peuvent plus être scannés ni empruntés
+        self.exemplaire_set.update(etat='hors_circulation')
+        autocompletion.retirer(self._meta.model_name, self.pk)
+        synchronisation.retirer(self._meta.model_name, self.pk)
+
 
 class Livre(Media):
     """Livre héritant de Media"""
@@ -26,14 +71,17 @@ class Livre(Media):
         verbose_name = "Livre"
         verbose_name_plural = "Livres"
 
+    @tracage.trace()
     def emprunts_en_cours(self):
         """Retourne le nombre d'emprunts en cours pour ce livre"""
         return self.emprunt_set.filter(date_retour_effective__isnull=True).count()
 
+    @tracage.trace()
     def exemplaires_disponibles(self):
         """Retourne le nombre d'exemplaires disponibles"""
         return self.nombre_exemplaires - self.emprunts_en_cours()
 
+    @tracage.trace()
     def est_disponible(self):
         """Vérifie si au moins un exemplaire est disponible"""
         return self.exemplaires_disponibles() > 0
@@ -47,14 +95,17 @@ class DVD(Media):
         verbose_name = "DVD"
         verbose_name_plural = "DVDs"
 
+    @tracage.trace()
     def emprunts_en_cours(self):
         """Retourne le nombre d'emprunts en cours pour ce DVD"""
         return self.emprunt_set.filter(date_retour_effective__isnull=True).count()
 
+    @tracage.trace()
     def exemplaires_disponibles(self):
         """Retourne le nombre d'exemplaires disponibles"""
         return self.nombre_exemplaires - self.emprunts_en_cours()
 
+    @tracage.trace()
     def est_disponible(self):
         """Vérifie si au moins un exemplaire est disponible"""
         return self.exemplaires_disponibles() > 0
@@ -69,14 +120,17 @@ class CD(Media):
         verbose_name = "CD"
         verbose_name_plural = "CDs"
 
+    @tracage.trace()
     def emprunts_en_cours(self):
         """Retourne le nombre d'emprunts en cours pour ce CD"""
         return self.emprunt_set.filter(date_retour_effective__isnull=True).count()
 
+    @tracage.trace()
     def exemplaires_disponibles(self):
         """Retourne le nombre d'exemplaires disponibles"""
         return self.nombre_exemplaires - self.emprunts_en_cours()
 
+    @tracage.trace()
     def est_disponible(self):
         """Vérifie si au moins un exemplaire est disponible"""
         return self.exemplaires_disponibles() > 0
@@ -89,51 +143,321 @@ class JeuPlateau(models.Model):
     nombre_joueurs_min = models.PositiveIntegerField(default=2)
     nombre_joueurs_max = models.PositiveIntegerField(default=4)
     date_ajout = models.DateField(auto_now_add=True)
+    sequence = models.PositiveBigIntegerField(default=0, db_index=True, editable=False)
 
     class Meta:
         verbose_name = "Jeu de plateau"
         verbose_name_plural = "Jeux de plateau"
+        indexes = [
+            # « Jeux pour n joueurs » : min <= n parcouru dans l'index, max >= n filtré sans lire la table
+            models.Index(fields=['nombre_joueurs_min', 'nombre_joueurs_max'], name='jeu_joueurs_idx'),
+            models.Index(fields=['editeur', 'titre'], name='jeu_editeur_idx'),
+        ]
 
     def __str__(self):
         return f"{self.titre} ({self.nombre_joueurs_min}-{self.nombre_joueurs_max} joueurs)"
 
 
-class Membre(models.Model):
+class Membre(SuppressionLogique):
     """Membre emprunteur de la médiathèque"""
+    CATEGORIES = [
+        ('standard', 'Standard'),
+        ('jeunesse', 'Jeunesse'),
+        ('etudiant', 'Étudiant'),
+    ]
+
     user = models.OneToOneField(User, on_delete=models.CASCADE, null=True, blank=True)
     nom = models.CharField(max_length=100)
     prenom = models.CharField(max_length=100)
-    email = models.EmailField(unique=True)
+    email = models.EmailField()
+    categorie = models.CharField(max_length=20, choices=CATEGORIES, default='standard')
+    # Tenu à jour par l'archivage : la pagination de l'historique n'a pas à compter l'archive
+    nombre_emprunts_archives = models.PositiveIntegerField(default=0, editable=False)
     date_inscription = models.DateField(auto_now_add=True)
 
     class Meta:
         verbose_name = "Membre"
         verbose_name_plural = "Membres"
+        constraints = [
+            # Un membre supprimé libère son adresse dès la suppression
+            models.UniqueConstraint(
+                fields=['email'], condition=Q(supprime=False), name='membre_email_unique',
+                violation_error_message="Un membre avec cette adresse email existe déjà.",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.prenom} {self.nom}"
 
+    def apres_suppression(self):
+        if self.user_id:
+            User.objects.filter(pk=self.user_id).update(is_active=False)
+
+    @tracage.trace()
     def nombre_emprunts_en_cours(self):
         """Retourne le nombre d'emprunts en cours"""
         return self.emprunt_set.filter(date_retour_effective__isnull=True).count()
 
+    def resume_emprunts(self):
+        """Nombre d'emprunts en cours (total et par type) et plus ancien retour prévu par type, en une requête"""
+        agregats = {}
+        for type_media, _ in TYPES_MEDIA:
+            filtre = Q(**{f'{type_media}__isnull': False})
+            agregats[f'en_cours_{type_media}'] = Count('id', filter=filtre)
+            agregats[f'retour_{type_media}'] = Min('date_retour_prevue', filter=filtre)
+        return self.emprunt_set.filter(date_retour_effective__isnull=True).aggregate(
+            en_cours=Count('id'), **agregats
+        )
+
+    def _en_retard(self, resume, regles):
+        """Vérifie le retard à partir du résumé, en tenant compte du délai de grâce"""
+        aujourd_hui = timezone.now().date()
+        return any(
+            resume[f'retour_{type_media}'] is not None
+            and resume[f'retour_{type_media}'] + timedelta(days=regle.delai_grace_jours) < aujourd_hui
+            for type_media, regle in regles.items()
+        )
+
+    @tracage.trace()
     def a_emprunt_en_retard(self):
-        """Vérifie si le membre a un emprunt en retard"""
-        return self.emprunt_set.filter(
-            date_retour_effective__isnull=True,
-            date_retour_prevue__lt=timezone.now().date()
-        ).exists()
-
-    def peut_emprunter(self):
-        """Vérifie si le membre peut emprunter (max 3 emprunts, pas de retard)"""
-        if self.nombre_emprunts_en_cours() >= 3:
-            return False
-        if self.a_emprunt_en_retard():
-            return False
-        return True
+        """Vérifie si le membre a un emprunt en retard (au-delà du délai de grâce)"""
+        return self._en_retard(self.resume_emprunts(), politiques.pour_categorie(self.categorie))
+
+    @tracage.trace()
+    def motif_refus(self, type_media='livre'):
+        """Retourne la raison pour laquelle le membre ne peut pas emprunter, ou None"""
+        resume = self.resume_emprunts()
+        regles = politiques.pour_categorie(self.categorie)
+        if self._en_retard(resume, regles):
+            return f"{self} a un emprunt en retard."
+        # Le maximum de la politique s'applique par type de média
+        maximum = regles[type_media].max_emprunts
+        en_cours = resume[f'en_cours_{type_media}']
+        if en_cours >= maximum:
+            return f"{self} a déjà {en_cours} emprunt(s) de ce type en cours (maximum {maximum})."
+        return None
+
+    @tracage.trace()
+    def peut_emprunter(self, type_media='livre'):
+        """Vérifie si le membre peut emprunter selon la politique de prêt (maximum, retards)"""
+        return self.motif_refus(type_media) is None
+
+    @tracage.trace()
+    def prolonger_emprunts(self, pks=None):
+        """Prolonge les emprunts éligibles du membre (tous, ou ceux de pks) ; retourne leur nombre"""
+        emprunts = self.emprunt_set.all()
+        if pks is not None:
+            emprunts = emprunts.filter(pk__in=pks)
+        nombre = emprunts.prolonger(politiques.pour_categorie(self.categorie))
+        if nombre:
+            versions.incrementer(f"emprunts_membre:{self.pk}")
+        return nombre
+
+
+class ExemplaireManager(models.Manager):
+    """Gestion groupée des exemplaires physiques"""
+
+    def completer(self, modele, pks=None):
+        """Crée les exemplaires manquants pour atteindre nombre_exemplaires, et retire les libres en trop"""
+        type_media = modele._meta.model_name
+        medias = modele._default_manager.all()
+        if pks is not None:
+            medias = medias.filter(pk__in=pks)
+        # Les exemplaires retirés ne comptent plus, mais leur numéro reste pris :
+        # la numérotation repart du plus haut numéro propre au média (les
+        # exemplaires d'un doublon fusionné gardent le préfixe de leur ancien média)
+        debut = len(Exemplaire.PREFIXES[type_media])
+        prefixe = Concat(
+            Value(Exemplaire.PREFIXES[type_media]), LPad(Cast('pk', models.CharField()), 7, Value('0')),
+            output_field=models.CharField(),
+        )
+        medias = medias.annotate(
+            existants=models.Count('exemplaire', filter=~Q(exemplaire__etat='hors_circulation')),
+            # Numéro comparé en entier : au-delà de 999, il s'écrit sur plus de trois chiffres
+            dernier=models.Max(
+                Cast(Substr('exemplaire__code_barre', debut + 8), models.IntegerField()),
+                filter=Q(exemplaire__code_barre__startswith=prefixe),
+            ),
+        )
+        manquants = []
+        for pk, nombre, existants, dernier in medias.values_list(
+            'pk', 'nombre_exemplaires', 'existants', 'dernier'
+        ):
+            if existants > nombre:
+                self.retirer_libres(type_media, pk, existants - nombre)
+            dernier = dernier or 0
+            for numero in range(dernier + 1, dernier + 1 + nombre - existants):
+                manquants.append(self.model(
+                    code_barre=Exemplaire.generer_code(type_media, pk, numero),
+                    **{type_media + '_id': pk}
+                ))
+        self.bulk_create(manquants, batch_size=500)
+        return len(manquants)
+
+    def retirer_libres(self, type_media, pk, nombre):
+        """Met hors circulation jusqu'à `nombre` exemplaires disponibles d'un média, les plus récents d'abord"""
+        libres = (
+            self.filter(**{type_media + '_id': pk}, etat='disponible')
+            .order_by('-pk').values_list('pk', flat=True)[:nombre]
+        )
+        return self.filter(pk__in=list(libres)).update(etat='hors_circulation')
+
+
+class Exemplaire(models.Model):
+    """Exemplaire physique d'un média, identifié par son code-barres"""
+    ETATS = [
+        ('disponible', 'Disponible'),
+        ('emprunte', 'Emprunté'),
+        ('hors_circulation', 'Hors circulation'),
+    ]
+    PREFIXES = {'livre': 'LIV', 'dvd': 'DVD', 'cd': 'CD0'}
+
+    code_barre = models.CharField(max_length=32, unique=True)
+    livre = models.ForeignKey(Livre, on_delete=models.CASCADE, null=True, blank=True)
+    dvd = models.ForeignKey(DVD, on_delete=models.CASCADE, null=True, blank=True)
+    cd = models.ForeignKey(CD, on_delete=models.CASCADE, null=True, blank=True)
+    etat = models.CharField(max_length=20, choices=ETATS, default='disponible')
+    date_ajout = models.DateField(auto_now_add=True)
+
+    objects = ExemplaireManager()
+
+    class Meta:
+        verbose_name = "Exemplaire"
+        verbose_name_plural = "Exemplaires"
+
+    def __str__(self):
+        return f"{self.code_barre} - {self.get_media()}"
+
+    @staticmethod
+    def generer_code(type_media, media_pk, numero):
+        """Code-barres du n-ième exemplaire d'un média (ex. LIV0000012003, puis LIV00000121000)"""
+        return f"{Exemplaire.PREFIXES[type_media]}{media_pk:07d}{numero:03d}"
+
+    def get_media(self):
+        """Retourne le média de l'exemplaire"""
+        return self.livre or self.dvd or self.cd
+
+
+def ids_par_type(emprunts):
+    """Identifiants des médias empruntés, par type de média"""
+    ids = {type_media: set() for type_media, _ in TYPES_MEDIA}
+    for ligne in emprunts.values_list('livre_id', 'dvd_id', 'cd_id'):
+        for (type_media, _), media_id in zip(TYPES_MEDIA, ligne):
+            if media_id is not None:
+                ids[type_media].add(media_id)
+    return ids
+
+
+class EmpruntQuerySet(models.QuerySet):
+    """Requêtes groupées sur les emprunts"""
+
+    def en_cours(self):
+        """Emprunts non retournés"""
+        return self.filter(date_retour_effective__isnull=True)
+
+    def visibles(self):
+        """Emprunts dont ni le membre ni le média ne sont supprimés en attente de purge"""
+        return self.exclude(
+            Q(membre__supprime=True) | Q(livre__supprime=True) | Q(dvd__supprime=True) | Q(cd__supprime=True)
+        )
+
+    @tracage.trace()
+    def marquer_retournes(self, date_retour=None):
+        """Enregistre le retour des emprunts en cours en un seul UPDATE"""
+        from . import diffusion, synchronisation
+        en_cours = self.en_cours()
+        membres = set(en_cours.values_list('membre_id', flat=True))
+        medias = ids_par_type(en_cours)
+        exemplaires = list(en_cours.filter(exemplaire__isnull=False).values_list('exemplaire_id', flat=True))
+        Exemplaire.objects.filter(pk__in=exemplaires, etat='emprunte').update(etat='disponible')
+        nombre = en_cours.update(
+            date_retour_effective=date_retour or timezone.now().date(),
+            date_modification=timezone.now(),
+        )
+        # update() n'émet pas post_save : invalider le cache des membres concernés
+        for membre_id in membres:
+            versions.incrementer(f"emprunts_membre:{membre_id}")
+        synchronisation.marquer(medias)
+        diffusion.signaler(medias)
+        return nombre
+
+    @tracage.trace()
+    def prolonger(self, regles):
+        """Prolonge en un seul UPDATE conditionnel les emprunts éligibles selon les règles par type.
+
+        Un emprunt est éligible s'il est en cours, pas encore en retard et n'a pas
+        atteint le nombre maximum de prolongations de sa règle. La nouvelle date de
+        retour part de la date prévue actuelle. Les médias concernés reçoivent une
+        nouvelle séquence (date de retour attendue du catalogue) ; le cache des
+        membres n'est pas invalidé ici : voir Membre.prolonger_emprunts.
+        """
+        from . import diffusion, synchronisation
+        eligibles = Q()
+        nouvelles_dates = []
+        for type_media, regle in regles.items():
+            du_type = Q(**{f'{type_media}__isnull': False})
+            eligibles |= du_type & Q(nombre_prolongations__lt=regle.max_prolongations)
+            nouvelles_dates.append(
+                When(du_type, then=F('date_retour_prevue') + timedelta(days=regle.duree_jours))
+            )
+        prolongeables = self.en_cours().filter(eligibles, date_retour_prevue__gte=timezone.now().date())
+        with transaction.atomic():
+            medias = ids_par_type(prolongeables)
+            nombre = prolongeables.update(
+                date_retour_prevue=Case(*nouvelles_dates, default=F('date_retour_prevue'), output_field=DateField()),
+                nombre_prolongations=F('nombre_prolongations') + 1,
+                date_modification=timezone.now(),
+            )
+            synchronisation.marquer(medias)
+        diffusion.signaler(medias)
+        return nombre
+
+
+class PolitiquePret(models.Model):
+    """Règles de prêt pour une catégorie de membre et un type de média"""
+    categorie = models.CharField(max_length=20, choices=Membre.CATEGORIES)
+    type_media = models.CharField(max_length=10, choices=TYPES_MEDIA)
+    duree_jours = models.PositiveIntegerField(default=7, help_text="Durée du prêt en jours")
+    max_emprunts = models.PositiveIntegerField(default=3, help_text="Emprunts simultanés maximum")
+    delai_grace_jours = models.PositiveIntegerField(default=0, help_text="Jours de retard tolérés")
+    max_prolongations = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Politique de prêt"
+        verbose_name_plural = "Politiques de prêt"
+        constraints = [
+            models.UniqueConstraint(fields=['categorie', 'type_media'], name='politique_categorie_type_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_categorie_display()} / {self.get_type_media_display()}"
+
 
+class MediaEmprunte:
+    """Accès au média d'un emprunt, actif ou archivé"""
 
-class Emprunt(models.Model):
+    def type_media(self):
+        """Retourne le type du média emprunté ('livre', 'dvd' ou 'cd')"""
+        if self.livre_id:
+            return 'livre'
+        elif self.dvd_id:
+            return 'dvd'
+        elif self.cd_id:
+            return 'cd'
+        return None
+
+    def get_media(self):
+        """Retourne le média emprunté"""
+        if self.livre:
+            return self.livre
+        elif self.dvd:
+            return self.dvd
+        elif self.cd:
+            return self.cd
+        return None
+
+
+class Emprunt(MediaEmprunte, models.Model):
     """Emprunt d'un média par un membre"""
     membre = models.ForeignKey(Membre, on_delete=models.CASCADE)
 
@@ -141,37 +465,352 @@ class Emprunt(models.Model):
     livre = models.ForeignKey(Livre, on_delete=models.CASCADE, null=True, blank=True)
     dvd = models.ForeignKey(DVD, on_delete=models.CASCADE, null=True, blank=True)
     cd = models.ForeignKey(CD, on_delete=models.CASCADE, null=True, blank=True)
+    exemplaire = models.ForeignKey(Exemplaire, on_delete=models.SET_NULL, null=True, blank=True)
 
     date_emprunt = models.DateField(auto_now_add=True)
     date_retour_prevue = models.DateField()
     date_retour_effective = models.DateField(null=True, blank=True)
+    nombre_prolongations = models.PositiveIntegerField(default=0)
+    # Sert de point de reprise à l'agrégation incrémentale des statistiques
+    date_modification = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = EmpruntQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Emprunt"
         verbose_name_plural = "Emprunts"
-
+        indexes = [
+            models.Index(fields=['membre', 'date_retour_effective'], name='emprunt_membre_retour_idx'),
+            # Index partiel : seuls les emprunts en cours, quelle que soit la taille de l'historique
+            models.Index(fields=['date_retour_prevue'], condition=Q(date_retour_effective__isnull=True),
+                         name='emprunt_en_cours_idx'),
+        ]
+
+    @tracage.trace()
     def save(self, *args, **kwargs):
-        # Calcul automatique de la date de retour prévue (7 jours)
+        # Calcul automatique de la date de retour prévue selon la politique de prêt
         if not self.date_retour_prevue:
-            self.date_retour_prevue = timezone.now().date() + timedelta(days=7)
+            regle = politiques.regle(self.membre.categorie, self.type_media())
+            self.date_retour_prevue = timezone.now().date() + timedelta(days=regle.duree_jours)
+        # Attribution d'un exemplaire disponible du média à la création
+        if self.pk is None and self.exemplaire_id is None:
+            self.exemplaire = self.exemplaire_disponible()
         super().save(*args, **kwargs)
+        if self.exemplaire_id:
+            etat = 'disponible' if self.date_retour_effective else 'emprunte'
+            Exemplaire.objects.filter(pk=self.exemplaire_id).exclude(etat__in=[etat, 'hors_circulation']).update(etat=etat)
 
     def __str__(self):
         media = self.get_media()
         return f"Emprunt de {media} par {self.membre}"
 
-    def get_media(self):
-        """Retourne le média emprunté"""
-        if self.livre:
-            return self.livre
-        elif self.dvd:
-            return self.dvd
-        elif self.cd:
-            return self.cd
-        return None
+    @tracage.trace()
+    def exemplaire_disponible(self):
+        """Retourne un exemplaire disponible du média emprunté, s'il en existe"""
+        media = self.get_media()
+        if media is None:
+            return None
+        return media.exemplaire_set.filter(etat='disponible').order_by('pk').first()
 
     def est_en_retard(self):
         """Vérifie si l'emprunt est en retard"""
         if self.date_retour_effective:
             return False
         return timezone.now().date() > self.date_retour_prevue
+
+    @tracage.trace()
+    def prolonger(self):
+        """Prolonge cet emprunt si la politique le permet ; retourne True en cas de succès"""
+        if not self.membre.prolonger_emprunts([self.pk]):
+            return False
+        self.refresh_from_db(fields=['date_retour_prevue', 'nombre_prolongations', 'date_modification'])
+        return True
+
+
+class EmpruntArchive(MediaEmprunte, models.Model):
+    """Emprunt terminé déplacé hors de la table des emprunts (manage.py archiver_emprunts)"""
+    # Identifiant de l'emprunt d'origine
+    id = models.BigIntegerField(primary_key=True)
+    membre = models.ForeignKey(Membre, on_delete=models.CASCADE)
+    livre = models.ForeignKey(Livre, on_delete=models.CASCADE, null=True, blank=True)
+    dvd = models.ForeignKey(DVD, on_delete=models.CASCADE, null=True, blank=True)
+    cd = models.ForeignKey(CD, on_delete=models.CASCADE, null=True, blank=True)
+    date_emprunt = models.DateField()
+    date_retour_prevue = models.DateField()
+    date_retour_effective = models.DateField()
+    nombre_prolongations = models.PositiveIntegerField(default=0)
+    date_archivage = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Emprunt archivé"
+        verbose_name_plural = "Emprunts archivés"
+        indexes = [
+            models.Index(fields=['membre', '-date_retour_effective'], name='archive_membre_retour_idx'),
+            models.Index(fields=['date_emprunt'], name='archive_date_emprunt_idx'),
+            models.Index(fields=['date_retour_effective'], name='archive_date_retour_idx'),
+        ]
+
+    def __str__(self):
+        return f"Emprunt archivé de {self.get_media()} par {self.membre}"
+
+    def est_en_retard(self):
+        """Un emprunt archivé est toujours terminé"""
+        return False
+
+
+class RappelEnvoye(models.Model):
+    """Trace d'un rappel envoyé, pour ne pas le renvoyer"""
+    TYPES = [
+        ('echeance', 'Échéance proche'),
+        ('retard', 'Retard'),
+    ]
+
+    emprunt = models.ForeignKey(Emprunt, on_delete=models.CASCADE, related_name='rappels')
+    type = models.CharField(max_length=10, choices=TYPES)
+    # Une prolongation change l'échéance et ouvre droit à un nouveau rappel
+    date_echeance = models.DateField()
+    date_envoi = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Rappel envoyé"
+        verbose_name_plural = "Rappels envoyés"
+        constraints = [
+            models.UniqueConstraint(fields=['emprunt', 'type', 'date_echeance'], name='rappel_unique'),
+        ]
+
+    def __str__(self):
+        return f"Rappel {self.get_type_display()} - {self.emprunt}"
+
+
+# ============== STATISTIQUES ==============
+
+class StatistiqueJournaliere(models.Model):
+    """Agrégat journalier des emprunts et retours d'un média"""
+    jour = models.DateField()
+    type_media = models.CharField(max_length=10, choices=TYPES_MEDIA)
+    media_id = models.PositiveIntegerField()
+    titre = models.CharField(max_length=200)
+    emprunts = models.PositiveIntegerField(default=0)
+    retours = models.PositiveIntegerField(default=0)
+    retours_en_retard = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Statistique journalière"
+        verbose_name_plural = "Statistiques journalières"
+        constraints = [
+            models.UniqueConstraint(fields=['jour', 'type_media', 'media_id'], name='statistique_jour_media_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.jour} - {self.titre} ({self.emprunts} emprunts)"
+
+
+class ActiviteMembreJournaliere(models.Model):
+    """Agrégat journalier des emprunts d'un membre"""
+    jour = models.DateField()
+    membre_id = models.PositiveIntegerField()
+    nom_membre = models.CharField(max_length=201)
+    emprunts = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Activité membre journalière"
+        verbose_name_plural = "Activités membres journalières"
+        constraints = [
+            models.UniqueConstraint(fields=['jour', 'membre_id'], name='activite_jour_membre_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.jour} - {self.nom_membre} ({self.emprunts} emprunts)"
+
+
+class EtatCatalogue(models.Model):
+    """Instantané de l'utilisation du catalogue par type de média"""
+    type_media = models.CharField(max_length=10, choices=TYPES_MEDIA, unique=True)
+    exemplaires = models.PositiveIntegerField(default=0)
+    emprunts_actifs = models.PositiveIntegerField(default=0)
+    emprunts_en_retard = models.PositiveIntegerField(default=0)
+    calcule_le = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "État du catalogue"
+        verbose_name_plural = "États du catalogue"
+
+    def __str__(self):
+        return f"{self.get_type_media_display()} : {self.emprunts_actifs}/{self.exemplaires}"
+
+    def taux_utilisation(self):
+        """Proportion des exemplaires actuellement empruntés"""
+        return self.emprunts_actifs / self.exemplaires if self.exemplaires else 0
+
+    def taux_retard(self):
+        """Proportion des emprunts actifs en retard"""
+        return self.emprunts_en_retard / self.emprunts_actifs if self.emprunts_actifs else 0
+
+
+class PointDeReprise(models.Model):
+    """Horodatage du dernier traitement d'une tâche incrémentale"""
+    nom = models.CharField(max_length=100, unique=True)
+    valeur = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Point de reprise"
+        verbose_name_plural = "Points de reprise"
+
+    def __str__(self):
+        return f"{self.nom} : {self.valeur}"
+
+
+class Compteur(models.Model):
+    """Compteur nommé, incrémenté sous verrou de ligne (séquence du catalogue)"""
+    nom = models.CharField(max_length=100, unique=True)
+    valeur = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Compteur"
+        verbose_name_plural = "Compteurs"
+
+    def __str__(self):
+        return f"{self.nom} : {self.valeur}"
+
+
+class MediaRetire(models.Model):
+    """Média retiré du catalogue, signalé aux bornes lors de leur synchronisation"""
+    sequence = models.PositiveBigIntegerField(db_index=True)
+    type_media = models.CharField(max_length=10)
+    media_id = models.PositiveIntegerField()
+    date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Média retiré"
+        verbose_name_plural = "Médias retirés"
+
+    def __str__(self):
+        return f"{self.type_media} #{self.media_id} (séquence {self.sequence})"
+
+
+# ============== RECOMMANDATIONS ==============
+
+class Recommandation(models.Model):
+    """Média souvent emprunté par les emprunteurs d'un autre (calculé par manage.py calculer_recommandations)"""
+    type_media = models.CharField(max_length=10, choices=TYPES_MEDIA)
+    media_id = models.PositiveIntegerField()
+    rang = models.PositiveSmallIntegerField()
+    type_media_voisin = models.CharField(max_length=10, choices=TYPES_MEDIA)
+    media_id_voisin = models.PositiveIntegerField()
+    titre_voisin = models.CharField(max_length=200)
+    # Similarité cosinus entre les ensembles d'emprunteurs des deux médias
+    score = models.FloatField()
+
+    class Meta:
+        verbose_name = "Recommandation"
+        verbose_name_plural = "Recommandations"
+        constraints = [
+            models.UniqueConstraint(fields=['type_media', 'media_id', 'rang'], name='recommandation_rang_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.type_media} #{self.media_id} -> {self.titre_voisin} ({self.score:.2f})"
+
+
+# ============== AUDIT ==============
+
+class Evenement(models.Model):
+    """Événement d'audit : qui a fait quoi, sur quel objet et quand (table en ajout seul)"""
+    ACTIONS = [
+        ('creation', 'Création'),
+        ('modification', 'Modification'),
+        ('suppression', 'Suppression'),
+        ('emprunt', 'Emprunt'),
+        ('retour', 'Retour'),
+        ('prolongation', 'Prolongation'),
+        ('fusion', 'Fusion de doublons'),
+    ]
+
+    acteur = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    action = models.CharField(max_length=20, choices=ACTIONS)
+    type_objet = models.CharField(max_length=50)
+    objet_id = models.BigIntegerField(null=True)
+    date = models.DateTimeField(default=timezone.now, db_index=True)
+    donnees = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        verbose_name = "Événement"
+        verbose_name_plural = "Événements"
+        indexes = [
+            models.Index(fields=['type_objet', 'objet_id'], name='evenement_objet_idx'),
+            models.Index(fields=['acteur', 'date'], name='evenement_acteur_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_action_display()} {self.type_objet} #{self.objet_id}"
+
+
+# ============== TÂCHES DE FOND ==============
+
+class Tache(models.Model):
+    """Tâche différée exécutée par le worker (manage.py worker)"""
+    STATUTS = [
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('terminee', 'Terminée'),
+        ('echouee', 'Échouée'),
+    ]
+
+    nom = models.CharField(max_length=100)
+    arguments = models.JSONField(default=dict, blank=True)
+    statut = models.CharField(max_length=20, choices=STATUTS, default='en_attente')
+    tentatives = models.PositiveIntegerField(default=0)
+    max_tentatives = models.PositiveIntegerField(default=3)
+    executer_apres = models.DateTimeField(default=timezone.now)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_debut = models.DateTimeField(null=True, blank=True)
+    # Mise à jour périodique par le worker pendant l'exécution (voir taches.battement)
+    date_battement = models.DateTimeField(null=True, blank=True)
+    date_fin = models.DateTimeField(null=True, blank=True)
+    duree_ms = models.FloatField(null=True, blank=True)
+    erreur = models.TextField(blank=True, default='')
+    # traceparent du span qui a mis la tâche en file (voir tracage.py)
+    contexte_trace = models.CharField(max_length=55, blank=True, default='')
+
+    class Meta:
+        verbose_name = "Tâche"
+        verbose_name_plural = "Tâches"
+        indexes = [
+            models.Index(fields=['statut', 'executer_apres'], name='tache_file_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.nom} ({self.get_statut_display()})"
+
+
+# ============== PROFILAGE ==============
+
+class ProfilRequete(models.Model):
+    """Profil d'une requête : fonctions les plus coûteuses et chronologie SQL"""
+    DECLENCHEURS = [('demande', 'Demandé'), ('echantillon', 'Échantillon')]
+
+    identifiant = models.CharField(max_length=64, unique=True)
+    date = models.DateTimeField(default=timezone.now, db_index=True)
+    utilisateur = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    methode = models.CharField(max_length=10)
+    chemin = models.CharField(max_length=500)
+    vue = models.CharField(max_length=200, blank=True)
+    statut = models.PositiveSmallIntegerField()
+    declencheur = models.CharField(max_length=20, choices=DECLENCHEURS)
+    duree_ms = models.FloatField()
+    nombre_requetes = models.PositiveIntegerField()
+    duree_sql_ms = models.FloatField()
+    fonctions = models.JSONField(default=list)
+    requetes = models.JSONField(default=list)
+    # Statistiques cProfile brutes (marshal), lisibles avec pstats ou snakeviz
+    statistiques = models.BinaryField()
+
+    class Meta:
+        verbose_name = "Profil de requête"
+        verbose_name_plural = "Profils de requêtes"
+        indexes = [
+            models.Index(fields=['date', 'duree_ms'], name='profil_date_duree_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.methode} {self.chemin} ({self.duree_ms:.0f} ms)"
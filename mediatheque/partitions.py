@@ -0,0 +1,174 @@
+"""Partitionnement par plage de date_emprunt de la table des emprunts (PostgreSQL).
+
+La conversion (manage.py partitionner_emprunts) remplace la table par une
+table partitionnée par année ou par mois (EMPRUNT_PARTITION), recopie les
+lignes, puis recrée index, clés étrangères sortantes et séquence. Les partitions
+futures sont créées à l'avance par manage.py creer_partitions_emprunts ; une
+partition DEFAULT recueille les lignes hors plage, déplacées dans leur
+partition lorsque celle-ci est créée.
+
+Limites de PostgreSQL :
+- la clé primaire devient (id, date_emprunt), l'unicité de id étant garantie
+  par la séquence ;
+- aucune clé étrangère ne peut référencer la table partitionnée par id seul :
+  les contraintes entrantes (RappelEnvoye.emprunt) sont supprimées et ne
+  peuvent pas être recréées. L'intégrité repose alors sur l'application : la
+  cascade de l'ORM, et la suppression explicite des rappels avant chaque
+  DELETE direct d'emprunts (archivage, purge des objets supprimés).
+"""
+from datetime import date
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Emprunt
+
+logger = logging.getLogger('mediatheque')
+
+TABLE = Emprunt._meta.db_table
+DEFAUT = f"{TABLE}_defaut"
+
+
+def debut_periode(jour, granularite):
+    """Premier jour de la période (année ou mois) contenant jour"""
+    return date(jour.year, 1, 1) if granularite == 'annee' else date(jour.year, jour.month, 1)
+
+
+def periode_suivante(debut, granularite):
+    """Premier jour de la période suivante"""
+    if granularite == 'annee':
+        return date(debut.year + 1, 1, 1)
+    return date(debut.year + debut.month // 12, debut.month % 12 + 1, 1)
+
+
+def nom_partition(debut, granularite):
+    """Nom de la partition d'une période, ex. mediatheque_emprunt_p2025 ou _p2025_03"""
+    suffixe = f"{debut.year}" if granularite == 'annee' else f"{debut.year}_{debut.month:02d}"
+    return f"{TABLE}_p{suffixe}"
+
+
+def periodes(depuis, jusqu_a, granularite):
+    """Bornes [début, fin) des périodes couvrant depuis..jusqu_a inclus"""
+    debut = debut_periode(depuis, granularite)
+    while debut <= jusqu_a:
+        fin = periode_suivante(debut, granularite)
+        yield debut, fin
+        debut = fin
+
+
+def periodes_a_venir(avance, granularite, aujourd_hui=None):
+    """Périodes de la période courante jusqu'à `avance` périodes futures incluses"""
+    fin = debut_periode(aujourd_hui or timezone.now().date(), granularite)
+    for _ in range(avance):
+        fin = periode_suivante(fin, granularite)
+    return list(periodes(aujourd_hui or timezone.now().date(), fin, granularite))
+
+
+def est_partitionnee():
+    """Vrai si la table des emprunts est déjà partitionnée"""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as curseur:
+        curseur.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE])
+        return curseur.fetchone() is not None
+
+
+def creer_partitions(bornes, granularite):
+    """Crée les partitions manquantes pour les bornes données ; retourne leurs noms.
+
+    PostgreSQL refuse de créer une partition dont la plage contient des lignes
+    de la partition DEFAULT : ces lignes sont d'abord déplacées dans la
+    nouvelle partition, qui est ensuite rattachée.
+    """
+    creees = []
+    with transaction.atomic(), connection.cursor() as curseur:
+        curseur.execute("SELECT to_regclass(%s)", [DEFAUT])
+        defaut_existe = curseur.fetchone()[0] is not None
+        for debut, fin in bornes:
+            nom = nom_partition(debut, granularite)
+            curseur.execute("SELECT to_regclass(%s)", [nom])
+            if curseur.fetchone()[0] is not None:
+                continue
+            plage = f"FROM ('{debut.isoformat()}') TO ('{fin.isoformat()}')"
+            if not defaut_existe:
+                curseur.execute(f'CREATE TABLE "{nom}" PARTITION OF "{TABLE}" FOR VALUES {plage}')
+                creees.append(nom)
+                continue
+            curseur.execute(f'CREATE TABLE "{nom}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+            curseur.execute(
+                f'WITH deplacees AS (DELETE FROM "{DEFAUT}" WHERE date_emprunt >= %s AND date_emprunt < %s '
+                f'RETURNING *) INSERT INTO "{nom}" SELECT * FROM deplacees',
+                [debut, fin]
+            )
+            if curseur.rowcount:
+                logger.warning(
+                    f"Partitionnement : {curseur.rowcount} emprunt(s) de la partition DEFAULT déplacé(s) dans {nom}"
+                )
+            curseur.execute(f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{nom}" FOR VALUES {plage}')
+            creees.append(nom)
+    return creees
+
+
+def lignes_hors_partition():
+    """Nombre d'emprunts restés dans la partition DEFAULT"""
+    with connection.cursor() as curseur:
+        curseur.execute(f'SELECT COUNT(*) FROM "{DEFAUT}"')
+        return curseur.fetchone()[0]
+
+
+def convertir(granularite=None, avance=2):
+    """Convertit la table des emprunts en table partitionnée ; retourne le nombre de partitions"""
+    granularite = granularite or settings.EMPRUNT_PARTITION
+    ancienne = f"{TABLE}_ancien"
+    with transaction.atomic(), connection.cursor() as curseur:
+        # Définitions à recréer, relevées avant le renommage
+        curseur.execute(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype IN ('p', 'u'))",
+            [TABLE, TABLE]
+        )
+        index = [ligne[0] for ligne in curseur.fetchall()]
+        curseur.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+            [TABLE]
+        )
+        cles_sortantes = curseur.fetchall()
+        curseur.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE confrelid = %s::regclass AND contype = 'f'",
+            [TABLE]
+        )
+        for table, contrainte in curseur.fetchall():
+            logger.warning(f"Partitionnement : clé étrangère {contrainte} de {table} supprimée")
+
+        curseur.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{ancienne}"')
+        curseur.execute(
+            f'CREATE TABLE "{TABLE}" (LIKE "{ancienne}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f"PARTITION BY RANGE (date_emprunt)"
+        )
+        curseur.execute(f'SELECT MIN(date_emprunt), MAX(id) FROM "{ancienne}"')
+        plus_ancien, dernier_id = curseur.fetchone()
+        aujourd_hui = timezone.now().date()
+        bornes = list(periodes(plus_ancien or aujourd_hui, aujourd_hui, granularite))
+        bornes += [b for b in periodes_a_venir(avance, granularite) if b not in bornes]
+        creer_partitions(bornes, granularite)
+        curseur.execute(f'CREATE TABLE "{DEFAUT}" PARTITION OF "{TABLE}" DEFAULT')
+
+        curseur.execute(f'INSERT INTO "{TABLE}" SELECT * FROM "{ancienne}"')
+        # CASCADE supprime aussi les clés étrangères entrantes
+        curseur.execute(f'DROP TABLE "{ancienne}" CASCADE')
+
+        curseur.execute(f'ALTER TABLE "{TABLE}" ADD PRIMARY KEY (id, date_emprunt)')
+        for definition in index:
+            curseur.execute(definition)
+        for nom, definition in cles_sortantes:
+            curseur.execute(f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{nom}" {definition}')
+        sequence = f"{TABLE}_id_seq"
+        curseur.execute(f'CREATE SEQUENCE "{sequence}" OWNED BY "{TABLE}".id')
+        curseur.execute("SELECT setval(%s, %s, %s)", [sequence, dernier_id or 1, dernier_id is not None])
+        curseur.execute(f"""ALTER TABLE "{TABLE}" ALTER COLUMN id SET DEFAULT nextval('"{sequence}"')""")
+    with connection.cursor() as curseur:
+        curseur.execute(f'ANALYZE "{TABLE}"')
+    logger.info(f"Table {TABLE} partitionnée par {granularite} : {len(bornes)} partition(s)")
+    return len(bornes)
@@ -0,0 +1,52 @@
+"""Règles de prêt par catégorie de membre et type de média.
+
+Les règles sont chargées une fois par processus et rechargées uniquement
+lorsque leur version (dans le cache partagé) change, c'est-à-dire après une
+modification d'une PolitiquePret.
+"""
+from collections import namedtuple
+import threading
+
+from . import versions
+
+Regle = namedtuple('Regle', ['duree_jours', 'max_emprunts', 'delai_grace_jours', 'max_prolongations'])
+
+# Règle appliquée en l'absence de politique définie (comportement historique)
+REGLE_PAR_DEFAUT = Regle(duree_jours=7, max_emprunts=3, delai_grace_jours=0, max_prolongations=1)
+
+TYPES_MEDIA = ('livre', 'dvd', 'cd')
+
+_regles = {}
+_version = None
+_verrou = threading.Lock()
+
+
+def regles():
+    """Toutes les règles, indexées par (categorie, type_media)"""
+    global _regles, _version
+    version = versions.obtenir('politiques_pret')
+    if version != _version:
+        from .models import PolitiquePret
+        with _verrou:
+            _regles = {
+                (p.categorie, p.type_media): Regle(p.duree_jours, p.max_emprunts, p.delai_grace_jours, p.max_prolongations)
+                for p in PolitiquePret.objects.all()
+            }
+            _version = version
+    return _regles
+
+
+def pour_categorie(categorie):
+    """Règles d'une catégorie de membre, par type de média"""
+    tableau = regles()
+    return {t: tableau.get((categorie, t), REGLE_PAR_DEFAUT) for t in TYPES_MEDIA}
+
+
+def regle(categorie, type_media):
+    """Règle applicable à une catégorie de membre et un type de média"""
+    return regles().get((categorie, type_media), REGLE_PAR_DEFAUT)
+
+
+def invalider():
+    """Force le rechargement des règles dans tous les processus"""
+    versions.incrementer('politiques_pret')
@@ -0,0 +1,160 @@
+"""Profilage à la demande des requêtes, utilisable en production.
+
+Un bibliothécaire connecté fait profiler une requête par l'en-tête
+`X-Profilage: 1` ou le paramètre `?profil=1` ; une fraction
+PROFILAGE_ECHANTILLON des autres requêtes est profilée aussi. La vue
+s'exécute sous cProfile et chaque requête SQL est chronométrée. Le profil
+est enregistré dans ProfilRequete sous l'identifiant renvoyé dans l'en-tête
+`X-Profil-Id` ; seuls les PROFILAGE_CONSERVES plus récents sont gardés.
+"""
+import cProfile
+import logging
+import marshal
+import pstats
+import random
+import sysconfig
+import time
+import uuid
+
+from django.conf import settings
+from django.db import connection
+
+from .models import ProfilRequete
+
+logger = logging.getLogger('mediatheque')
+
+NOMBRE_FONCTIONS = 30
+NOMBRE_REQUETES = 200
+LONGUEUR_SQL = 1000
+
+
+class ChronologieSQL:
+    """Enveloppe d'exécution SQL notant le début, la durée et le texte de chaque requête"""
+
+    def __init__(self, origine):
+        self.origine = origine
+        self.requetes = []
+        self.nombre = 0
+        self.duree_ms = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duree = (time.perf_counter() - debut) * 1000
+            self.nombre += 1
+            self.duree_ms += duree
+            # Au-delà, seuls le nombre et la durée totale sont comptés
+            if len(self.requetes) < NOMBRE_REQUETES:
+                self.requetes.append({
+                    'debut_ms': round((debut - self.origine) * 1000, 2),
+                    'duree_ms': round(duree, 2),
+                    'sql': sql[:LONGUEUR_SQL],
+                })
+
+
+def declencheur(request):
+    """'demande', 'echantillon' ou None si la requête n'est pas profilée"""
+    utilisateur = getattr(request, 'user', None)
+    if utilisateur is not None and utilisateur.is_staff and (
+        request.headers.get('X-Profilage') == '1' or request.GET.get('profil') == '1'
+    ):
+        return 'demande'
+    if settings.PROFILAGE_ECHANTILLON and random.random() < settings.PROFILAGE_ECHANTILLON:
+        return 'echantillon'
+    return None
+
+
+PREFIXES = sorted(
+    {str(settings.BASE_DIR), sysconfig.get_paths()['purelib'], sysconfig.get_paths()['stdlib']},
+    key=len, reverse=True,
+)
+
+
+def _raccourcir(fichier):
+    for prefixe in PREFIXES:
+        if fichier.startswith(prefixe):
+            return fichier[len(prefixe):].lstrip('/\\')
+    return fichier
+
+
+def fonctions_couteuses(statistiques, nombre=NOMBRE_FONCTIONS):
+    """Fonctions triées par temps cumulé : [{fonction, appels, propre_ms, cumul_ms}]"""
+    fonctions = [
+        {
+            'fonction': f"{nom} ({_raccourcir(fichier)}:{ligne})" if ligne else nom,
+            'appels': appels,
+            'propre_ms': round(propre * 1000, 3),
+            'cumul_ms': round(cumul * 1000, 3),
+        }
+        for (fichier, ligne, nom), (_, appels, propre, cumul, _) in statistiques.stats.items()
+    ]
+    fonctions.sort(key=lambda f: -f['cumul_ms'])
+    return fonctions[:nombre]
+
+
+def enregistrer(request, reponse, identifiant, raison, duree_ms, profil, chronologie):
+    """Enregistre le profil et ne garde que les plus récents"""
+    statistiques = pstats.Stats(profil)
+    utilisateur = getattr(request, 'user', None)
+    resolution = getattr(request, 'resolver_match', None)
+    ProfilRequete.objects.create(
+        identifiant=identifiant,
+        utilisateur=utilisateur if utilisateur is not None and utilisateur.is_authenticated else None,
+        methode=request.method,
+        chemin=request.get_full_path()[:500],
+        vue=resolution.view_name if resolution else '',
+        statut=reponse.status_code,
+        declencheur=raison,
+        duree_ms=duree_ms,
+        nombre_requetes=chronologie.nombre,
+        duree_sql_ms=chronologie.duree_ms,
+        fonctions=fonctions_couteuses(statistiques),
+        requetes=chronologie.requetes,
+        statistiques=marshal.dumps(statistiques.stats),
+    )
+    plus_ancien = list(
+        ProfilRequete.objects.order_by('-date').values_list('date', flat=True)
+        [settings.PROFILAGE_CONSERVES:settings.PROFILAGE_CONSERVES + 1]
+    )
+    if plus_ancien:
+        ProfilRequete.objects.filter(date__lte=plus_ancien[0]).delete()
+
+
+class ProfilageMiddleware:
+    """Profile la vue (cProfile et chronologie SQL) des requêtes demandées ou échantillonnées"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        raison = declencheur(request)
+        if raison is None:
+            return self.get_response(request)
+
+        profil = cProfile.Profile()
+        try:
+            profil.enable()
+        except ValueError:
+            # Un autre profileur est déjà actif dans ce thread
+            return self.get_response(request)
+        debut = time.perf_counter()
+        chronologie = ChronologieSQL(debut)
+        try:
+            with connection.execute_wrapper(chronologie):
+                reponse = self.get_response(request)
+        finally:
+            profil.disable()
+        duree_ms = (time.perf_counter() - debut) * 1000
+
+        identifiant = uuid.uuid4().hex
+        try:
+            enregistrer(request, reponse, identifiant, raison, duree_ms, profil, chronologie)
+        except Exception:
+            # Le profilage ne doit jamais faire échouer la requête
+            logger.exception(f"Enregistrement du profil {identifiant} impossible")
+            return reponse
+        reponse['X-Profil-Id'] = identifiant
+        logger.info(f"Profil {identifiant} : {request.method} {request.path} en {duree_ms:.0f} ms ({raison})")
+        return reponse
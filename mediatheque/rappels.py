@@ -0,0 +1,90 @@
+"""Rappels d'échéance et de retard envoyés aux membres par courriel.
+
+Les emprunts à rappeler sont lus en une seule requête, triés par membre,
+puis regroupés en un courriel récapitulatif par membre. Les courriels partent
+par lots sur une seule connexion au serveur, et chaque rappel envoyé est
+enregistré dans RappelEnvoye pour ne jamais être renvoyé.
+"""
+from contextlib import nullcontext
+from datetime import timedelta
+from itertools import groupby
+import logging
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Case, CharField, Exists, OuterRef, Value, When
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Emprunt, RappelEnvoye
+
+logger = logging.getLogger('mediatheque')
+
+
+def emprunts_a_rappeler(jours=3, aujourd_hui=None):
+    """Emprunts en cours arrivant à échéance sous `jours` jours ou en retard, non encore rappelés"""
+    aujourd_hui = aujourd_hui or timezone.now().date()
+    deja_envoye = RappelEnvoye.objects.filter(
+        emprunt=OuterRef('pk'),
+        type=OuterRef('type_rappel'),
+        date_echeance=OuterRef('date_retour_prevue'),
+    )
+    return (
+        Emprunt.objects.en_cours()
+        # Un membre supprimé garde ses emprunts jusqu'à la purge, mais n'est plus relancé
+        .filter(date_retour_prevue__lte=aujourd_hui + timedelta(days=jours), membre__supprime=False)
+        .annotate(type_rappel=Case(
+            When(date_retour_prevue__lt=aujourd_hui, then=Value('retard')),
+            default=Value('echeance'),
+            output_field=CharField(),
+        ))
+        .filter(~Exists(deja_envoye))
+        .select_related('membre', 'livre', 'dvd', 'cd')
+        .order_by('membre_id', 'date_retour_prevue', 'pk')
+    )
+
+
+def composer(membre, emprunts):
+    """Courriel récapitulatif des emprunts d'un membre"""
+    retards = [e for e in emprunts if e.type_rappel == 'retard']
+    echeances = [e for e in emprunts if e.type_rappel == 'echeance']
+    sujet = "Médiathèque : emprunt(s) en retard" if retards else "Médiathèque : retour prochain de vos emprunts"
+    corps = render_to_string('mediatheque/emails/rappel.txt', {
+        'membre': membre,
+        'retards': retards,
+        'echeances': echeances,
+    })
+    return EmailMessage(sujet, corps, settings.DEFAULT_FROM_EMAIL, [membre.email])
+
+
+def envoyer(jours=3, taille_lot=100, simulation=False):
+    """Envoie les rappels par lots ; retourne (nombre de courriels, nombre d'emprunts)"""
+    lot, marqueurs = [], []
+    nb_courriels = nb_emprunts = 0
+
+    def expedier(connexion):
+        if not simulation:
+            connexion.send_messages(lot)
+            # Marqué après l'envoi : un lot en échec sera retenté au prochain passage
+            RappelEnvoye.objects.bulk_create(marqueurs, ignore_conflicts=True)
+        lot.clear()
+        marqueurs.clear()
+
+    # Une seule connexion ouverte pour tous les lots, aucune en simulation
+    with nullcontext() if simulation else get_connection() as connexion:
+        for membre, emprunts in groupby(emprunts_a_rappeler(jours).iterator(), key=lambda e: e.membre):
+            emprunts = list(emprunts)
+            lot.append(composer(membre, emprunts))
+            marqueurs.extend(
+                RappelEnvoye(emprunt=e, type=e.type_rappel, date_echeance=e.date_retour_prevue)
+                for e in emprunts
+            )
+            nb_courriels += 1
+            nb_emprunts += len(emprunts)
+            if len(lot) >= taille_lot:
+                expedier(connexion)
+        if lot:
+            expedier(connexion)
+
+    logger.info(f"Rappels {'simulés' if simulation else 'envoyés'}: {nb_courriels} courriel(s), {nb_emprunts} emprunt(s)")
+    return nb_courriels, nb_emprunts
@@ -0,0 +1,166 @@
+"""Recommandations « les membres ayant emprunté ceci ont aussi emprunté… ».
+
+Le calcul (manage.py calculer_recommandations, périodique) construit la
+matrice creuse membres x médias à partir de tout l'historique, emprunts
+archivés compris, en déduit la similarité cosinus entre médias (M^T M
+normalisée) et conserve les K plus proches voisins de chaque média dans
+la table Recommandation. L'affichage ne lit que cette table.
+
+NumPy et SciPy ne sont nécessaires qu'au calcul.
+"""
+from itertools import chain
+import logging
+
+from django.db import transaction
+from django.db.models import Max, Q
+
+from .models import CD, DVD, Livre, Emprunt, EmpruntArchive, Recommandation
+
+logger = logging.getLogger('mediatheque')
+
+MODELES_MEDIA = {'livre': Livre, 'dvd': DVD, 'cd': CD}
+CODES_TYPE = {type_media: code for code, type_media in enumerate(MODELES_MEDIA)}
+TYPES_PAR_CODE = {code: type_media for type_media, code in CODES_TYPE.items()}
+
+# Les médias sont identifiés par code_type * DECALAGE + id dans une seule dimension
+DECALAGE = 1 << 32
+
+
+def importer_numpy():
+    """Importe NumPy et SciPy ; ImportError si absents"""
+    import numpy
+    from scipy import sparse
+    return numpy, sparse
+
+
+def charger_emprunts():
+    """Couples (membre, média encodé) de tout l'historique, en tableaux NumPy"""
+    numpy, _ = importer_numpy()
+    membres, medias = [], []
+    for source in (Emprunt, EmpruntArchive):
+        for type_media, code in CODES_TYPE.items():
+            lignes = (
+                source.objects.filter(**{f'{type_media}__isnull': False})
+                .order_by().values_list('membre_id', f'{type_media}_id').iterator(chunk_size=20000)
+            )
+            couples = numpy.fromiter(chain.from_iterable(lignes), dtype=numpy.int64).reshape(-1, 2)
+            membres.append(couples[:, 0])
+            medias.append(couples[:, 1] + code * DECALAGE)
+    return numpy.concatenate(membres), numpy.concatenate(medias)
+
+
+def calculer_voisins(membres, medias, k=10, minimum=2):
+    """K plus proches voisins de chaque média : {média: [(voisin, score), ...]}.
+
+    `minimum` est le nombre minimal d'emprunteurs communs retenu, pour ne
+    pas recommander sur la foi d'un seul membre.
+    """
+    numpy, sparse = importer_numpy()
+    if not len(medias):
+        return {}
+    codes_membres, lignes = numpy.unique(membres, return_inverse=True)
+    codes_medias, colonnes = numpy.unique(medias, return_inverse=True)
+    matrice = sparse.csr_matrix(
+        (numpy.ones(len(lignes), dtype=numpy.float32), (lignes, colonnes)),
+        shape=(len(codes_membres), len(codes_medias)),
+    )
+    # Emprunts multiples d'un même média par un membre : comptés une fois
+    matrice.data[:] = 1
+
+    cooccurrences = (matrice.T @ matrice).tocsr()
+    emprunteurs = cooccurrences.diagonal()
+    cooccurrences.setdiag(0)
+    cooccurrences.data[cooccurrences.data < minimum] = 0
+    cooccurrences.eliminate_zeros()
+
+    # Similarité cosinus : co-emprunteurs / sqrt(emprunteurs_i * emprunteurs_j)
+    normes = 1 / numpy.sqrt(numpy.maximum(emprunteurs, 1))
+    similarites = sparse.diags(normes) @ cooccurrences @ sparse.diags(normes)
+    similarites = similarites.tocsr()
+
+    voisins = {}
+    for ligne in range(similarites.shape[0]):
+        debut, fin = similarites.indptr[ligne], similarites.indptr[ligne + 1]
+        if debut == fin:
+            continue
+        scores = similarites.data[debut:fin]
+        indices = similarites.indices[debut:fin]
+        meilleurs = numpy.argsort(-scores, kind='stable')[:k]
+        voisins[int(codes_medias[ligne])] = [
+            (int(codes_medias[indices[i]]), float(scores[i])) for i in meilleurs
+        ]
+    return voisins
+
+
+def decoder(code):
+    """(type_media, id) d'un média encodé"""
+    return TYPES_PAR_CODE[code // DECALAGE], code % DECALAGE
+
+
+def enregistrer(voisins):
+    """Remplace la table des recommandations ; retourne le nombre de lignes"""
+    titres = {
+        type_media: dict(modele.objects.values_list('pk', 'titre'))
+        for type_media, modele in MODELES_MEDIA.items()
+    }
+    lignes = []
+    for code, liste in voisins.items():
+        type_media, media_id = decoder(code)
+        rang = 0
+        for code_voisin, score in liste:
+            type_voisin, voisin_id = decoder(code_voisin)
+            # Média supprimé depuis : ignoré
+            titre = titres[type_voisin].get(voisin_id)
+            if titre is None:
+                continue
+            rang += 1
+            lignes.append(Recommandation(
+                type_media=type_media, media_id=media_id, rang=rang,
+                type_media_voisin=type_voisin, media_id_voisin=voisin_id,
+                titre_voisin=titre, score=score,
+            ))
+    with transaction.atomic():
+        Recommandation.objects.all().delete()
+        Recommandation.objects.bulk_create(lignes, batch_size=2000)
+    return len(lignes)
+
+
+def calculer(k=10, minimum=2):
+    """Recalcule toutes les recommandations ; retourne le nombre de lignes enregistrées"""
+    membres, medias = charger_emprunts()
+    nombre = enregistrer(calculer_voisins(membres, medias, k=k, minimum=minimum))
+    logger.info(f"Recommandations calculées : {nombre} ligne(s) à partir de {len(medias)} emprunt(s)")
+    return nombre
+
+
+def pour_media(type_media, media_id, limite=10):
+    """Médias empruntés par les emprunteurs de ce média, en une requête indexée"""
+    return list(
+        Recommandation.objects.filter(type_media=type_media, media_id=media_id)
+        .order_by('rang').values('type_media_voisin', 'media_id_voisin', 'titre_voisin', 'score')[:limite]
+    )
+
+
+def pour_membre(membre, limite=10, historique=20):
+    """Suggestions à partir des derniers emprunts du membre, déjà empruntés exclus"""
+    recents = (
+        membre.emprunt_set.order_by('-date_emprunt', '-pk')
+        .values_list('livre_id', 'dvd_id', 'cd_id')[:historique]
+    )
+    sources = set()
+    for ids in recents:
+        for type_media, media_id in zip(MODELES_MEDIA, ids):
+            if media_id is not None:
+                sources.add((type_media, media_id))
+    if not sources:
+        return []
+    filtre = Q()
+    deja_empruntes = Q()
+    for type_media, media_id in sources:
+        filtre |= Q(type_media=type_media, media_id=media_id)
+        deja_empruntes |= Q(type_media_voisin=type_media, media_id_voisin=media_id)
+    return list(
+        Recommandation.objects.filter(filtre).exclude(deja_empruntes)
+        .values('type_media_voisin', 'media_id_voisin', 'titre_voisin')
+        .annotate(score=Max('score')).order_by('-score')[:limite]
+    )
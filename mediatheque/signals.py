@@ -0,0 +1,127 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+import logging
+
+from . import autocompletion, diffusion, politiques, sqlite, statistiques, synchronisation, taches, tracage, versions
+from .models import CD, DVD, Emprunt, Exemplaire, JeuPlateau, Livre, PolitiquePret
+
+logger = logging.getLogger('mediatheque')
+
+
+@receiver(user_logged_in)
+def purger_sessions_expirees(sender, request, user, **kwargs):
+    """Programme la purge des sessions expirées par le worker, au plus une fois par intervalle"""
+    intervalle = settings.SESSION_PURGE_INTERVALLE
+    if not intervalle:
+        return
+    # cache.add échoue si la clé existe déjà : une seule tâche par intervalle
+    if cache.add('sessions:purge', True, timeout=intervalle):
+        taches.enqueue('purger_sessions')
+
+
+@receiver([post_save, post_delete], sender=Emprunt)
+def invalider_emprunts_membre(sender, instance, **kwargs):
+    """Invalide le cache de l'espace membre après un emprunt ou un retour"""
+    versions.incrementer(f"emprunts_membre:{instance.membre_id}")
+
+
+@receiver([post_save, post_delete], sender=Emprunt)
+def diffuser_disponibilite(sender, instance, **kwargs):
+    """Pousse la nouvelle disponibilité du média aux bornes abonnées"""
+    type_media = instance.type_media()
+    if type_media:
+        diffusion.signaler({type_media: [getattr(instance, f'{type_media}_id')]})
+
+
+@receiver([post_save, post_delete], sender=Emprunt)
+def marquer_media_emprunte(sender, instance, **kwargs):
+    """Inclut le média dans le prochain delta de synchronisation des bornes"""
+    type_media = instance.type_media()
+    if type_media:
+        synchronisation.marquer({type_media: [getattr(instance, f'{type_media}_id')]})
+
+
+@receiver(post_delete, sender=Emprunt)
+def retirer_des_statistiques(sender, instance, **kwargs):
+    """Retire un emprunt effacé des agrégats journaliers déjà calculés"""
+    statistiques.retirer_emprunt(instance.date_emprunt, instance.date_retour_effective)
+
+
+@receiver(post_save, sender=Livre)
+@receiver(post_save, sender=DVD)
+@receiver(post_save, sender=CD)
+def completer_exemplaires(sender, instance, **kwargs):
+    """Crée les exemplaires physiques correspondant à nombre_exemplaires"""
+    Exemplaire.objects.completer(sender, [instance.pk])
+
+
+@receiver(post_save, sender=Livre)
+@receiver(post_save, sender=DVD)
+@receiver(post_save, sender=CD)
+@receiver(post_save, sender=JeuPlateau)
+def indexer_media(sender, instance, **kwargs):
+    """Met à jour l'index d'autocomplétion après l'ajout ou la modification d'un média"""
+    type_media = 'jeu' if sender is JeuPlateau else sender._meta.model_name
+    if getattr(instance, 'supprime', False):
+        autocompletion.retirer(type_media, instance.pk)
+    else:
+        autocompletion.mettre_a_jour(type_media, instance)
+
+
+@receiver(post_delete, sender=Livre)
+@receiver(post_delete, sender=DVD)
+@receiver(post_delete, sender=CD)
+@receiver(post_delete, sender=JeuPlateau)
+def desindexer_media(sender, instance, **kwargs):
+    """Retire un média effacé de l'index d'autocomplétion"""
+    autocompletion.retirer('jeu' if sender is JeuPlateau else sender._meta.model_name, instance.pk)
+
+
+@receiver(post_save, sender=Livre)
+@receiver(post_save, sender=DVD)
+@receiver(post_save, sender=CD)
+@receiver(post_save, sender=JeuPlateau)
+def marquer_media(sender, instance, **kwargs):
+    """Inclut un média ajouté ou modifié dans le prochain delta de synchronisation"""
+    synchronisation.marquer({'jeu' if sender is JeuPlateau else sender._meta.model_name: [instance.pk]})
+
+
+@receiver(post_delete, sender=Livre)
+@receiver(post_delete, sender=DVD)
+@receiver(post_delete, sender=CD)
+@receiver(post_delete, sender=JeuPlateau)
+def signaler_retrait(sender, instance, **kwargs):
+    """Signale aux bornes un média effacé (déjà signalé s'il avait été supprimé logiquement)"""
+    if not getattr(instance, 'supprime', False):
+        synchronisation.retirer('jeu' if sender is JeuPlateau else sender._meta.model_name, instance.pk)
+
+
+@receiver([post_save, post_delete], sender=JeuPlateau)
+def invalider_jeux(sender, **kwargs):
+    """Invalide les résultats de recherche de jeux mis en cache"""
+    versions.incrementer('jeux')
+
+
+@receiver([post_save, post_delete], sender=PolitiquePret)
+def invalider_politiques(sender, **kwargs):
+    """Force le rechargement des politiques de prêt dans tous les processus"""
+    politiques.invalider()
+
+
+@receiver(connection_created)
+def configurer_sqlite(sender, connection, **kwargs):
+    """Applique le profil de performance à chaque nouvelle connexion SQLite"""
+    if connection.vendor == 'sqlite' and settings.SQLITE_PERFORMANCE:
+        with connection.cursor() as curseur:
+            sqlite.appliquer_pragmas(curseur, sqlite.pragmas_performance())
+
+
+@receiver(connection_created)
+def tracer_requetes_sql(sender, connection, **kwargs):
+    """Pose l'enveloppe de traçage SQL sur la connexion (sans effet hors trace)"""
+    if tracage.tracer_requete not in connection.execute_wrappers:
+        connection.execute_wrappers.append(tracage.tracer_requete)
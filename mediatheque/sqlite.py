@@ -0,0 +1,34 @@
+"""Profil de performance SQLite (SQLITE_PERFORMANCE=True).
+
+Les pragmas sont propres à chaque connexion : ils sont appliqués à
+l'ouverture via le signal connection_created (voir signals.py).
+"""
+import django
+from django.conf import settings
+
+
+def pragmas_performance():
+    """Pragmas du profil de performance, dans l'ordre d'application"""
+    return {
+        'journal_mode': 'WAL',            # lecteurs et écrivain ne se bloquent plus
+        'synchronous': 'NORMAL',          # sûr en WAL, un fsync par checkpoint au lieu de chaque commit
+        'busy_timeout': settings.SQLITE_BUSY_TIMEOUT,
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,         # en Kio : 64 Mio de cache de pages
+        'temp_store': 'MEMORY',
+    }
+
+
+def appliquer_pragmas(curseur, pragmas):
+    """Applique les pragmas sur une connexion SQLite"""
+    for nom, valeur in pragmas.items():
+        curseur.execute(f"PRAGMA {nom} = {valeur}")
+
+
+def options_performance():
+    """OPTIONS de connexion du profil : transactions IMMEDIATE (Django 5.1 et plus)"""
+    # Avant Django 5.1, le moteur SQLite n'accepte pas transaction_mode : les
+    # transactions restent différées et seul busy_timeout protège des verrous
+    if django.VERSION >= (5, 1):
+        return {'transaction_mode': 'IMMEDIATE'}
+    return {}
@@ -0,0 +1,95 @@
+"""Fichiers statiques hachés, précompressés et servis avec une expiration lointaine.
+
+collectstatic nomme chaque fichier d'après le hachage de son contenu
+(mediatheque.3f2a….css) et écrit à côté ses versions .gz et, si le module
+brotli est installé, .br. Un nom haché ne désigne qu'un seul contenu : il
+peut être mis en cache un an par les navigateurs. Les fichiers sont servis
+par le serveur web (voir README) ou, à défaut, par la vue `servir`.
+"""
+import gzip
+import mimetypes
+import os
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, staticfiles_storage
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Types compressibles ; les images et polices le sont déjà
+EXTENSIONS_COMPRESSIBLES = ('.css', '.js', '.svg', '.txt', '.json', '.map')
+TAILLE_MIN = 256
+EXPIRATION_HACHES = 365 * 24 * 3600
+
+
+class StockageStatique(ManifestStaticFilesStorage):
+    """Stockage à noms hachés écrivant les versions compressées des fichiers collectés"""
+    manifest_strict = False
+
+    def stored_name(self, name):
+        # Fichier non collecté (développement, tests) : URL non hachée
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for nom in self.hashed_files.values():
+            if nom.endswith(EXTENSIONS_COMPRESSIBLES):
+                self.compresser(nom)
+
+    def compresser(self, nom):
+        """Écrit nom.gz (et nom.br) si la compression fait gagner de la place"""
+        chemin = self.path(nom)
+        with open(chemin, 'rb') as fichier:
+            contenu = fichier.read()
+        if len(contenu) < TAILLE_MIN:
+            return
+        versions = {'.gz': gzip.compress(contenu, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            versions['.br'] = brotli.compress(contenu, quality=11)
+        for suffixe, compresse in versions.items():
+            if len(compresse) < len(contenu):
+                with open(chemin + suffixe, 'wb') as fichier:
+                    fichier.write(compresse)
+
+
+def servir(request, chemin):
+    """Sert un fichier de STATIC_ROOT, dans la meilleure version compressée acceptée"""
+    try:
+        complet = safe_join(settings.STATIC_ROOT, chemin)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(complet):
+        raise Http404
+
+    accepte = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    encodage = None
+    for nom, suffixe in (('br', '.br'), ('gzip', '.gz')):
+        if nom in accepte and os.path.isfile(complet + suffixe):
+            encodage, complet = nom, complet + suffixe
+            break
+
+    modification = int(os.stat(complet).st_mtime)
+    reponse = get_conditional_response(request, last_modified=modification)
+    if reponse is None:
+        reponse = FileResponse(open(complet, 'rb'), content_type=mimetypes.guess_type(chemin)[0])
+        if encodage:
+            reponse['Content-Encoding'] = encodage
+    reponse['Last-Modified'] = http_date(modification)
+    patch_vary_headers(reponse, ['Accept-Encoding'])
+    hashes = getattr(staticfiles_storage, 'hashed_files', {})
+    if chemin in hashes.values():
+        reponse['Cache-Control'] = f'public, max-age={EXPIRATION_HACHES}, immutable'
+    else:
+        reponse['Cache-Control'] = 'public, max-age=0, must-revalidate'
+    return reponse
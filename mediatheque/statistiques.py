@@ -0,0 +1,181 @@
+"""Calcul des agrégats statistiques à partir des emprunts.
+
+Les agrégats d'un jour sont toujours recalculés entièrement : retraiter un
+jour déjà agrégé est sans effet, ce qui rend l'agrégation incrémentale sûre.
+Les emprunts archivés sont comptés avec les autres, de sorte que l'archivage
+ne modifie aucun agrégat. Un emprunt effacé ne laisse pas de date de
+modification : ses jours sont recalculés au moment de l'effacement.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import (
+    CD, DVD, Livre, Emprunt, EmpruntArchive, ActiviteMembreJournaliere, EtatCatalogue,
+    PointDeReprise, StatistiqueJournaliere,
+)
+
+MODELES_MEDIA = {'livre': Livre, 'dvd': DVD, 'cd': CD}
+
+# Marge de recouvrement avec le traitement précédent (transactions en vol)
+MARGE_REPRISE = timedelta(minutes=5)
+
+
+def jours_modifies(depuis):
+    """Jours d'emprunt ou de retour des emprunts modifiés depuis la date donnée"""
+    emprunts = Emprunt.objects.all()
+    if depuis is not None:
+        emprunts = emprunts.filter(date_modification__gt=depuis - MARGE_REPRISE)
+    jours = set(emprunts.values_list('date_emprunt', flat=True).distinct())
+    jours.update(
+        emprunts.filter(date_retour_effective__isnull=False)
+        .values_list('date_retour_effective', flat=True).distinct()
+    )
+    return jours
+
+
+@transaction.atomic
+def recalculer_jours(jours):
+    """Recalcule les agrégats des jours donnés, emprunts archivés compris"""
+    jours = list(jours)
+    StatistiqueJournaliere.objects.filter(jour__in=jours).delete()
+    ActiviteMembreJournaliere.objects.filter(jour__in=jours).delete()
+
+    lignes = {}
+    activites = {}
+    for source in (Emprunt, EmpruntArchive):
+        for type_media in MODELES_MEDIA:
+            emprunts = source.objects.filter(**{f'{type_media}__isnull': False})
+            for ligne in (
+                emprunts.filter(date_emprunt__in=jours)
+                .values('date_emprunt', f'{type_media}_id', f'{type_media}__titre')
+                .annotate(nombre=Count('id'))
+            ):
+                cle = (ligne['date_emprunt'], type_media, ligne[f'{type_media}_id'])
+                stat = lignes.setdefault(cle, StatistiqueJournaliere(
+                    jour=cle[0], type_media=type_media, media_id=cle[2], titre=ligne[f'{type_media}__titre']
+                ))
+                stat.emprunts += ligne['nombre']
+            for ligne in (
+                emprunts.filter(date_retour_effective__in=jours)
+                .values('date_retour_effective', f'{type_media}_id', f'{type_media}__titre')
+                .annotate(
+                    nombre=Count('id'),
+                    en_retard=Count('id', filter=Q(date_retour_effective__gt=F('date_retour_prevue'))),
+                )
+            ):
+                cle = (ligne['date_retour_effective'], type_media, ligne[f'{type_media}_id'])
+                stat = lignes.setdefault(cle, StatistiqueJournaliere(
+                    jour=cle[0], type_media=type_media, media_id=cle[2], titre=ligne[f'{type_media}__titre']
+                ))
+                stat.retours += ligne['nombre']
+                stat.retours_en_retard += ligne['en_retard']
+
+        for ligne in (
+            source.objects.filter(date_emprunt__in=jours)
+            .values('date_emprunt', 'membre_id', 'membre__prenom', 'membre__nom')
+            .annotate(nombre=Count('id'))
+        ):
+            cle = (ligne['date_emprunt'], ligne['membre_id'])
+            activite = activites.setdefault(cle, ActiviteMembreJournaliere(
+                jour=cle[0],
+                membre_id=cle[1],
+                nom_membre=f"{ligne['membre__prenom']} {ligne['membre__nom']}",
+            ))
+            activite.emprunts += ligne['nombre']
+
+    StatistiqueJournaliere.objects.bulk_create(lignes.values(), batch_size=500)
+    ActiviteMembreJournaliere.objects.bulk_create(activites.values(), batch_size=500)
+
+
+def recalculer_par_lots(jours, taille_lot=500):
+    """Recalcule les jours donnés par lots ; retourne leur nombre"""
+    jours = sorted(jour for jour in set(jours) if jour is not None)
+    for i in range(0, len(jours), taille_lot):
+        recalculer_jours(jours[i:i + taille_lot])
+    return len(jours)
+
+
+class JoursRetires(set):
+    """Jours des emprunts effacés dans une transaction, recalculés une fois à sa validation"""
+    traite = False
+
+    def __call__(self):
+        self.traite = True
+        recalculer_par_lots(self)
+
+
+def retirer_emprunt(date_emprunt, date_retour_effective):
+    """Recalcule, après validation de la transaction, les jours d'un emprunt effacé"""
+    connexion = transaction.get_connection()
+    lot = getattr(connexion, 'jours_retires', None)
+    # Lot de la transaction en cours : ni exécuté, ni abandonné par un rollback
+    if lot is not None and not lot.traite and any(fonction is lot for _, fonction, _ in connexion.run_on_commit):
+        lot.update((date_emprunt, date_retour_effective))
+        return
+    lot = connexion.jours_retires = JoursRetires((date_emprunt, date_retour_effective))
+    transaction.on_commit(lot)
+
+
+def calculer_etat_catalogue():
+    """Met à jour l'instantané d'utilisation du catalogue"""
+    aujourd_hui = timezone.now().date()
+    maintenant = timezone.now()
+    for type_media, modele in MODELES_MEDIA.items():
+        actifs = Emprunt.objects.filter(
+            **{f'{type_media}__isnull': False}, date_retour_effective__isnull=True
+        ).aggregate(
+            total=Count('id'),
+            en_retard=Count('id', filter=Q(date_retour_prevue__lt=aujourd_hui)),
+        )
+        EtatCatalogue.objects.update_or_create(type_media=type_media, defaults={
+            'exemplaires': modele.objects.aggregate(total=Sum('nombre_exemplaires'))['total'] or 0,
+            'emprunts_actifs': actifs['total'],
+            'emprunts_en_retard': actifs['en_retard'],
+            'calcule_le': maintenant,
+        })
+
+
+def agreger(taille_lot=500):
+    """Agrège les emprunts modifiés depuis le dernier passage. Retourne le nombre de jours traités"""
+    debut = timezone.now()
+    reprise, _ = PointDeReprise.objects.get_or_create(nom='statistiques')
+    nombre = recalculer_par_lots(jours_modifies(reprise.valeur), taille_lot)
+    calculer_etat_catalogue()
+    reprise.valeur = debut
+    reprise.save()
+    return nombre
+
+
+def tableau_de_bord(aujourd_hui=None, jours=30):
+    """Indicateurs du tableau de bord, lus uniquement dans les agrégats"""
+    aujourd_hui = aujourd_hui or timezone.now().date()
+    debut_mois = aujourd_hui.replace(day=1)
+    debut_periode = aujourd_hui - timedelta(days=jours - 1)
+
+    stats_mois = StatistiqueJournaliere.objects.filter(jour__gte=debut_mois)
+    retours_mois = stats_mois.aggregate(retours=Sum('retours'), en_retard=Sum('retours_en_retard'))
+    activite = ActiviteMembreJournaliere.objects.filter(jour__gte=debut_periode)
+
+    return {
+        'top_titres': list(
+            stats_mois.values('type_media', 'media_id', 'titre')
+            .annotate(total=Sum('emprunts')).filter(total__gt=0).order_by('-total')[:10]
+        ),
+        'emprunts_par_jour': list(
+            StatistiqueJournaliere.objects.filter(jour__gte=debut_periode)
+            .values('jour', 'type_media').annotate(total=Sum('emprunts'))
+            .filter(total__gt=0).order_by('-jour', 'type_media')
+        ),
+        'etats': list(EtatCatalogue.objects.order_by('type_media')),
+        'retours_mois': retours_mois['retours'] or 0,
+        'retours_en_retard_mois': retours_mois['en_retard'] or 0,
+        'membres_actifs': activite.values('membre_id').distinct().count(),
+        'top_membres': list(
+            activite.values('membre_id', 'nom_membre')
+            .annotate(total=Sum('emprunts')).order_by('-total')[:10]
+        ),
+        'jours': jours,
+    }
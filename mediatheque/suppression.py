@@ -0,0 +1,84 @@
+"""Purge en tâche de fond des membres et médias supprimés.
+
+La suppression dans l'application se limite à poser le drapeau `supprime`
+(voir SuppressionLogique) : l'objet disparaît aussitôt des listes. La tâche
+`purger_supprime` efface ensuite ses données liées par lots bornés de DELETE
+directs, sans que le collecteur de l'ORM ne charge l'historique en mémoire,
+puis l'objet lui-même.
+"""
+from collections import Counter
+import logging
+
+from django.apps import apps
+from django.db import transaction
+
+from . import diffusion, statistiques, synchronisation, versions
+from .archive import ajuster_compteurs, supprimer_par_ids
+from .models import Emprunt, EmpruntArchive, Exemplaire, RappelEnvoye, ids_par_type
+
+logger = logging.getLogger('mediatheque')
+
+
+def _purger_emprunts(champ, pk, taille_lot, jours):
+    """Supprime par lots les emprunts liés et leurs rappels ; retourne leur nombre"""
+    total = 0
+    while True:
+        with transaction.atomic():
+            lot = list(Emprunt.objects.filter(**{champ: pk}).values_list(
+                'pk', 'membre_id', 'date_emprunt', 'date_retour_effective'
+            )[:taille_lot])
+            if not lot:
+                return total
+            ids = [emprunt_id for emprunt_id, *_ in lot]
+            jours.update(jour for *_, date_emprunt, date_retour in lot for jour in (date_emprunt, date_retour))
+            # Le DELETE direct n'émet pas post_delete : les emprunts en cours libèrent
+            # ici leur exemplaire et leur média change de disponibilité
+            en_cours = Emprunt.objects.filter(pk__in=ids).en_cours()
+            medias = ids_par_type(en_cours)
+            Exemplaire.objects.filter(
+                pk__in=list(en_cours.filter(exemplaire__isnull=False).values_list('exemplaire_id', flat=True)),
+                etat='emprunte',
+            ).update(etat='disponible')
+            RappelEnvoye.objects.filter(emprunt_id__in=ids).delete()
+            total += supprimer_par_ids(Emprunt, ids)
+            synchronisation.marquer(medias)
+            diffusion.signaler(medias)
+        for membre_id in {membre_id for _, membre_id, *_ in lot}:
+            versions.incrementer(f"emprunts_membre:{membre_id}")
+
+
+def _purger_archives(champ, pk, taille_lot, jours):
+    """Supprime par lots les emprunts archivés liés ; retourne leur nombre"""
+    total = 0
+    while True:
+        with transaction.atomic():
+            lot = list(EmpruntArchive.objects.filter(**{champ: pk}).values_list(
+                'pk', 'membre_id', 'date_emprunt', 'date_retour_effective'
+            )[:taille_lot])
+            if not lot:
+                return total
+            jours.update(jour for *_, date_emprunt, date_retour in lot for jour in (date_emprunt, date_retour))
+            total += supprimer_par_ids(EmpruntArchive, [archive_id for archive_id, *_ in lot])
+            if champ != 'membre':
+                ajuster_compteurs(Counter(membre_id for _, membre_id, *_ in lot), signe=-1)
+
+
+def purger(modele, pk, taille_lot=5000):
+    """Efface un membre ou un média supprimé et toutes ses données liées"""
+    classe = apps.get_model('mediatheque', modele)
+    if not classe.tous.filter(pk=pk, supprime=True).exists():
+        return 0
+    # Les clés étrangères des emprunts portent le nom du modèle (livre, dvd, cd, membre)
+    jours = set()
+    emprunts = _purger_emprunts(modele, pk, taille_lot, jours)
+    archives = _purger_archives(modele, pk, taille_lot, jours)
+    # Les DELETE directs n'émettent pas post_delete : les agrégats des jours concernés sont refaits ici
+    statistiques.recalculer_par_lots(jours)
+    if modele != 'membre':
+        while supprimer_par_ids(Exemplaire, list(
+            Exemplaire.objects.filter(**{modele: pk}).values_list('pk', flat=True)[:taille_lot]
+        )):
+            pass
+    classe.tous.filter(pk=pk).delete()
+    logger.info(f"Purge {modele} #{pk} : {emprunts} emprunt(s), {archives} emprunt(s) archivé(s)")
+    return emprunts + archives
@@ -0,0 +1,186 @@
+"""Synchronisation hors ligne des bornes : instantané du catalogue et deltas.
+
+Chaque modification d'un média (fiche, emprunt, retour) lui attribue le
+numéro suivant d'une séquence globale, stockée dans la colonne `sequence`.
+La séquence est un Compteur incrémenté sous verrou de ligne : une
+transaction qui prend le numéro N bloque la suivante jusqu'à sa validation,
+les numéros deviennent donc visibles dans l'ordre et un delta « depuis N »
+ne peut pas manquer une modification validée en retard.
+
+Pour que ce verrou ne sérialise pas les emprunts et retours, les médias
+modifiés pendant une transaction sont seulement notés ; ils reçoivent leur
+numéro après sa validation, dans une courte transaction qui ne fait que
+prendre le numéro et l'inscrire.
+
+Une borne charge l'instantané (manage.py snapshot_catalogue), puis
+demande périodiquement les lignes dont la séquence dépasse la version
+qu'elle détient. Les médias retirés sont signalés par des MediaRetire, dont
+les plus anciens peuvent être purgés : une borne plus ancienne que l'horizon
+de purge doit recharger l'instantané.
+"""
+from datetime import timedelta
+import gzip
+import json
+import logging
+import os
+import tempfile
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from . import disponibilite
+from .models import CD, DVD, Compteur, JeuPlateau, Livre, MediaRetire
+
+logger = logging.getLogger('mediatheque')
+
+FORMAT = 1
+COMPTEUR = 'catalogue'
+# Plus haute séquence des MediaRetire purgés : les deltas plus anciens sont refusés
+HORIZON = 'catalogue:horizon'
+
+MODELES = {'livre': Livre, 'dvd': DVD, 'cd': CD, 'jeu': JeuPlateau}
+
+# Colonnes propres à chaque type, après l'identifiant
+COLONNES = {
+    'livre': ('titre', 'auteur'),
+    'dvd': ('titre', 'auteur', 'duree'),
+    'cd': ('titre', 'auteur', 'artiste', 'nombre_pistes'),
+    'jeu': ('titre', 'editeur', 'nombre_joueurs_min', 'nombre_joueurs_max'),
+}
+# Colonnes de disponibilité, calculées pour les types empruntables
+DISPONIBILITE = ('nombre_exemplaires', 'disponibles', 'prochain_retour')
+
+
+def _valeur(nom):
+    return Compteur.objects.filter(nom=nom).values_list('valeur', flat=True).first() or 0
+
+
+def version():
+    """Dernière séquence attribuée"""
+    return _valeur(COMPTEUR)
+
+
+def prochaine_sequence():
+    """Attribue le numéro suivant ; le verrou est tenu jusqu'à la fin de la transaction"""
+    with transaction.atomic():
+        if not Compteur.objects.filter(nom=COMPTEUR).update(valeur=F('valeur') + 1):
+            Compteur.objects.get_or_create(nom=COMPTEUR)
+            Compteur.objects.filter(nom=COMPTEUR).update(valeur=F('valeur') + 1)
+        return version()
+
+
+def _numeroter(ids_par_type, retires=()):
+    """Attribue une nouvelle séquence, dans une transaction courte qui ne fait que l'inscrire"""
+    with transaction.atomic():
+        sequence = prochaine_sequence()
+        for type_media, ids in ids_par_type.items():
+            # `tous` inclut les médias supprimés logiquement ; les jeux n'ont que `objects`
+            modele = MODELES[type_media]
+            getattr(modele, 'tous', modele.objects).filter(pk__in=ids).update(sequence=sequence)
+        MediaRetire.objects.bulk_create([
+            MediaRetire(sequence=sequence, type_media=type_media, media_id=pk) for type_media, pk in retires
+        ])
+
+
+def marquer(ids_par_type):
+    """Attribue une nouvelle séquence aux médias modifiés, après validation de la transaction"""
+    ids_par_type = {type_media: set(ids) for type_media, ids in ids_par_type.items() if ids}
+    if ids_par_type:
+        transaction.on_commit(lambda: _numeroter(ids_par_type))
+
+
+def retirer(type_media, pk):
+    """Signale aux bornes le retrait d'un média, après validation de la transaction"""
+    transaction.on_commit(lambda: _numeroter({}, [(type_media, pk)]))
+
+
+def _lignes(ids_par_type=None, depuis=None):
+    """Lignes en colonnes de chaque type : {type: {'colonnes': [...], 'lignes': [[...]]}}"""
+    if depuis is not None:
+        ids_par_type = {
+            type_media: list(modele.objects.filter(sequence__gt=depuis).values_list('pk', flat=True))
+            for type_media, modele in MODELES.items()
+        }
+    etats = disponibilite.etats(
+        None if ids_par_type is None else {t: ids for t, ids in ids_par_type.items() if t != 'jeu'}
+    )
+    resultat = {}
+    for type_media, modele in MODELES.items():
+        colonnes = ('id',) + COLONNES[type_media]
+        medias = modele.objects.order_by('pk')
+        if ids_par_type is not None:
+            if not ids_par_type.get(type_media):
+                continue
+            medias = medias.filter(pk__in=ids_par_type[type_media])
+        lignes = [list(ligne) for ligne in medias.values_list(*colonnes).iterator(chunk_size=5000)]
+        if type_media in etats:
+            # etats() trie par titre : réaligner sur l'ordre des identifiants
+            par_id = {etat['id']: etat for etat in etats[type_media]}
+            for ligne in lignes:
+                etat = par_id.get(ligne[0], {})
+                ligne.extend(etat.get(champ) for champ in DISPONIBILITE)
+            colonnes += DISPONIBILITE
+        resultat[type_media] = {'colonnes': list(colonnes), 'lignes': lignes}
+    return resultat
+
+
+def instantane():
+    """Catalogue complet, avec la version à partir de laquelle demander les deltas"""
+    # Version lue avant les lignes : une modification concurrente figure au pire
+    # dans l'instantané et dans le delta suivant, qui la réapplique sans dommage
+    courante = version()
+    return {
+        'format': FORMAT,
+        'version': courante,
+        'genere_le': timezone.now(),
+        'medias': _lignes(),
+    }
+
+
+def delta(depuis):
+    """Médias modifiés ou retirés après la version `depuis` ; None si elle précède l'horizon de purge"""
+    if depuis < _valeur(HORIZON):
+        return None
+    courante = version()
+    retires = {}
+    for type_media, media_id in (
+        MediaRetire.objects.filter(sequence__gt=depuis).order_by('sequence').values_list('type_media', 'media_id')
+    ):
+        retires.setdefault(type_media, []).append(media_id)
+    return {
+        'format': FORMAT,
+        'depuis': depuis,
+        'version': courante,
+        'medias': _lignes(depuis=depuis),
+        'retires': retires,
+    }
+
+
+def ecrire_instantane(chemin):
+    """Écrit l'instantané compressé, en remplaçant atomiquement le fichier existant"""
+    donnees = instantane()
+    dossier = os.path.dirname(os.path.abspath(chemin))
+    os.makedirs(dossier, exist_ok=True)
+    descripteur, temporaire = tempfile.mkstemp(dir=dossier, suffix='.tmp')
+    try:
+        with os.fdopen(descripteur, 'wb') as brut, gzip.GzipFile(fileobj=brut, mode='wb') as fichier:
+            fichier.write(json.dumps(donnees, cls=DjangoJSONEncoder, separators=(',', ':')).encode())
+        os.replace(temporaire, chemin)
+    except BaseException:
+        os.unlink(temporaire)
+        raise
+    logger.info(f"Instantané du catalogue écrit : version {donnees['version']}, {chemin}")
+    return donnees['version']
+
+
+def purger_retraits(jours):
+    """Supprime les retraits plus anciens que `jours` et avance l'horizon des deltas"""
+    anciens = MediaRetire.objects.filter(date__lt=timezone.now() - timedelta(days=jours))
+    with transaction.atomic():
+        horizon = anciens.aggregate(horizon=Max('sequence'))['horizon']
+        if horizon is None:
+            return 0
+        Compteur.objects.update_or_create(nom=HORIZON, defaults={'valeur': horizon})
+        return MediaRetire.objects.filter(sequence__lte=horizon).delete()[0]
@@ -0,0 +1,184 @@
+"""File de tâches de fond stockée en base.
+
+Les vues appellent `enqueue(nom, **arguments)` et rendent la main aussitôt ;
+le worker (`manage.py worker`) réserve les tâches prêtes et les exécute. La
+réservation utilise SELECT ... FOR UPDATE SKIP LOCKED lorsque la base le
+permet (PostgreSQL), sinon un UPDATE conditionnel par tâche (SQLite) : dans
+les deux cas une tâche n'est exécutée que par un seul worker.
+
+Pendant l'exécution, un fil met à jour la date de battement de la tâche ;
+seule une tâche dont le battement s'est arrêté (worker tué) est remise en
+file, quelle que soit la durée de la tâche.
+"""
+from contextlib import contextmanager
+from datetime import timedelta
+from importlib import import_module
+import logging
+import threading
+import time
+import traceback
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import audit, tracage
+from .models import Tache
+
+logger = logging.getLogger('mediatheque')
+
+REGISTRE = {}
+
+
+def tache(nom):
+    """Décorateur enregistrant une fonction exécutable par le worker"""
+    def enregistrer(fonction):
+        REGISTRE[nom] = fonction
+        return fonction
+    return enregistrer
+
+
+def enqueue(nom, executer_apres=None, max_tentatives=3, **arguments):
+    """Ajoute une tâche à la file et la retourne"""
+    if nom not in REGISTRE:
+        raise ValueError(f"Tâche inconnue : {nom}")
+    with tracage.span(f"enqueue {nom}", genre='producteur', **{'tache.nom': nom}):
+        # La trace de la requête se poursuit dans le worker
+        return Tache.objects.create(
+            nom=nom,
+            arguments=arguments,
+            executer_apres=executer_apres or timezone.now(),
+            max_tentatives=max_tentatives,
+            contexte_trace=tracage.contexte(),
+        )
+
+
+def reserver(limite=10):
+    """Passe en cours jusqu'à `limite` tâches prêtes et retourne leurs identifiants"""
+    maintenant = timezone.now()
+    pretes = Tache.objects.filter(statut='en_attente', executer_apres__lte=maintenant).order_by('executer_apres', 'pk')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(pretes.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limite])
+            Tache.objects.filter(pk__in=ids).update(statut='en_cours', date_debut=maintenant, date_battement=maintenant)
+        return ids
+
+    # Sans SKIP LOCKED : la tâche revient au premier worker dont l'UPDATE la modifie
+    ids = []
+    for pk in pretes.values_list('pk', flat=True)[:limite]:
+        if Tache.objects.filter(pk=pk, statut='en_attente').update(statut='en_cours', date_debut=maintenant, date_battement=maintenant):
+            ids.append(pk)
+    return ids
+
+
+@contextmanager
+def battement(pk):
+    """Met à jour la date de battement d'une tâche toutes les TACHES_INTERVALLE_BATTEMENT secondes"""
+    arret = threading.Event()
+
+    def battre():
+        try:
+            while not arret.wait(settings.TACHES_INTERVALLE_BATTEMENT):
+                Tache.objects.filter(pk=pk, statut='en_cours').update(date_battement=timezone.now())
+        except Exception:
+            logger.exception(f"Battement de la tâche #{pk} interrompu")
+        finally:
+            connection.close()
+
+    fil = threading.Thread(target=battre, name=f"battement-{pk}", daemon=True)
+    fil.start()
+    try:
+        yield
+    finally:
+        arret.set()
+        fil.join()
+
+
+def executer(pk):
+    """Exécute une tâche réservée et enregistre son résultat ; retourne son statut"""
+    try:
+        tache = Tache.objects.get(pk=pk)
+        debut = time.perf_counter()
+        try:
+            with tracage.span(f"tache {tache.nom}", genre='consommateur', racine=True, parent=tache.contexte_trace,
+                              **{'tache.nom': tache.nom, 'tache.id': pk, 'tache.tentative': tache.tentatives + 1}):
+                with battement(pk):
+                    REGISTRE[tache.nom](**tache.arguments)
+        except Exception:
+            tache.tentatives += 1
+            tache.erreur = traceback.format_exc()
+            if tache.tentatives < tache.max_tentatives:
+                # Reprise avec un délai doublé à chaque échec
+                delai = settings.TACHES_DELAI_REESSAI * 2 ** (tache.tentatives - 1)
+                tache.statut = 'en_attente'
+                tache.executer_apres = timezone.now() + timedelta(seconds=delai)
+                logger.warning(f"Tâche {tache.nom} #{pk} en échec, nouvel essai dans {delai} s")
+            else:
+                tache.statut = 'echouee'
+                logger.error(f"Tâche {tache.nom} #{pk} abandonnée après {tache.tentatives} essai(s)")
+        else:
+            tache.tentatives += 1
+            tache.statut = 'terminee'
+            tache.erreur = ''
+        tache.duree_ms = (time.perf_counter() - debut) * 1000
+        tache.date_fin = timezone.now()
+        tache.save(update_fields=['statut', 'tentatives', 'erreur', 'executer_apres', 'duree_ms', 'date_fin'])
+        logger.info(f"Tâche {tache.nom} #{pk} : {tache.statut} en {tache.duree_ms:.1f} ms")
+        return tache.statut
+    finally:
+        audit.vider()
+        # Les threads du worker ont chacun leur connexion
+        close_old_connections()
+
+
+def liberer_bloquees():
+    """Remet en file les tâches en cours sans battement depuis TACHES_DELAI_BLOCAGE (worker arrêté brutalement)"""
+    # Une tâche longue dont le battement continue appartient à un worker toujours actif
+    limite = timezone.now() - timedelta(seconds=settings.TACHES_DELAI_BLOCAGE)
+    nombre = Tache.objects.filter(
+        Q(date_battement__lt=limite) | Q(date_battement__isnull=True, date_debut__lt=limite),
+        statut='en_cours',
+    ).update(statut='en_attente')
+    if nombre:
+        logger.warning(f"{nombre} tâche(s) sans battement depuis {settings.TACHES_DELAI_BLOCAGE} s remise(s) en file")
+    return nombre
+
+
+# ============== TÂCHES ENREGISTRÉES ==============
+
+@tache('agreger_statistiques')
+def agreger_statistiques(taille_lot=500):
+    from . import statistiques
+    statistiques.agreger(taille_lot=taille_lot)
+
+
+@tache('purger_supprime')
+def purger_supprime(modele, pk, taille_lot=5000):
+    from . import suppression
+    suppression.purger(modele, pk, taille_lot=taille_lot)
+
+
+@tache('completer_exemplaires')
+def completer_exemplaires(type_media, pks=None):
+    from django.apps import apps
+    from .models import Exemplaire
+    Exemplaire.objects.completer(apps.get_model('mediatheque', type_media), pks)
+
+
+@tache('purger_sessions')
+def purger_sessions():
+    moteur = import_module(settings.SESSION_ENGINE)
+    try:
+        moteur.SessionStore.clear_expired()
+    except NotImplementedError:
+        # Moteurs sans stockage à purger (cookies signés, cache avec expiration)
+        return
+    logger.info("Purge des sessions expirées effectuée")
+
+
+@tache('calculer_recommandations')
+def calculer_recommandations(k=10):
+    from . import recommandations
+    recommandations.calculer(k=k)
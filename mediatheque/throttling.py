@@ -0,0 +1,43 @@
+"""Limitation des tentatives de connexion échouées.
+
+Les compteurs sont conservés dans le cache par nom d'utilisateur et par
+adresse IP. La vérification a lieu avant ``authenticate()`` : une tentative
+bloquée ne coûte aucun calcul de hachage.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+
+def _cle_utilisateur(username):
+    return f"connexion:echecs:utilisateur:{(username or '').lower()}"
+
+
+def _cle_ip(request):
+    return f"connexion:echecs:ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def est_bloque(request, username):
+    """Vérifie si l'utilisateur ou l'adresse IP a dépassé le nombre d'échecs autorisé"""
+    cle_utilisateur = _cle_utilisateur(username)
+    cle_ip = _cle_ip(request)
+    compteurs = cache.get_many([cle_utilisateur, cle_ip])
+    return (
+        compteurs.get(cle_utilisateur, 0) >= settings.LOGIN_ECHECS_MAX_UTILISATEUR
+        or compteurs.get(cle_ip, 0) >= settings.LOGIN_ECHECS_MAX_IP
+    )
+
+
+def enregistrer_echec(request, username):
+    """Incrémente les compteurs d'échecs (fenêtre fixe de LOGIN_BLOCAGE_DUREE secondes)"""
+    for cle in (_cle_utilisateur(username), _cle_ip(request)):
+        if not cache.add(cle, 1, timeout=settings.LOGIN_BLOCAGE_DUREE):
+            try:
+                cache.incr(cle)
+            except ValueError:
+                # La clé a expiré entre add() et incr()
+                cache.set(cle, 1, timeout=settings.LOGIN_BLOCAGE_DUREE)
+
+
+def reinitialiser(username):
+    """Remet à zéro le compteur de l'utilisateur après une connexion réussie"""
+    cache.delete(_cle_utilisateur(username))
@@ -0,0 +1,247 @@
+"""Traçage des requêtes, des requêtes SQL, des gabarits et des méthodes métier.
+
+Chaque requête HTTP (TracageMiddleware) et chaque tâche du worker ouvre une
+trace ; s'y rattachent, comme spans enfants, les requêtes SQL (enveloppe
+d'exécution posée sur chaque connexion), le rendu des gabarits (moteur
+GabaritsTraces) et les méthodes décorées par @trace. Le contexte passe de la
+vue au worker par la colonne Tache.contexte_trace, au format W3C traceparent.
+
+Les spans sont écrits à la fin de chaque trace au format OTLP/JSON (une
+ligne resourceSpans par trace, comme l'exportateur fichier du collecteur
+OpenTelemetry) dans le fichier désigné par TRACAGE, ou sur la sortie
+d'erreur si TRACAGE vaut 'console'. Sans TRACAGE, aucune trace n'est ouverte
+et les points d'instrumentation se réduisent à la lecture d'une ContextVar.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import json
+import random
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+
+# Genres de span OTLP
+GENRES = {'interne': 1, 'serveur': 2, 'client': 3, 'producteur': 4, 'consommateur': 5}
+STATUT_ERREUR = 2
+LONGUEUR_SQL = 2000
+
+_courant = ContextVar('span_courant', default=None)
+_termines = {}
+_verrou = threading.Lock()
+
+
+class Span:
+    """Opération chronométrée d'une trace"""
+
+    def __init__(self, nom, trace_id, parent_id=None, genre='interne', attributs=None):
+        self.nom = nom
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.genre = genre
+        self.attributs = dict(attributs or {})
+        self.debut = time.time_ns()
+        self.fin = None
+        self.erreur = None
+
+    def contexte(self):
+        """En-tête W3C traceparent désignant ce span"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.nom,
+            'kind': GENRES[self.genre],
+            'startTimeUnixNano': str(self.debut),
+            'endTimeUnixNano': str(self.fin),
+            'attributes': [{'key': cle, 'value': _valeur_otlp(valeur)} for cle, valeur in self.attributs.items()],
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        if self.erreur:
+            span['status'] = {'code': STATUT_ERREUR, 'message': self.erreur}
+        return span
+
+
+def _valeur_otlp(valeur):
+    if isinstance(valeur, bool):
+        return {'boolValue': valeur}
+    if isinstance(valeur, int):
+        return {'intValue': str(valeur)}
+    if isinstance(valeur, float):
+        return {'doubleValue': valeur}
+    return {'stringValue': str(valeur)}
+
+
+TRACEPARENT = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+
+def actif():
+    """Vrai si le traçage est configuré"""
+    return bool(settings.TRACAGE)
+
+
+def courant():
+    """Span en cours dans ce contexte, ou None"""
+    return _courant.get()
+
+
+def contexte():
+    """traceparent du span en cours, à transmettre à un autre processus ('' hors trace)"""
+    span = _courant.get()
+    return span.contexte() if span else ''
+
+
+@contextmanager
+def span(nom, genre='interne', racine=False, parent='', **attributs):
+    """Ouvre un span enfant du span en cours.
+
+    Hors trace, rien n'est enregistré, sauf pour un span `racine` (requête,
+    tâche) qui ouvre une trace si le traçage est actif, rattachée le cas
+    échéant au traceparent `parent`.
+    """
+    englobant = _courant.get()
+    if englobant is not None:
+        nouveau = Span(nom, englobant.trace_id, englobant.span_id, genre, attributs)
+    elif racine and actif():
+        correspondance = TRACEPARENT.match(parent or '')
+        if correspondance:
+            nouveau = Span(nom, correspondance.group(1), correspondance.group(2), genre, attributs)
+        else:
+            nouveau = Span(nom, f"{random.getrandbits(128):032x}", None, genre, attributs)
+    else:
+        yield None
+        return
+
+    jeton = _courant.set(nouveau)
+    try:
+        yield nouveau
+    except BaseException as exc:
+        nouveau.erreur = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _courant.reset(jeton)
+        nouveau.fin = time.time_ns()
+        with _verrou:
+            _termines.setdefault(nouveau.trace_id, []).append(nouveau)
+        if englobant is None:
+            exporter(nouveau.trace_id)
+
+
+def trace(nom=None):
+    """Décorateur : exécute la fonction dans un span, si une trace est en cours"""
+    def decorateur(fonction):
+        libelle = nom or fonction.__qualname__
+
+        @wraps(fonction)
+        def envelopper(*args, **kwargs):
+            if _courant.get() is None:
+                return fonction(*args, **kwargs)
+            nom_span = libelle
+            if nom is None and args and '.' in libelle:
+                # Classe réelle de l'instance : Livre.est_disponible plutôt que Media.est_disponible
+                nom_span = f"{type(args[0]).__name__}.{fonction.__name__}"
+            with span(nom_span, **{'code.function': fonction.__qualname__, 'code.namespace': fonction.__module__}):
+                return fonction(*args, **kwargs)
+        return envelopper
+    return decorateur
+
+
+def exporter(trace_id):
+    """Écrit les spans terminés d'une trace en une ligne OTLP/JSON"""
+    with _verrou:
+        spans = _termines.pop(trace_id, [])
+    if not spans or not actif():
+        return
+    ligne = json.dumps({'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': settings.TRACAGE_SERVICE}}]},
+        'scopeSpans': [{'scope': {'name': 'mediatheque.tracage'}, 'spans': [s.otlp() for s in spans]}],
+    }]}, separators=(',', ':'))
+    if settings.TRACAGE == 'console':
+        sys.stderr.write(ligne + '\n')
+        return
+    with open(settings.TRACAGE, 'a', encoding='utf-8') as fichier:
+        fichier.write(ligne + '\n')
+
+
+# ============== REQUÊTES SQL ==============
+
+TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+"?(\w+)"?', re.IGNORECASE)
+
+
+def tracer_requete(execute, sql, params, many, context):
+    """Enveloppe d'exécution : un span client par requête SQL d'une trace"""
+    if _courant.get() is None:
+        return execute(sql, params, many, context)
+    operation = sql.split(None, 1)[0].upper() if sql else 'SQL'
+    table = TABLE.search(sql or '')
+    attributs = {
+        'db.system': context['connection'].vendor,
+        'db.operation': operation,
+        'db.statement': (sql or '')[:LONGUEUR_SQL],
+    }
+    with span(f"{operation} {table.group(1)}" if table else operation, genre='client', **attributs):
+        return execute(sql, params, many, context)
+
+
+# ============== REQUÊTES HTTP ==============
+
+class TracageMiddleware:
+    """Ouvre une trace par requête, rattachée à l'en-tête traceparent reçu"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not actif():
+            return self.get_response(request)
+        attributs = {'http.request.method': request.method, 'url.path': request.path}
+        with span(f"{request.method} {request.path}", genre='serveur', racine=True,
+                  parent=request.headers.get('traceparent', ''), **attributs) as serveur:
+            reponse = self.get_response(request)
+            resolution = getattr(request, 'resolver_match', None)
+            if resolution is not None:
+                # Nom stable quel que soit l'identifiant dans l'URL
+                serveur.nom = f"{request.method} {resolution.view_name}"
+                serveur.attributs['http.route'] = resolution.route
+            serveur.attributs['http.response.status_code'] = reponse.status_code
+            utilisateur = getattr(request, 'user', None)
+            if utilisateur is not None and utilisateur.is_authenticated:
+                serveur.attributs['enduser.id'] = utilisateur.username
+        return reponse
+
+
+# ============== GABARITS ==============
+
+class GabaritTrace:
+    """Gabarit dont le rendu est un span"""
+
+    def __init__(self, gabarit):
+        self.gabarit = gabarit
+
+    def __getattr__(self, nom):
+        return getattr(self.gabarit, nom)
+
+    def render(self, context=None, request=None):
+        if _courant.get() is None:
+            return self.gabarit.render(context, request)
+        nom = self.gabarit.origin.template_name
+        with span(f"rendu {nom}", **{'template.name': nom}):
+            return self.gabarit.render(context, request)
+
+
+class GabaritsTraces(DjangoTemplates):
+    """Moteur de gabarits Django dont chaque rendu est tracé"""
+
+    def from_string(self, template_code):
+        return GabaritTrace(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return GabaritTrace(super().get_template(template_name))
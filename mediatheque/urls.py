@@ -8,11 +8,14 @@ urlpatterns = [
     path('login/bibliothecaire/', views.login_bibliothecaire, name='login_bibliothecaire'),
     path('logout/', views.logout_view, name='logout'),
     path('espace/membre/', views.espace_membre, name='espace_membre'),
+    path('espace/membre/prolonger/', views.prolonger_mes_emprunts, name='prolonger_mes_emprunts'),
     path('espace/bibliothecaire/', views.espace_bibliothecaire, name='espace_bibliothecaire'),
 
     # Médias
     path('medias/', views.liste_medias, name='liste_medias'),
     path('medias/membre/', views.liste_medias_membre, name='liste_medias_membre'),
+    path('medias/jeux/', views.recherche_jeux, name='recherche_jeux'),
+    path('medias/<str:type_media>/<int:pk>/suggestions/', views.suggestions_media, name='suggestions_media'),
     path('medias/ajouter/', views.ajouter_media, name='ajouter_media'),
     path('medias/ajouter/livre/', views.ajouter_livre, name='ajouter_livre'),
     path('medias/ajouter/dvd/', views.ajouter_dvd, name='ajouter_dvd'),
@@ -34,6 +37,7 @@ urlpatterns = [
     path('membres/ajouter/', views.ajouter_membre, name='ajouter_membre'),
     path('membres/modifier/<int:pk>/', views.modifier_membre, name='modifier_membre'),
     path('membres/supprimer/<int:pk>/', views.supprimer_membre, name='supprimer_membre'),
+    path('membres/prolonger/<int:pk>/', views.prolonger_emprunts_membre, name='prolonger_emprunts_membre'),
 
     # Emprunts
     path('emprunts/', views.liste_emprunts, name='liste_emprunts'),
@@ -42,4 +46,24 @@ urlpatterns = [
     path('emprunts/creer/dvd/<int:pk>/', views.creer_emprunt_dvd, name='creer_emprunt_dvd'),
     path('emprunts/creer/cd/<int:pk>/', views.creer_emprunt_cd, name='creer_emprunt_cd'),
     path('emprunts/retourner/<int:pk>/', views.retourner_emprunt, name='retourner_emprunt'),
+    path('emprunts/prolonger/<int:pk>/', views.prolonger_emprunt, name='prolonger_emprunt'),
+
+    # Scan des exemplaires
+    path('scanner/', views.scanner, name='scanner'),
+    path('api/medias/', views.api_medias, name='api_medias'),
+    path('api/medias/flux/', views.flux_disponibilites, name='flux_disponibilites'),
+    path('api/catalogue/snapshot/', views.api_catalogue_snapshot, name='api_catalogue_snapshot'),
+    path('api/catalogue/delta/', views.api_catalogue_delta, name='api_catalogue_delta'),
+    path('api/autocompletion/', views.api_autocompletion, name='api_autocompletion'),
+    path('api/scan/', views.api_scan, name='api_scan'),
+    path('api/exemplaires/<str:code_barre>/', views.api_exemplaire, name='api_exemplaire'),
+
+    # Statistiques
+    path('statistiques/', views.tableau_statistiques, name='statistiques'),
+    path('statistiques/mettre-a-jour/', views.mettre_a_jour_statistiques, name='mettre_a_jour_statistiques'),
+
+    # Profilage
+    path('profils/', views.liste_profils, name='liste_profils'),
+    path('profils/<str:identifiant>/', views.detail_profil, name='detail_profil'),
+    path('profils/<str:identifiant>/telecharger/', views.telecharger_profil, name='telecharger_profil'),
 ]
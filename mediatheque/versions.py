@@ -0,0 +1,32 @@
+"""Compteurs de version stockés dans le cache.
+
+Une donnée mise en cache inclut la version courante dans sa clé ; incrémenter
+la version suffit à l'invalider sans connaître les clés concernées.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def _cle(nom):
+    return f"version:{nom}"
+
+
+def obtenir(nom):
+    """Retourne la version courante (initialisée si absente du cache)"""
+    version = cache.get(_cle(nom))
+    if version is None:
+        # Valeur initiale horodatée : jamais égale à une version déjà évincée
+        cache.add(_cle(nom), time.time_ns(), timeout=None)
+        version = cache.get(_cle(nom))
+    return version
+
+
+def incrementer(nom):
+    """Incrémente la version, invalidant les données associées"""
+    try:
+        return cache.incr(_cle(nom))
+    except ValueError:
+        version = time.time_ns()
+        cache.set(_cle(nom), version, timeout=None)
+        return version
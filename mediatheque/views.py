@@ -2,9 +2,22 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from .models import Livre, DVD, CD, JeuPlateau, Membre, Emprunt
-from .forms import MembreForm, LivreForm, DVDForm, CDForm, JeuPlateauForm, EmpruntForm
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import FilteredRelation, Q
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_POST
+from .models import Livre, DVD, CD, JeuPlateau, Membre, Emprunt, Exemplaire, ProfilRequete
+from .forms import MembreForm, LivreForm, DVDForm, CDForm, JeuPlateauForm, EmpruntForm, RechercheJeuxForm
+from .archive import HistoriqueEmprunts
+from . import audit, autocompletion, cache_http, diffusion, disponibilite, doublons, recommandations, statistiques, synchronisation, taches, throttling, tracage, versions
 from django.utils import timezone
+from urllib.parse import urlencode
+from datetime import timedelta
+import hashlib
 import logging
 
 logger = logging.getLogger('mediatheque')
@@ -15,6 +28,7 @@ def is_bibliothecaire(user):
     return user.is_staff
 
 
+@cache_http.cache_anonyme(cache_http.etag_gabarits)
 def home(request):
     """Page d'accueil avec choix Membre/Bibliothécaire"""
     logger.info("Accès à la page d'accueil")
@@ -26,9 +40,19 @@ def login_membre(request):
     if request.method == 'POST':
         username = request.POST.get('username')
         password = request.POST.get('password')
+
+        # Vérifier la limitation avant tout calcul de hachage
+        if throttling.est_bloque(request, username):
+            logger.warning(f"Connexion membre bloquée (trop d'échecs): {username}")
+            return render(request, 'mediatheque/login.html', {
+                'user_type': 'Membre',
+                'error': "Trop de tentatives échouées. Réessayez dans quelques minutes."
+            }, status=429)
+
         user = authenticate(request, username=username, password=password)
 
         if user is not None:
+            throttling.reinitialiser(username)
             # Vérifier que c'est bien un membre (pas staff)
             if not user.is_staff:
                 login(request, user)
@@ -42,6 +66,7 @@ def login_membre(request):
                     'error': "Ce compte n'est pas un compte membre."
                 })
         else:
+            throttling.enregistrer_echec(request, username)
             logger.warning(f"Échec connexion membre: {username}")
             return render(request, 'mediatheque/login.html', {
                 'user_type': 'Membre',
@@ -60,9 +85,19 @@ def login_bibliothecaire(request):
     if request.method == 'POST':
         username = request.POST.get('username')
         password = request.POST.get('password')
+
+        # Vérifier la limitation avant tout calcul de hachage
+        if throttling.est_bloque(request, username):
+            logger.warning(f"Connexion bibliothécaire bloquée (trop d'échecs): {username}")
+            return render(request, 'mediatheque/login.html', {
+                'user_type': 'Bibliothécaire',
+                'error': "Trop de tentatives échouées. Réessayez dans quelques minutes."
+            }, status=429)
+
         user = authenticate(request, username=username, password=password)
 
         if user is not None:
+            throttling.reinitialiser(username)
             # Vérifier que c'est bien un bibliothécaire (staff)
             if user.is_staff:
                 login(request, user)
@@ -76,6 +111,7 @@ def login_bibliothecaire(request):
                     'error': "Ce compte n'est pas un compte bibliothécaire."
                 })
         else:
+            throttling.enregistrer_echec(request, username)
             logger.warning(f"Échec connexion bibliothécaire: {username}")
             return render(request, 'mediatheque/login.html', {
                 'user_type': 'Bibliothécaire',
@@ -96,10 +132,51 @@ def logout_view(request):
 
 @login_required
 def espace_membre(request):
-    """Espace membre - consultation des médias"""
+    """Espace membre - emprunts en cours et historique"""
     if request.user.is_staff:
         return redirect('espace_bibliothecaire')
-    return render(request, 'mediatheque/espace_membre.html')
+
+    membre = getattr(request.user, 'membre', None)
+    if membre is None:
+        return render(request, 'mediatheque/espace_membre.html')
+
+    numero = request.GET.get('page', '1')
+    if not numero.isdigit():
+        numero = '1'
+
+    # Mis en cache jusqu'au prochain emprunt ou retour du membre
+    version = versions.obtenir(f"emprunts_membre:{membre.pk}")
+    cle = f"espace_membre:{membre.pk}:{version}:{numero}"
+    donnees = cache.get(cle)
+    if donnees is None:
+        emprunts = membre.emprunt_set.select_related('livre', 'dvd', 'cd')
+        # L'archive n'est lue que pour les pages qui dépassent les emprunts récents
+        historique = Paginator(HistoriqueEmprunts(membre), 10).get_page(numero)
+        donnees = {
+            'emprunts_en_cours': list(emprunts.filter(date_retour_effective__isnull=True).order_by('date_retour_prevue')),
+            'historique': list(historique.object_list),
+            'page': historique.number,
+            'nombre_pages': historique.paginator.num_pages,
+        }
+        cache.set(cle, donnees)
+
+    return render(request, 'mediatheque/espace_membre.html', {'membre': membre, **donnees})
+
+
+@login_required
+@require_POST
+def prolonger_mes_emprunts(request):
+    """Espace membre - prolonger ses emprunts éligibles"""
+    membre = getattr(request.user, 'membre', None)
+    if membre is None:
+        return redirect('espace_membre')
+    nombre = membre.prolonger_emprunts()
+    if nombre:
+        audit.enregistrer(request.user, 'prolongation', membre, {'emprunts': nombre})
+        messages.success(request, f"{nombre} emprunt(s) prolongé(s).")
+    else:
+        messages.warning(request, "Aucun emprunt ne peut être prolongé.")
+    return redirect('espace_membre')
 
 
 @login_required
@@ -110,22 +187,29 @@ def espace_bibliothecaire(request):
     return render(request, 'mediatheque/espace_bibliothecaire.html')
 
 
+@cache_http.cache_anonyme(cache_http.etag_catalogue)
 def liste_medias(request, acces_membre=False):
     """Liste de tous les médias - accessible à tous"""
-    livres = Livre.objects.all()
-    dvds = DVD.objects.all()
-    cds = CD.objects.all()
+    # Date de retour attendue des médias indisponibles, en une requête pour toute la page
+    medias = disponibilite.annoter(livre=Livre.objects.all(), dvd=DVD.objects.all(), cd=CD.objects.all())
+    livres = medias['livre']
+    dvds = medias['dvd']
+    cds = medias['cd']
     jeux = JeuPlateau.objects.all()
 
     username = request.user.username if request.user.is_authenticated else "visiteur"
     logger.info(f"Consultation liste médias par {username}")
 
+    membre = getattr(request.user, 'membre', None) if acces_membre else None
+    suggestions = recommandations.pour_membre(membre) if membre else []
+
     return render(request, 'mediatheque/liste_medias.html', {
         'livres': livres,
         'dvds': dvds,
         'cds': cds,
         'jeux': jeux,
         'acces_membre': acces_membre,
+        'suggestions': suggestions,
     })
 
 
@@ -134,6 +218,113 @@ def liste_medias_membre(request):
     return liste_medias(request, acces_membre=True)
 
 
+def suggestions_media(request, type_media, pk):
+    """Médias empruntés par les emprunteurs d'un média - accessible à tous"""
+    modele = recommandations.MODELES_MEDIA.get(type_media)
+    if modele is None:
+        raise Http404
+    media = get_object_or_404(modele, pk=pk)
+    suggestions = recommandations.pour_media(type_media, pk)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({'media': {'type': type_media, 'id': pk, 'titre': media.titre}, 'suggestions': suggestions})
+    return render(request, 'mediatheque/suggestions.html', {'media': media, 'suggestions': suggestions})
+
+
+def api_medias(request):
+    """Catalogue JSON : disponibilité et date de retour attendue des médias indisponibles"""
+    return JsonResponse(disponibilite.etats())
+
+
+def api_catalogue_snapshot(request):
+    """Instantané compressé du catalogue, point de départ de la synchronisation des bornes"""
+    try:
+        fichier = open(settings.CATALOGUE_SNAPSHOT, 'rb')
+    except FileNotFoundError:
+        return JsonResponse({'erreur': "Aucun instantané : lancer manage.py snapshot_catalogue"}, status=404)
+    return FileResponse(fichier, content_type='application/gzip', filename='catalogue.json.gz')
+
+
+def api_catalogue_delta(request):
+    """Médias modifiés ou retirés depuis la version détenue par la borne"""
+    depuis = request.GET.get('depuis', '')
+    if not depuis.isdigit():
+        return JsonResponse({'erreur': "Paramètre depuis (version) requis"}, status=400)
+    donnees = synchronisation.delta(int(depuis))
+    if donnees is None:
+        # Retraits déjà purgés : la borne doit recharger l'instantané
+        return JsonResponse({'erreur': "Version trop ancienne, recharger l'instantané"}, status=410)
+    return JsonResponse(donnees)
+
+
+async def flux_disponibilites(request):
+    """Flux SSE des changements de disponibilité, pour les bornes (servi en ASGI)"""
+    reponse = StreamingHttpResponse(
+        diffusion.flux(diffusion.diffuseur.abonner()), content_type='text/event-stream'
+    )
+    reponse['Cache-Control'] = 'no-cache'
+    # Pas de mise en tampon par un proxy nginx
+    reponse['X-Accel-Buffering'] = 'no'
+    return reponse
+
+
+def recherche_jeux(request):
+    """Recherche de jeux de plateau par nombre de joueurs, éditeur et titre - accessible à tous"""
+    # Résultats mis en cache jusqu'à la prochaine modification d'un jeu
+    version = versions.obtenir('jeux')
+    editeurs = cache.get(f"jeux:editeurs:{version}")
+    if editeurs is None:
+        editeurs = list(JeuPlateau.objects.order_by('editeur').values_list('editeur', flat=True).distinct())
+        cache.set(f"jeux:editeurs:{version}", editeurs)
+
+    form = RechercheJeuxForm(request.GET, editeurs=editeurs)
+    criteres = {k: v for k, v in form.cleaned_data.items() if v} if form.is_valid() else {}
+    parametres = urlencode(criteres)
+    numero = request.GET.get('page', '1')
+    if not numero.isdigit():
+        numero = '1'
+
+    cle = f"jeux:{version}:{hashlib.sha1(parametres.encode()).hexdigest()}:{numero}"
+    donnees = cache.get(cle)
+    if donnees is None:
+        jeux = JeuPlateau.objects.order_by('titre', 'pk')
+        if 'joueurs' in criteres:
+            jeux = jeux.filter(nombre_joueurs_min__lte=criteres['joueurs'], nombre_joueurs_max__gte=criteres['joueurs'])
+        if 'editeur' in criteres:
+            jeux = jeux.filter(editeur=criteres['editeur'])
+        if 'titre' in criteres:
+            jeux = jeux.filter(titre__icontains=criteres['titre'])
+        page = Paginator(jeux.values('titre', 'editeur', 'nombre_joueurs_min', 'nombre_joueurs_max'), 20).get_page(numero)
+        donnees = {
+            'jeux': list(page.object_list),
+            'nombre_resultats': page.paginator.count,
+            'page': page.number,
+            'nombre_pages': page.paginator.num_pages,
+        }
+        cache.set(cle, donnees)
+
+    return render(request, 'mediatheque/recherche_jeux.html', {'form': form, 'parametres': parametres, **donnees})
+
+
+def api_autocompletion(request):
+    """Suggestions de titres et d'auteurs pour une saisie, depuis l'index en mémoire"""
+    try:
+        limite = max(1, min(int(request.GET.get('limite', 10)), 50))
+    except ValueError:
+        limite = 10
+    suggestions = autocompletion.rechercher(request.GET.get('q', ''), limite)
+    return JsonResponse({
+        'suggestions': [
+            {
+                'type': type_media, 'id': pk, 'libelle': libelle,
+                # Les jeux n'ont pas de page de suggestions
+                'url': reverse('suggestions_media', args=[type_media, pk])
+                if type_media in recommandations.MODELES_MEDIA else None,
+            }
+            for type_media, pk, libelle in suggestions
+        ]
+    })
+
+
 # ============== GESTION DES MEMBRES ==============
 
 @login_required
@@ -153,7 +344,7 @@ def ajouter_membre(request):
         form = MembreForm(request.POST)
         if form.is_valid():
             membre = form.save()
-            logger.info(f"Membre créé: {membre.nom} {membre.prenom} par {request.user.username}")
+            audit.enregistrer(request.user, 'creation', membre, {'nom': str(membre)})
             messages.success(request, f"Membre {membre.prenom} {membre.nom} créé avec succès.")
             return redirect('liste_membres')
     else:
@@ -170,7 +361,7 @@ def modifier_membre(request, pk):
         form = MembreForm(request.POST, instance=membre)
         if form.is_valid():
             form.save()
-            logger.info(f"Membre modifié: {membre.nom} {membre.prenom} par {request.user.username}")
+            audit.enregistrer(request.user, 'modification', membre, {'champs': form.changed_data})
             messages.success(request, f"Membre {membre.prenom} {membre.nom} modifié avec succès.")
             return redirect('liste_membres')
     else:
@@ -185,8 +376,8 @@ def supprimer_membre(request, pk):
     membre = get_object_or_404(Membre, pk=pk)
     if request.method == 'POST':
         nom_complet = f"{membre.prenom} {membre.nom}"
-        logger.info(f"Membre supprimé: {nom_complet} par {request.user.username}")
-        membre.delete()
+        membre.supprimer()
+        audit.enregistrer(request.user, 'suppression', membre, {'nom': nom_complet})
         messages.success(request, f"Membre {nom_complet} supprimé avec succès.")
         return redirect('liste_membres')
     return render(request, 'mediatheque/confirmer_suppression.html', {'objet': membre, 'type': 'membre'})
@@ -201,20 +392,29 @@ def ajouter_media(request):
     return render(request, 'mediatheque/choix_media.html')
 
 
+def doublons_a_confirmer(request, form):
+    """Médias au titre très proche de celui saisi, tant que l'ajout n'a pas été confirmé"""
+    if 'confirmer_doublon' in request.POST or not form.is_valid():
+        return []
+    return doublons.similaires(form._meta.model, form.cleaned_data['titre'])
+
+
 @login_required
 @user_passes_test(is_bibliothecaire)
 def ajouter_livre(request):
     """Ajouter un livre"""
     if request.method == 'POST':
         form = LivreForm(request.POST)
-        if form.is_valid():
+        similaires = doublons_a_confirmer(request, form)
+        if form.is_valid() and not similaires:
             livre = form.save()
-            logger.info(f"Livre ajouté: {livre.titre} par {request.user.username}")
+            audit.enregistrer(request.user, 'creation', livre, {'titre': livre.titre})
             messages.success(request, f"Livre '{livre.titre}' ajouté avec succès.")
             return redirect('liste_medias')
     else:
         form = LivreForm()
-    return render(request, 'mediatheque/form_media.html', {'form': form, 'type_media': 'Livre'})
+        similaires = []
+    return render(request, 'mediatheque/form_media.html', {'form': form, 'type_media': 'Livre', 'doublons': similaires})
 
 
 @login_required
@@ -223,14 +423,16 @@ def ajouter_dvd(request):
     """Ajouter un DVD"""
     if request.method == 'POST':
         form = DVDForm(request.POST)
-        if form.is_valid():
+        similaires = doublons_a_confirmer(request, form)
+        if form.is_valid() and not similaires:
             dvd = form.save()
-            logger.info(f"DVD ajouté: {dvd.titre} par {request.user.username}")
+            audit.enregistrer(request.user, 'creation', dvd, {'titre': dvd.titre})
             messages.success(request, f"DVD '{dvd.titre}' ajouté avec succès.")
             return redirect('liste_medias')
     else:
         form = DVDForm()
-    return render(request, 'mediatheque/form_media.html', {'form': form, 'type_media': 'DVD'})
+        similaires = []
+    return render(request, 'mediatheque/form_media.html', {'form': form, 'type_media': 'DVD', 'doublons': similaires})
 
 
 @login_required
@@ -239,14 +441,16 @@ def ajouter_cd(request):
     """Ajouter un CD"""
     if request.method == 'POST':
         form = CDForm(request.POST)
-        if form.is_valid():
+        similaires = doublons_a_confirmer(request, form)
+        if form.is_valid() and not similaires:
             cd = form.save()
-            logger.info(f"CD ajouté: {cd.titre} par {request.user.username}")
+            audit.enregistrer(request.user, 'creation', cd, {'titre': cd.titre})
             messages.success(request, f"CD '{cd.titre}' ajouté avec succès.")
             return redirect('liste_medias')
     else:
         form = CDForm()
-    return render(request, 'mediatheque/form_media.html', {'form': form, 'type_media': 'CD'})
+        similaires = []
+    return render(request, 'mediatheque/form_media.html', {'form': form, 'type_media': 'CD', 'doublons': similaires})
 
 
 @login_required
@@ -257,7 +461,7 @@ def ajouter_jeu(request):
         form = JeuPlateauForm(request.POST)
         if form.is_valid():
             jeu = form.save()
-            logger.info(f"Jeu ajouté: {jeu.titre} par {request.user.username}")
+            audit.enregistrer(request.user, 'creation', jeu, {'titre': jeu.titre})
             messages.success(request, f"Jeu '{jeu.titre}' ajouté avec succès.")
             return redirect('liste_medias')
     else:
@@ -276,7 +480,7 @@ def modifier_livre(request, pk):
         form = LivreForm(request.POST, instance=livre)
         if form.is_valid():
             form.save()
-            logger.info(f"Livre modifié: {livre.titre} par {request.user.username}")
+            audit.enregistrer(request.user, 'modification', livre, {'champs': form.changed_data})
             messages.success(request, f"Livre '{livre.titre}' modifié avec succès.")
             return redirect('liste_medias')
     else:
@@ -293,7 +497,7 @@ def modifier_dvd(request, pk):
         form = DVDForm(request.POST, instance=dvd)
         if form.is_valid():
             form.save()
-            logger.info(f"DVD modifié: {dvd.titre} par {request.user.username}")
+            audit.enregistrer(request.user, 'modification', dvd, {'champs': form.changed_data})
             messages.success(request, f"DVD '{dvd.titre}' modifié avec succès.")
             return redirect('liste_medias')
     else:
@@ -310,7 +514,7 @@ def modifier_cd(request, pk):
         form = CDForm(request.POST, instance=cd)
         if form.is_valid():
             form.save()
-            logger.info(f"CD modifié: {cd.titre} par {request.user.username}")
+            audit.enregistrer(request.user, 'modification', cd, {'champs': form.changed_data})
             messages.success(request, f"CD '{cd.titre}' modifié avec succès.")
             return redirect('liste_medias')
     else:
@@ -327,7 +531,7 @@ def modifier_jeu(request, pk):
         form = JeuPlateauForm(request.POST, instance=jeu)
         if form.is_valid():
             form.save()
-            logger.info(f"Jeu modifié: {jeu.titre} par {request.user.username}")
+            audit.enregistrer(request.user, 'modification', jeu, {'champs': form.changed_data})
             messages.success(request, f"Jeu '{jeu.titre}' modifié avec succès.")
             return redirect('liste_medias')
     else:
@@ -344,8 +548,8 @@ def supprimer_livre(request, pk):
     livre = get_object_or_404(Livre, pk=pk)
     if request.method == 'POST':
         titre = livre.titre
-        logger.info(f"Livre supprimé: {titre} par {request.user.username}")
-        livre.delete()
+        livre.supprimer()
+        audit.enregistrer(request.user, 'suppression', livre, {'titre': titre})
         messages.success(request, f"Livre '{titre}' supprimé avec succès.")
         return redirect('liste_medias')
     return render(request, 'mediatheque/confirmer_suppression.html', {'objet': livre, 'type': 'livre'})
@@ -358,8 +562,8 @@ def supprimer_dvd(request, pk):
     dvd = get_object_or_404(DVD, pk=pk)
     if request.method == 'POST':
         titre = dvd.titre
-        logger.info(f"DVD supprimé: {titre} par {request.user.username}")
-        dvd.delete()
+        dvd.supprimer()
+        audit.enregistrer(request.user, 'suppression', dvd, {'titre': titre})
         messages.success(request, f"DVD '{titre}' supprimé avec succès.")
         return redirect('liste_medias')
     return render(request, 'mediatheque/confirmer_suppression.html', {'objet': dvd, 'type': 'DVD'})
@@ -372,8 +576,8 @@ def supprimer_cd(request, pk):
     cd = get_object_or_404(CD, pk=pk)
     if request.method == 'POST':
         titre = cd.titre
-        logger.info(f"CD supprimé: {titre} par {request.user.username}")
-        cd.delete()
+        cd.supprimer()
+        audit.enregistrer(request.user, 'suppression', cd, {'titre': titre})
         messages.success(request, f"CD '{titre}' supprimé avec succès.")
         return redirect('liste_medias')
     return render(request, 'mediatheque/confirmer_suppression.html', {'objet': cd, 'type': 'CD'})
@@ -386,8 +590,9 @@ def supprimer_jeu(request, pk):
     jeu = get_object_or_404(JeuPlateau, pk=pk)
     if request.method == 'POST':
         titre = jeu.titre
-        logger.info(f"Jeu supprimé: {titre} par {request.user.username}")
+        jeu_id = jeu.pk
         jeu.delete()
+        audit.enregistrer(request.user, 'suppression', ('jeuplateau', jeu_id), {'titre': titre})
         messages.success(request, f"Jeu '{titre}' supprimé avec succès.")
         return redirect('liste_medias')
     return render(request, 'mediatheque/confirmer_suppression.html', {'objet': jeu, 'type': 'jeu de plateau'})
@@ -399,8 +604,9 @@ def supprimer_jeu(request, pk):
 @user_passes_test(is_bibliothecaire)
 def liste_emprunts(request):
     """Liste de tous les emprunts"""
-    emprunts_en_cours = Emprunt.objects.filter(date_retour_effective__isnull=True)
-    emprunts_termines = Emprunt.objects.filter(date_retour_effective__isnull=False)
+    emprunts = Emprunt.objects.visibles()
+    emprunts_en_cours = emprunts.filter(date_retour_effective__isnull=True)
+    emprunts_termines = emprunts.filter(date_retour_effective__isnull=False)
     logger.info(f"Consultation liste emprunts par {request.user.username}")
     return render(request, 'mediatheque/liste_emprunts.html', {
         'emprunts_en_cours': emprunts_en_cours,
@@ -414,16 +620,16 @@ def creer_emprunt(request):
     """Créer un nouvel emprunt"""
     if request.method == 'POST':
         form = EmpruntForm(request.POST)
-        if form.is_valid():
+        with tracage.span("validation du formulaire", **{'form.classe': 'EmpruntForm'}):
+            valide = form.is_valid()
+        if valide:
             membre = form.cleaned_data['membre']
             type_media = form.cleaned_data['type_media']
 
-            # Vérifier si le membre peut emprunter
-            if not membre.peut_emprunter():
-                if membre.a_emprunt_en_retard():
-                    messages.error(request, f"{membre} a un emprunt en retard et ne peut pas emprunter.")
-                else:
-                    messages.error(request, f"{membre} a déjà 3 emprunts en cours.")
+            # Vérifier si le membre peut emprunter selon la politique de prêt
+            motif = membre.motif_refus(type_media)
+            if motif:
+                messages.error(request, motif)
                 return render(request, 'mediatheque/form_emprunt.html', {'form': form})
 
             # Récupérer le média sélectionné
@@ -455,7 +661,7 @@ def creer_emprunt(request):
 
             emprunt.save()
 
-            logger.info(f"Emprunt créé: {media.titre} pour {membre} par {request.user.username}")
+            audit.enregistrer(request.user, 'emprunt', emprunt, {'titre': media.titre, 'membre': membre.pk})
             messages.success(request, f"Emprunt de '{media.titre}' créé pour {membre}.")
             return redirect('liste_emprunts')
     else:
@@ -478,13 +684,43 @@ def retourner_emprunt(request, pk):
         emprunt.save()
 
         media = emprunt.get_media()
-        logger.info(f"Emprunt retourné: {media.titre} par {emprunt.membre} - {request.user.username}")
+        audit.enregistrer(request.user, 'retour', emprunt, {'titre': media.titre, 'membre': emprunt.membre_id})
         messages.success(request, f"Retour de '{media.titre}' enregistré.")
         return redirect('liste_emprunts')
 
     return render(request, 'mediatheque/confirmer_retour.html', {'emprunt': emprunt})
 
 
+@login_required
+@user_passes_test(is_bibliothecaire)
+@require_POST
+def prolonger_emprunt(request, pk):
+    """Prolonger un emprunt selon la politique de prêt du membre"""
+    emprunt = get_object_or_404(Emprunt.objects.select_related('membre'), pk=pk)
+    media = emprunt.get_media()
+    if emprunt.prolonger():
+        audit.enregistrer(request.user, 'prolongation', emprunt, {'date_retour_prevue': str(emprunt.date_retour_prevue)})
+        messages.success(request, f"Emprunt de '{media.titre}' prolongé jusqu'au {emprunt.date_retour_prevue}.")
+    else:
+        messages.error(request, f"L'emprunt de '{media.titre}' ne peut pas être prolongé.")
+    return redirect('liste_emprunts')
+
+
+@login_required
+@user_passes_test(is_bibliothecaire)
+@require_POST
+def prolonger_emprunts_membre(request, pk):
+    """Prolonger tous les emprunts éligibles d'un membre"""
+    membre = get_object_or_404(Membre, pk=pk)
+    nombre = membre.prolonger_emprunts()
+    if nombre:
+        audit.enregistrer(request.user, 'prolongation', membre, {'emprunts': nombre})
+        messages.success(request, f"{nombre} emprunt(s) de {membre} prolongé(s).")
+    else:
+        messages.warning(request, f"Aucun emprunt de {membre} ne peut être prolongé.")
+    return redirect('liste_membres')
+
+
 @login_required
 @user_passes_test(is_bibliothecaire)
 def creer_emprunt_livre(request, pk):
@@ -500,17 +736,15 @@ def creer_emprunt_livre(request, pk):
         membre_id = request.POST.get('membre')
         membre = get_object_or_404(Membre, pk=membre_id)
 
-        if not membre.peut_emprunter():
-            if membre.a_emprunt_en_retard():
-                messages.error(request, f"{membre} a un emprunt en retard.")
-            else:
-                messages.error(request, f"{membre} a déjà 3 emprunts en cours.")
+        motif = membre.motif_refus('livre')
+        if motif:
+            messages.error(request, motif)
             return render(request, 'mediatheque/form_emprunt_direct.html', {'media': livre, 'type_media': 'livre', 'membres': membres})
 
         emprunt = Emprunt(membre=membre, livre=livre)
         emprunt.save()
 
-        logger.info(f"Emprunt créé: {livre.titre} pour {membre} par {request.user.username}")
+        audit.enregistrer(request.user, 'emprunt', emprunt, {'titre': livre.titre, 'membre': membre.pk})
         messages.success(request, f"Emprunt de '{livre.titre}' créé pour {membre}.")
         return redirect('liste_medias')
 
@@ -532,17 +766,15 @@ def creer_emprunt_dvd(request, pk):
         membre_id = request.POST.get('membre')
         membre = get_object_or_404(Membre, pk=membre_id)
 
-        if not membre.peut_emprunter():
-            if membre.a_emprunt_en_retard():
-                messages.error(request, f"{membre} a un emprunt en retard.")
-            else:
-                messages.error(request, f"{membre} a déjà 3 emprunts en cours.")
+        motif = membre.motif_refus('dvd')
+        if motif:
+            messages.error(request, motif)
             return render(request, 'mediatheque/form_emprunt_direct.html', {'media': dvd, 'type_media': 'dvd', 'membres': membres})
 
         emprunt = Emprunt(membre=membre, dvd=dvd)
         emprunt.save()
 
-        logger.info(f"Emprunt créé: {dvd.titre} pour {membre} par {request.user.username}")
+        audit.enregistrer(request.user, 'emprunt', emprunt, {'titre': dvd.titre, 'membre': membre.pk})
         messages.success(request, f"Emprunt de '{dvd.titre}' créé pour {membre}.")
         return redirect('liste_medias')
 
@@ -564,18 +796,170 @@ def creer_emprunt_cd(request, pk):
         membre_id = request.POST.get('membre')
         membre = get_object_or_404(Membre, pk=membre_id)
 
-        if not membre.peut_emprunter():
-            if membre.a_emprunt_en_retard():
-                messages.error(request, f"{membre} a un emprunt en retard.")
-            else:
-                messages.error(request, f"{membre} a déjà 3 emprunts en cours.")
+        motif = membre.motif_refus('cd')
+        if motif:
+            messages.error(request, motif)
             return render(request, 'mediatheque/form_emprunt_direct.html', {'media': cd, 'type_media': 'cd', 'membres': membres})
 
         emprunt = Emprunt(membre=membre, cd=cd)
         emprunt.save()
 
-        logger.info(f"Emprunt créé: {cd.titre} pour {membre} par {request.user.username}")
+        audit.enregistrer(request.user, 'emprunt', emprunt, {'titre': cd.titre, 'membre': membre.pk})
         messages.success(request, f"Emprunt de '{cd.titre}' créé pour {membre}.")
         return redirect('liste_medias')
 
     return render(request, 'mediatheque/form_emprunt_direct.html', {'media': cd, 'type_media': 'cd', 'membres': membres})
+
+
+# ============== SCAN DES EXEMPLAIRES ==============
+
+def lire_exemplaire(code_barre):
+    """Exemplaire, média et emprunt en cours en une seule requête sur l'index du code-barres"""
+    return Exemplaire.objects.filter(code_barre=code_barre).annotate(
+        emprunt_actif=FilteredRelation('emprunt', condition=Q(emprunt__date_retour_effective__isnull=True)),
+    ).values(
+        'pk', 'code_barre', 'etat',
+        'livre_id', 'livre__titre', 'dvd_id', 'dvd__titre', 'cd_id', 'cd__titre',
+        'emprunt_actif__id', 'emprunt_actif__date_retour_prevue',
+        'emprunt_actif__membre_id', 'emprunt_actif__membre__prenom', 'emprunt_actif__membre__nom',
+    ).first()
+
+
+def resume_scan(ligne):
+    """Représentation JSON d'un exemplaire scanné"""
+    type_media = next(t for t in ('livre', 'dvd', 'cd') if ligne[f'{t}_id'])
+    emprunt = None
+    if ligne['emprunt_actif__id']:
+        date_retour_prevue = ligne['emprunt_actif__date_retour_prevue']
+        emprunt = {
+            'id': ligne['emprunt_actif__id'],
+            'membre_id': ligne['emprunt_actif__membre_id'],
+            'membre': f"{ligne['emprunt_actif__membre__prenom']} {ligne['emprunt_actif__membre__nom']}",
+            'date_retour_prevue': date_retour_prevue.isoformat(),
+            'en_retard': date_retour_prevue < timezone.now().date(),
+        }
+    return {
+        'exemplaire': {'id': ligne['pk'], 'code_barre': ligne['code_barre'], 'etat': ligne['etat']},
+        'media': {'type': type_media, 'id': ligne[f'{type_media}_id'], 'titre': ligne[f'{type_media}__titre']},
+        'emprunt': emprunt,
+    }
+
+
+@login_required
+@user_passes_test(is_bibliothecaire)
+def scanner(request):
+    """Poste de prêt par scan de code-barres"""
+    return render(request, 'mediatheque/scanner.html', {'membres': Membre.objects.all()})
+
+
+@login_required
+@user_passes_test(is_bibliothecaire)
+def api_exemplaire(request, code_barre):
+    """Consultation d'un exemplaire par son code-barres"""
+    ligne = lire_exemplaire(code_barre)
+    if ligne is None:
+        return JsonResponse({'erreur': "Code-barres inconnu."}, status=404)
+    return JsonResponse(resume_scan(ligne))
+
+
+@login_required
+@user_passes_test(is_bibliothecaire)
+@require_POST
+def api_scan(request):
+    """Emprunt ou retour d'un exemplaire en un seul scan"""
+    ligne = lire_exemplaire(request.POST.get('code_barre', '').strip())
+    if ligne is None:
+        return JsonResponse({'erreur': "Code-barres inconnu."}, status=404)
+    resume = resume_scan(ligne)
+    titre = resume['media']['titre']
+
+    # Exemplaire emprunté : le scan enregistre le retour
+    if resume['emprunt']:
+        Emprunt.objects.filter(pk=resume['emprunt']['id']).marquer_retournes()
+        audit.enregistrer(request.user, 'retour', ('emprunt', resume['emprunt']['id']), {'titre': titre, 'scan': ligne['code_barre']})
+        resume['exemplaire']['etat'] = 'disponible'
+        return JsonResponse({'action': 'retour', **resume})
+
+    if ligne['etat'] != 'disponible':
+        return JsonResponse({'erreur': "Cet exemplaire est hors circulation."}, status=409)
+
+    membre_id = request.POST.get('membre', '').strip()
+    membre = Membre.objects.filter(pk=membre_id).first() if membre_id.isdigit() else None
+    if membre is None:
+        return JsonResponse({'erreur': "Veuillez sélectionner un membre."}, status=400)
+    motif = membre.motif_refus(resume['media']['type'])
+    if motif:
+        return JsonResponse({'erreur': motif}, status=409)
+
+    with transaction.atomic():
+        # Réservation conditionnelle : de deux scans simultanés, un seul trouve l'exemplaire disponible
+        if not Exemplaire.objects.filter(pk=ligne['pk'], etat='disponible').update(etat='emprunte'):
+            return JsonResponse({'erreur': "Cet exemplaire vient d'être emprunté."}, status=409)
+        emprunt = Emprunt(membre=membre, exemplaire_id=ligne['pk'], **{f"{resume['media']['type']}_id": resume['media']['id']})
+        emprunt.save()
+    audit.enregistrer(request.user, 'emprunt', emprunt, {'titre': titre, 'membre': membre.pk, 'scan': ligne['code_barre']})
+    resume['exemplaire']['etat'] = 'emprunte'
+    resume['emprunt'] = {
+        'id': emprunt.pk,
+        'membre_id': membre.pk,
+        'membre': str(membre),
+        'date_retour_prevue': emprunt.date_retour_prevue.isoformat(),
+        'en_retard': False,
+    }
+    return JsonResponse({'action': 'emprunt', **resume}, status=201)
+
+
+# ============== STATISTIQUES ==============
+
+@login_required
+@user_passes_test(is_bibliothecaire)
+def tableau_statistiques(request):
+    """Tableau de bord statistique, servi depuis les agrégats"""
+    logger.info(f"Consultation statistiques par {request.user.username}")
+    return render(request, 'mediatheque/statistiques.html', statistiques.tableau_de_bord())
+
+
+@login_required
+@user_passes_test(is_bibliothecaire)
+@require_POST
+def mettre_a_jour_statistiques(request):
+    """Demande une mise à jour des statistiques au worker"""
+    taches.enqueue('agreger_statistiques')
+    logger.info(f"Mise à jour des statistiques demandée par {request.user.username}")
+    messages.info(request, "La mise à jour des statistiques a été lancée.")
+    return redirect('statistiques')
+
+
+# ============== PROFILAGE ==============
+
+@login_required
+@user_passes_test(is_bibliothecaire)
+def liste_profils(request):
+    """Requêtes profilées les plus lentes sur la période"""
+    heures = request.GET.get('heures', '24')
+    # Les profils sont conservés en nombre, pas en durée : une année suffit à tous les voir
+    heures = min(int(heures), 24 * 365) if heures.isdigit() else 24
+    profils = (
+        ProfilRequete.objects.filter(date__gte=timezone.now() - timedelta(hours=heures))
+        .select_related('utilisateur').defer('statistiques', 'requetes').order_by('-duree_ms')[:50]
+    )
+    return render(request, 'mediatheque/profils.html', {'profils': profils, 'heures': heures})
+
+
+@login_required
+@user_passes_test(is_bibliothecaire)
+def detail_profil(request, identifiant):
+    """Fonctions les plus coûteuses et chronologie SQL d'une requête profilée"""
+    profil = get_object_or_404(ProfilRequete.objects.defer('statistiques'), identifiant=identifiant)
+    requetes_lentes = sorted(profil.requetes, key=lambda r: -r['duree_ms'])[:10]
+    return render(request, 'mediatheque/profil.html', {'profil': profil, 'requetes_lentes': requetes_lentes})
+
+
+@login_required
+@user_passes_test(is_bibliothecaire)
+def telecharger_profil(request, identifiant):
+    """Statistiques cProfile brutes, à ouvrir avec pstats ou snakeviz"""
+    profil = get_object_or_404(ProfilRequete, identifiant=identifiant)
+    reponse = HttpResponse(bytes(profil.statistiques), content_type='application/octet-stream')
+    reponse['Content-Disposition'] = f'attachment; filename="{identifiant}.prof"'
+    return reponse